@@ -2,125 +2,215 @@
 """
 Script para analizar resultados del experimento
 Ejecuta: python analizar_resultados.py
+         python analizar_resultados.py --json carpeta_con_P_json
+         python analizar_resultados.py --deteccion [--remuestreos 5000 --semilla 1]
 """
 
-import json
+import argparse
 from pathlib import Path
-from collections import Counter, defaultdict
 
-DATA_DIR = Path('experiment_data')
-
-def analizar_resultados():
-    """Analiza y muestra estadísticas de los resultados"""
+from experiment_store import ExperimentStore, StoreNotReady
+from analysis_cache import summarize_store, summarize_json_dir
+from result_columns import load_from_store, load_from_json_dir
+import signal_detection
 
-    if not DATA_DIR.exists():
-        print(f"ERROR: No se encontró la carpeta {DATA_DIR}")
-        return
+DATA_DIR = Path('experiment_data')
 
-    participant_files = list(DATA_DIR.glob('P*.json'))
 
-    if not participant_files:
-        print(f"No se encontraron participantes en {DATA_DIR}")
+def _numero(value):
+    """Número para mostrar: sin decimales si es entero (como en los datos)"""
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def analizar_resultados(json_dir=None, workers=None, use_cache=True):
+    """
+    Analiza y muestra estadísticas de los resultados
+
+    Args:
+        json_dir: carpeta con P*.json a analizar en lugar de la base de datos
+        workers: procesos para leer los P*.json (None = uno por núcleo)
+        use_cache: partir de los agregados guardados en la última ejecución
+    """
+
+    if json_dir is not None:
+        if not Path(json_dir).exists():
+            print(f"ERROR: No se encontró la carpeta {json_dir}")
+            return
+        # Solo se leen los P*.json nuevos o modificados desde la última vez
+        resumen = summarize_json_dir(json_dir, workers, use_cache)
+        origen = json_dir
+    else:
+        if not DATA_DIR.exists():
+            print(f"ERROR: No se encontró la carpeta {DATA_DIR}")
+            return
+        try:
+            store = ExperimentStore(DATA_DIR, readonly=True)
+        except StoreNotReady as e:
+            print(f"ERROR: {e}")
+            return
+        try:
+            # Solo se leen las filas añadidas desde la última vez
+            resumen = summarize_store(store, DATA_DIR, use_cache)
+        finally:
+            store.close()
+        origen = DATA_DIR
+
+    t = resumen['totales']
+    if not t['participantes']:
+        print(f"No se encontraron participantes en {origen}")
         return
 
-    # Estadísticas globales
-    total_participantes = len(participant_files)
-    completados = 0
-    total_respuestas = 0
-
-    # Por tipo de video
-    respuestas_fake = []
-    respuestas_real = []
-    respuestas_evidentes = []
-
-    # Causas fake
-    causas_counter = Counter()
-
-    # Tiempos de respuesta
-    tiempos = []
-
-    # Demografía
-    generos = Counter()
-    edades = []
-
     print("\n" + "="*70)
     print("  ANÁLISIS DE RESULTADOS DEL EXPERIMENTO")
     print("="*70)
 
-    # Procesar cada participante
-    for participant_file in participant_files:
-        with open(participant_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        if data.get('completado', False):
-            completados += 1
-
-        generos[data['genero']] += 1
-        edades.append(data['edad'])
+    total_participantes = t['participantes']
+    completados = t['completados']
 
-        for respuesta in data.get('respuestas', []):
-            total_respuestas += 1
+    def promedio(categoria):
+        return t[f'{categoria}_suma'] / t[f'{categoria}_n']
 
-            # Clasificar por tipo
-            if respuesta.get('es_evidente', False):
-                respuestas_evidentes.append(respuesta['respuesta_slider'])
-            elif respuesta.get('es_fake', False):
-                respuestas_fake.append(respuesta['respuesta_slider'])
-            else:
-                respuestas_real.append(respuesta['respuesta_slider'])
-
-            # Causas
-            if respuesta.get('causa_fake'):
-                causas_counter[respuesta['causa_fake']] += 1
-
-            # Tiempos
-            tiempos.append(respuesta.get('tiempo_respuesta_segundos', 0))
+    def desviacion(campo):
+        n = t[f'{campo}_n']
+        media = t[f'{campo}_suma'] / n
+        return max(t[f'{campo}_cuadrados'] / n - media ** 2, 0) ** 0.5
 
     # Mostrar resultados
     print(f"\n📊 RESUMEN GENERAL")
     print(f"  Total de participantes: {total_participantes}")
     print(f"  Participantes que completaron: {completados} ({completados/total_participantes*100:.1f}%)")
-    print(f"  Total de respuestas: {total_respuestas}")
+    print(f"  Total de respuestas: {t['respuestas']}")
 
     print(f"\n👥 DEMOGRAFÍA")
-    print(f"  Edad promedio: {sum(edades)/len(edades):.1f} años")
-    print(f"  Edad mínima: {min(edades)} años")
-    print(f"  Edad máxima: {max(edades)} años")
+    if t['edad_n']:
+        print(f"  Edad promedio: {t['edad_suma']/t['edad_n']:.1f} años")
+        print(f"  Edad mínima: {_numero(t['edad_min'])} años")
+        print(f"  Edad máxima: {_numero(t['edad_max'])} años")
     print(f"  Distribución por género:")
-    for genero, count in generos.items():
+    for genero, count in resumen['genero']:
         print(f"    - {genero}: {count} ({count/total_participantes*100:.1f}%)")
 
     print(f"\n🎬 VALORACIONES PROMEDIO (Escala 1-10)")
-    print(f"  Videos evidentes (fake obvio): {sum(respuestas_evidentes)/len(respuestas_evidentes):.2f}" if respuestas_evidentes else "  Videos evidentes: N/A")
-    print(f"  Videos fake (no evidentes): {sum(respuestas_fake)/len(respuestas_fake):.2f}" if respuestas_fake else "  Videos fake: N/A")
-    print(f"  Videos reales: {sum(respuestas_real)/len(respuestas_real):.2f}" if respuestas_real else "  Videos reales: N/A")
+    print(f"  Videos evidentes (fake obvio): {promedio('evidente'):.2f}" if t['evidente_n'] else "  Videos evidentes: N/A")
+    print(f"  Videos fake (no evidentes): {promedio('fake'):.2f}" if t['fake_n'] else "  Videos fake: N/A")
+    print(f"  Videos reales: {promedio('real'):.2f}" if t['real_n'] else "  Videos reales: N/A")
 
     # Tasa de detección
-    if respuestas_fake:
-        fake_detectados = sum(1 for r in respuestas_fake if r >= 6)
+    if t['fake_n']:
+        fake_detectados = t['fake_marcados_fake']
         print(f"\n🎯 TASA DE DETECCIÓN")
-        print(f"  Videos fake detectados (slider ≥ 6): {fake_detectados}/{len(respuestas_fake)} ({fake_detectados/len(respuestas_fake)*100:.1f}%)")
+        print(f"  Videos fake detectados (slider ≥ 6): {fake_detectados}/{t['fake_n']} ({fake_detectados/t['fake_n']*100:.1f}%)")
 
-    if respuestas_real:
-        real_correctos = sum(1 for r in respuestas_real if r <= 5)
-        print(f"  Videos reales correctos (slider ≤ 5): {real_correctos}/{len(respuestas_real)} ({real_correctos/len(respuestas_real)*100:.1f}%)")
+    if t['real_n']:
+        real_correctos = t['real_marcados_real']
+        print(f"  Videos reales correctos (slider ≤ 5): {real_correctos}/{t['real_n']} ({real_correctos/t['real_n']*100:.1f}%)")
 
-    print(f"\n⏱️  TIEMPOS DE RESPUESTA")
-    print(f"  Promedio: {sum(tiempos)/len(tiempos):.1f} segundos")
-    print(f"  Mínimo: {min(tiempos)} segundos")
-    print(f"  Máximo: {max(tiempos)} segundos")
+    if t['tiempo_n']:
+        print(f"\n⏱️  TIEMPOS DE RESPUESTA")
+        print(f"  Promedio: {t['tiempo_suma']/t['tiempo_n']:.1f} segundos")
+        print(f"  Desviación típica: {desviacion('tiempo'):.1f} segundos")
+        print(f"  Mínimo: {_numero(t['tiempo_min'])} segundos")
+        print(f"  Máximo: {_numero(t['tiempo_max'])} segundos")
 
-    if causas_counter:
+    if resumen['causas']:
         print(f"\n🔍 CAUSAS MÁS COMUNES PARA DETECTAR FAKE (Top 10)")
-        for causa, count in causas_counter.most_common(10):
+        # Orden estable: a igual número, la que apareció antes (como Counter.most_common)
+        for causa, count in sorted(resumen['causas'], key=lambda item: -item[1])[:10]:
             # Convertir código a texto legible
             causa_texto = causa.replace('_', ' ').title()
             print(f"  {count:3d}x  {causa_texto}")
 
+    leidos = resumen['leidos']
+    if use_cache:
+        print(f"\n  (Leídos en esta ejecución: {leidos['unidades']} "
+              f"{'archivos' if json_dir is not None else 'participantes nuevos'}, "
+              f"{leidos['respuestas']} respuestas; el resto viene de la caché)")
+
     print("\n" + "="*70)
     print("  Para análisis detallado, exporta los datos a Excel")
     print("  Ejecuta: python export_to_excel.py")
     print("="*70 + "\n")
 
+def analizar_deteccion(json_dir=None, workers=None, resamples=signal_detection.RESAMPLES,
+                       seed=signal_detection.SEED, confidence=signal_detection.CONFIDENCE):
+    """
+    Muestra d', criterio y AUC por grupo con intervalos bootstrap
+
+    Args:
+        json_dir: carpeta con P*.json a analizar en lugar de la base de datos
+        workers: procesos / hilos (None = uno por núcleo)
+        resamples: remuestreos bootstrap (0 = sin intervalos)
+        seed: semilla del bootstrap
+        confidence: nivel de confianza de los intervalos
+    """
+    if json_dir is not None:
+        if not Path(json_dir).exists():
+            print(f"ERROR: No se encontró la carpeta {json_dir}")
+            return
+        columns = load_from_json_dir(json_dir, workers)
+    else:
+        if not DATA_DIR.exists():
+            print(f"ERROR: No se encontró la carpeta {DATA_DIR}")
+            return
+        try:
+            store = ExperimentStore(DATA_DIR, readonly=True)
+        except StoreNotReady as e:
+            print(f"ERROR: {e}")
+            return
+        try:
+            columns = load_from_store(store)
+        finally:
+            store.close()
+
+    filas = signal_detection.analyze(columns, resamples, seed, confidence, workers)
+    if not filas:
+        print("No hay respuestas suficientes para el análisis de detección")
+        return
+
+    def medida(valor, decimales):
+        estimacion, inferior, superior = valor
+        if estimacion != estimacion:  # NaN: falta señal o ruido en el grupo
+            return f"{'N/A':<24}"
+        texto = f"{estimacion:.{decimales}f}"
+        if inferior == inferior:
+            texto += f" [{inferior:.{decimales}f}, {superior:.{decimales}f}]"
+        return f"{texto:<24}"
+
+    print("\n" + "="*70)
+    print("  DETECCIÓN DE SEÑALES (videos IA = señal, reales = ruido)")
+    print("="*70)
+    print(f"  Umbral: slider ≥ {signal_detection.DETECTION_THRESHOLD}  |  "
+          f"IC {confidence*100:.0f}% bootstrap por participante: {resamples} remuestreos, semilla {seed}")
+    print(f"  Evidentes: controles, no cuentan como señal (fila 'control')\n")
+
+    print(f"  {'Grupo':<16}{'Nivel':<18}{'N IA':>6}{'N real':>8}  {'d prima':<24}{'criterio c':<24}{'AUC'}")
+    grupo_anterior = None
+    for fila in filas:
+        if fila['grupo'] != grupo_anterior and grupo_anterior is not None:
+            print()
+        grupo = fila['grupo'] if fila['grupo'] != grupo_anterior else ''
+        grupo_anterior = fila['grupo']
+        print(f"  {grupo:<16}{str(fila['nivel'])[:17]:<18}{fila['n_senal']:>6}{fila['n_ruido']:>8}  "
+              f"{medida(fila['d_prima'], 2)}{medida(fila['criterio'], 2)}{medida(fila['auc'], 3)}")
+    print("\n" + "="*70 + "\n")
+
+
 if __name__ == '__main__':
-    analizar_resultados()
+    parser = argparse.ArgumentParser(description='Analiza los resultados del experimento')
+    parser.add_argument('--json', metavar='CARPETA', help='analizar los P*.json de CARPETA en lugar de la base de datos')
+    parser.add_argument('--workers', type=int, help='procesos para leer los P*.json (por defecto, uno por núcleo)')
+    parser.add_argument('--sin-cache', action='store_true', help='releer todos los datos (reconstruye la caché)')
+    parser.add_argument('--deteccion', action='store_true',
+                        help="d', criterio y AUC por grupo con intervalos bootstrap")
+    parser.add_argument('--remuestreos', type=int, default=signal_detection.RESAMPLES,
+                        help=f'remuestreos bootstrap (por defecto {signal_detection.RESAMPLES})')
+    parser.add_argument('--semilla', type=int, default=signal_detection.SEED,
+                        help=f'semilla del bootstrap (por defecto {signal_detection.SEED})')
+    parser.add_argument('--confianza', type=float, default=signal_detection.CONFIDENCE,
+                        help='nivel de confianza de los intervalos (por defecto 0.95)')
+    args = parser.parse_args()
+    if args.deteccion:
+        analizar_deteccion(args.json, args.workers, args.remuestreos, args.semilla, args.confianza)
+    else:
+        analizar_resultados(args.json, args.workers, not args.sin_cache)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Caché incremental de los agregados de analizar_resultados.py
+
+Los agregados del análisis (conteos, sumas y sumas de cuadrados, mínimos y
+máximos, conteos por género y por causa) se pueden combinar sumando, así
+que no hace falta releer todos los datos en cada ejecución:
+
+  - Desde la base de datos SQLite se guarda la última fila leída de
+    participants y de responses: cada ejecución solo carga las filas nuevas
+    y las suma al total guardado. (El número de completados se consulta
+    siempre, porque finalizar modifica filas ya leídas.)
+  - Desde una carpeta de P*.json se guarda una fila de agregados por
+    archivo, con su tamaño y mtime (y los de su P*.log): solo se vuelven a
+    leer los archivos nuevos o modificados, y los borrados se descartan.
+
+La caché es un .npz junto a los datos; si no se puede leer o es de otra
+versión se reconstruye desde cero.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from experiment_stats import CATEGORIAS
+from result_columns import load_from_store, load_from_json_dir
+
+CACHE_FILE = 'analysis_cache.npz'
+CACHE_VERSION = 1
+
+# Umbrales de analizar_resultados.py: slider >= 6 "parece falso", <= 5 "parece real"
+FAKE_THRESHOLD = 6
+REAL_THRESHOLD = 5
+
+# Columnas que se combinan sumando
+SUM_FIELDS = (
+    ('participantes', 'completados', 'edad_n', 'edad_suma', 'edad_cuadrados', 'respuestas')
+    + tuple(f'{c}_{name}' for c in CATEGORIAS
+            for name in ('n', 'suma', 'cuadrados', 'marcados_fake', 'marcados_real'))
+    + ('tiempo_n', 'tiempo_suma', 'tiempo_cuadrados')
+)
+# Columnas que se combinan con mínimo / máximo (NaN = sin datos)
+MIN_FIELDS = ('edad_min', 'tiempo_min')
+MAX_FIELDS = ('edad_max', 'tiempo_max')
+FIELDS = SUM_FIELDS + MIN_FIELDS + MAX_FIELDS
+_COLUMN = {name: i for i, name in enumerate(FIELDS)}
+
+# Conteos por etiqueta (una columna por etiqueta, en orden de aparición)
+COUNT_LABELS = ('genero', 'causa_fake')
+
+
+def summarize_store(store, data_dir, use_cache=True):
+    """
+    Agregados de la base de datos, leyendo solo las filas nuevas
+
+    Returns:
+        dict de resumen (ver _summary)
+    """
+    cache_path = Path(data_dir) / CACHE_FILE
+    # La fecha de creación de la base de datos la identifica (si se reemplaza, desde cero)
+    database = store.query("SELECT value FROM meta WHERE key = 'json_import'")[0][0]
+    cache = _load(cache_path) if use_cache else None
+    if cache is not None and (cache['meta'].get('source'), cache['meta'].get('database')) != ('sqlite', database):
+        cache = None
+
+    since = tuple(cache['meta']['watermark']) if cache is not None else (0, 0)
+    columns = load_from_store(store, since)
+    if any(new < old for new, old in zip(columns.watermark, since)):
+        # La base de datos es otra (menos filas que las ya leídas): desde cero
+        cache, since = None, (0, 0)
+        columns = load_from_store(store, since)
+
+    labels = cache['meta']['labels'] if cache is not None else {name: [] for name in COUNT_LABELS}
+    rows, counts = _unit_aggregates(columns, np.zeros(columns.total_respuestas, dtype=np.intp), 1, labels,
+                                    participant_units=np.zeros(columns.total_participantes, dtype=np.intp))
+    if cache is not None:
+        rows = np.vstack([cache['rows'], rows])
+        counts = {name: _stack_counts(cache['counts'][name], counts[name]) for name in COUNT_LABELS}
+
+    total, total_counts = _reduce(rows, counts)
+    _save(cache_path, {'source': 'sqlite', 'database': database,
+                       'watermark': list(columns.watermark), 'labels': labels},
+          total[None, :], {name: total_counts[name][None, :] for name in COUNT_LABELS})
+
+    # Finalizar cambia filas ya leídas: completados siempre de la base de datos
+    total[_COLUMN['completados']] = store.query('SELECT COUNT(*) FROM participants WHERE completado = 1')[0][0]
+    return _summary(total, total_counts, labels, nuevos=columns.total_participantes,
+                    respuestas_nuevas=columns.total_respuestas)
+
+
+def summarize_json_dir(data_dir, workers=None, use_cache=True):
+    """
+    Agregados de los P*.json de una carpeta, releyendo solo los archivos cambiados
+
+    Returns:
+        dict de resumen (ver _summary)
+    """
+    data_dir = Path(data_dir)
+    cache_path = data_dir / CACHE_FILE
+    cache = _load(cache_path) if use_cache else None
+    if cache is not None and cache['meta'].get('source') != 'json':
+        cache = None
+
+    # Estado actual de cada archivo: (tamaño, mtime) del P*.json más su P*.log
+    current = {}
+    for entry in os.scandir(data_dir):
+        if entry.name.startswith('P') and entry.name.endswith('.json') and entry.is_file():
+            stat = entry.stat()
+            size, mtime = stat.st_size, stat.st_mtime_ns
+            log_path = os.path.join(data_dir, entry.name[:-5] + '.log')
+            if os.path.exists(log_path):
+                log_stat = os.stat(log_path)
+                size, mtime = size + log_stat.st_size, max(mtime, log_stat.st_mtime_ns)
+            current[entry.path] = (size, mtime)
+
+    labels = {name: [] for name in COUNT_LABELS}
+    kept_paths, kept_rows, kept_counts = [], None, {name: None for name in COUNT_LABELS}
+    if cache is not None:
+        labels = cache['meta']['labels']
+        cached_keys = dict(zip(cache['paths'].tolist(),
+                               zip(cache['sizes'].tolist(), cache['mtimes'].tolist())))
+        keep = np.array([current.get(path) == key for path, key in cached_keys.items()], dtype=bool)
+        kept_paths = [path for path, ok in zip(cached_keys, keep) if ok]
+        kept_rows = cache['rows'][keep]
+        kept_counts = {name: cache['counts'][name][keep] for name in COUNT_LABELS}
+
+    kept = set(kept_paths)
+    changed = sorted(path for path in current if path not in kept)
+    columns = load_from_json_dir(data_dir, workers, changed) if changed else None
+
+    paths = kept_paths + changed
+    if columns is not None:
+        # Una unidad por archivo: cada participante cuenta en el de su archivo
+        unit_of = {path: i for i, path in enumerate(changed)}
+        participant_units = np.array([unit_of[source] for source in columns.sources], dtype=np.intp)
+        response_units = participant_units[columns.participant]
+        rows, counts = _unit_aggregates(columns, response_units, len(changed), labels, participant_units)
+        if kept_rows is not None:
+            rows = np.vstack([kept_rows, rows])
+            counts = {name: _stack_counts(kept_counts[name], counts[name]) for name in COUNT_LABELS}
+    elif kept_rows is not None:
+        rows, counts = kept_rows, kept_counts
+    else:
+        rows = np.zeros((0, len(FIELDS)))
+        counts = {name: np.zeros((0, len(labels[name])), dtype=np.int64) for name in COUNT_LABELS}
+
+    keys = np.array([current[path] for path in paths], dtype=np.int64).reshape(-1, 2)
+    _save(cache_path, {'source': 'json', 'labels': labels}, rows, counts,
+          paths=np.array(paths, dtype=str), sizes=keys[:, 0], mtimes=keys[:, 1])
+
+    total, total_counts = _reduce(rows, counts)
+    return _summary(total, total_counts, labels, nuevos=len(changed),
+                    respuestas_nuevas=columns.total_respuestas if columns is not None else 0)
+
+
+def _unit_aggregates(columns, response_units, n_units, labels, participant_units):
+    """
+    Agregados por unidad (archivo o lote de filas nuevas), vectorizados
+
+    Args:
+        columns: ResultColumns con las filas a agregar
+        response_units: unidad de cada respuesta
+        n_units: número de unidades
+        labels: etiquetas de la caché por columna de conteo (se amplían)
+        participant_units: unidad de cada participante
+
+    Returns:
+        (matriz n_units x FIELDS, dict columna -> matriz n_units x etiquetas)
+    """
+    rows = np.zeros((n_units, len(FIELDS)))
+
+    def add(name, units, weights=None):
+        rows[:, _COLUMN[name]] += np.bincount(units, weights=weights, minlength=n_units)
+
+    edad = columns.edad
+    con_edad = ~np.isnan(edad)
+    add('participantes', participant_units)
+    add('completados', participant_units, columns.completado.astype(float))
+    add('edad_n', participant_units[con_edad])
+    add('edad_suma', participant_units[con_edad], edad[con_edad])
+    add('edad_cuadrados', participant_units[con_edad], edad[con_edad] ** 2)
+    add('respuestas', response_units)
+
+    slider = columns.slider
+    con_slider = ~np.isnan(slider)
+    for code, categoria in enumerate(CATEGORIAS):
+        mask = con_slider & (columns.categoria == code)
+        units, values = response_units[mask], slider[mask]
+        add(f'{categoria}_n', units)
+        add(f'{categoria}_suma', units, values)
+        add(f'{categoria}_cuadrados', units, values ** 2)
+        add(f'{categoria}_marcados_fake', units[values >= FAKE_THRESHOLD])
+        add(f'{categoria}_marcados_real', units[values <= REAL_THRESHOLD])
+
+    tiempo = columns.tiempo
+    add('tiempo_n', response_units)
+    add('tiempo_suma', response_units, tiempo)
+    add('tiempo_cuadrados', response_units, tiempo ** 2)
+
+    for name, units, values in (('edad', participant_units[con_edad], edad[con_edad]),
+                                ('tiempo', response_units, tiempo)):
+        minimum = np.full(n_units, np.inf)
+        maximum = np.full(n_units, -np.inf)
+        np.minimum.at(minimum, units, values)
+        np.maximum.at(maximum, units, values)
+        rows[:, _COLUMN[f'{name}_min']] = np.where(np.isinf(minimum), np.nan, minimum)
+        rows[:, _COLUMN[f'{name}_max']] = np.where(np.isinf(maximum), np.nan, maximum)
+
+    counts = {}
+    for name, units, codes in (('genero', participant_units, columns.genero),
+                               ('causa_fake', response_units, columns.causa_fake)):
+        # Códigos de estas columnas -> columnas de la caché (añadiendo etiquetas nuevas)
+        known = {label: i for i, label in enumerate(labels[name])}
+        for label in columns.labels[name].labels:
+            if label not in known:
+                known[label] = len(labels[name])
+                labels[name].append(label)
+        mapping = np.array([known[label] for label in columns.labels[name].labels] + [-1], dtype=np.intp)
+        cache_codes = mapping[codes]
+        valid = cache_codes >= 0
+        matrix = np.zeros((n_units, len(labels[name])), dtype=np.int64)
+        np.add.at(matrix, (units[valid], cache_codes[valid]), 1)
+        counts[name] = matrix
+    return rows, counts
+
+
+def _stack_counts(old, new):
+    """Apila matrices de conteos cuyo número de etiquetas puede haber crecido"""
+    width = max(old.shape[1], new.shape[1])
+    old = np.pad(old, ((0, 0), (0, width - old.shape[1])))
+    new = np.pad(new, ((0, 0), (0, width - new.shape[1])))
+    return np.vstack([old, new])
+
+
+def _reduce(rows, counts):
+    """Combina todas las unidades en un total"""
+    total = np.zeros(len(FIELDS))
+    if len(rows):
+        total[:len(SUM_FIELDS)] = rows[:, :len(SUM_FIELDS)].sum(axis=0)
+        for name in MIN_FIELDS:
+            column = rows[:, _COLUMN[name]]
+            total[_COLUMN[name]] = np.nanmin(column) if not np.isnan(column).all() else np.nan
+        for name in MAX_FIELDS:
+            column = rows[:, _COLUMN[name]]
+            total[_COLUMN[name]] = np.nanmax(column) if not np.isnan(column).all() else np.nan
+    else:
+        total[len(SUM_FIELDS):] = np.nan
+    return total, {name: matrix.sum(axis=0) for name, matrix in counts.items()}
+
+
+def _summary(total, total_counts, labels, nuevos, respuestas_nuevas):
+    """Resumen para mostrar: campos del total, conteos por etiqueta y lo leído en esta ejecución"""
+    values = {name: total[i] for i, name in enumerate(FIELDS)}
+    for name in SUM_FIELDS:
+        values[name] = int(values[name]) if values[name].is_integer() else float(values[name])
+    return {
+        'totales': values,
+        'genero': [(label, int(count)) for label, count in zip(labels['genero'], total_counts['genero'])
+                   if count],
+        'causas': [(label, int(count)) for label, count in zip(labels['causa_fake'], total_counts['causa_fake'])
+                   if count],
+        'leidos': {'unidades': nuevos, 'respuestas': respuestas_nuevas}
+    }
+
+
+def _load(cache_path):
+    try:
+        with np.load(cache_path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != CACHE_VERSION or meta.get('fields') != list(FIELDS):
+                return None
+            cache = {'meta': meta, 'rows': data['rows'],
+                     'counts': {name: data[f'counts_{name}'] for name in COUNT_LABELS}}
+            for name in ('paths', 'sizes', 'mtimes'):
+                if name in data:
+                    cache[name] = data[name]
+            return cache
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _save(cache_path, meta, rows, counts, **arrays):
+    meta = dict(meta, version=CACHE_VERSION, fields=list(FIELDS))
+    tmp_path = cache_path.with_name(cache_path.name + '.tmp.npz')
+    try:
+        np.savez(tmp_path, meta=np.array(json.dumps(meta, ensure_ascii=False)), rows=rows,
+                 **{f'counts_{name}': counts[name] for name in COUNT_LABELS}, **arrays)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"  Advertencia: no se pudo guardar la caché del análisis: {e}")
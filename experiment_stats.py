@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Estadísticas del experimento mantenidas en memoria
+
+El servidor actualiza el agregado en cada alta, respuesta y finalización,
+así /get-stats no tiene que recorrer los datos. Al arrancar se recupera del
+último checkpoint en disco si sigue al día con la base de datos; si no, se
+reconstruye una vez a partir de ella. El checkpoint se reescribe cada
+CHECKPOINT_EVERY escrituras y al detener el servidor.
+"""
+
+import json
+import os
+import threading
+from collections import Counter
+from pathlib import Path
+
+CHECKPOINT_FILE = 'stats_checkpoint.json'
+CHECKPOINT_EVERY = 100
+CHECKPOINT_VERSION = 1
+
+# Misma regla que analizar_resultados.py: slider >= 6 es "parece falso"
+DETECTION_THRESHOLD = 6
+
+GENEROS = ('masculino', 'femenino', 'otro')
+CATEGORIAS = ('evidente', 'fake', 'real')
+
+
+def response_category(response):
+    """Categoría de una respuesta: evidente, fake (no evidente) o real"""
+    if response.get('es_evidente'):
+        return 'evidente'
+    if response.get('es_fake'):
+        return 'fake'
+    return 'real'
+
+
+class _SliderSum:
+    """Número de respuestas, suma del slider y aciertos de una categoría"""
+
+    __slots__ = ('count', 'total', 'correct')
+
+    def __init__(self, count=0, total=0, correct=0):
+        self.count = count
+        self.total = total
+        self.correct = correct
+
+    def add(self, slider, correct):
+        self.count += 1
+        self.total += slider
+        self.correct += int(correct)
+
+    def mean(self):
+        return round(self.total / self.count, 2) if self.count else 0
+
+    def rate(self):
+        return round(self.correct / self.count * 100, 1) if self.count else 0
+
+    def to_record(self):
+        return [self.count, self.total, self.correct]
+
+
+class ExperimentStats:
+    """Agregado incremental de participantes y respuestas"""
+
+    def __init__(self, data_dir):
+        self.checkpoint_path = Path(data_dir) / CHECKPOINT_FILE
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        self._writes = 0
+        self._reset()
+
+    def _reset(self):
+        self.total_participantes = 0
+        self.completados = 0
+        self.edad_total = 0
+        self.edad_count = 0
+        self.generos = Counter()
+        self.total_respuestas = 0
+        self.filas_respuestas = 0
+        self.categorias = {categoria: _SliderSum() for categoria in CATEGORIAS}
+        self.tipos_contenido = {}
+
+    # --- Actualizaciones ---
+
+    def participant_started(self, participant_data):
+        with self._lock:
+            self._add_participant(participant_data.get('genero'), participant_data.get('edad'),
+                                  participant_data.get('completado', False))
+            self._wrote()
+
+    def responses_saved(self, responses):
+        """Respuestas ya escritas en la base de datos (SessionCache on_written)"""
+        with self._lock:
+            for response in responses:
+                self._add_response(response)
+                self._wrote()
+
+    def participant_finished(self):
+        with self._lock:
+            self.completados += 1
+            self._wrote()
+
+    def _add_participant(self, genero, edad, completado):
+        self.total_participantes += 1
+        if completado:
+            self.completados += 1
+        if edad and isinstance(edad, (int, float)):
+            self.edad_total += edad
+            self.edad_count += 1
+        self.generos[(genero or '').lower()] += 1
+
+    def _add_response(self, response):
+        self.filas_respuestas += 1
+        slider = response.get('respuesta_slider')
+        if not isinstance(slider, (int, float)):
+            return
+        self.total_respuestas += 1
+
+        categoria = response_category(response)
+        # Acierto: fake/evidente marcado como falso, real como real
+        correct = slider >= DETECTION_THRESHOLD if categoria != 'real' else slider < DETECTION_THRESHOLD
+        self.categorias[categoria].add(slider, correct)
+
+        tipo = response.get('tipo_contenido') or 'desconocido'
+        self.tipos_contenido.setdefault(tipo, _SliderSum()).add(slider, correct)
+
+    # --- Consulta ---
+
+    def snapshot(self):
+        """Estadísticas para /get-stats (mismos campos de siempre + métricas en vivo)"""
+        with self._lock:
+            total_genero = sum(self.generos[genero] for genero in GENEROS)
+
+            def porcentaje(count, total):
+                return round(count / total * 100, 1) if total else 0
+
+            genero = {g: self.generos[g] for g in GENEROS}
+            genero.update({f'porcentaje_{g}': porcentaje(self.generos[g], total_genero) for g in GENEROS})
+
+            return {
+                'total_participantes': self.total_participantes,
+                'edad_promedio': self.edad_total / self.edad_count if self.edad_count else 0,
+                'genero': genero,
+                'total_respuestas': self.total_respuestas,
+                'completados': self.completados,
+                'tasa_completado': porcentaje(self.completados, self.total_participantes),
+                'slider_promedio': {
+                    categoria: sums.mean() for categoria, sums in self.categorias.items()
+                },
+                'slider_promedio_tipo_contenido': {
+                    tipo: sums.mean() for tipo, sums in sorted(self.tipos_contenido.items())
+                },
+                'deteccion': {
+                    'umbral': DETECTION_THRESHOLD,
+                    'fake_detectados': self.categorias['fake'].correct,
+                    'tasa_deteccion': self.categorias['fake'].rate(),
+                    'evidentes_detectados': self.categorias['evidente'].correct,
+                    'tasa_deteccion_evidentes': self.categorias['evidente'].rate(),
+                    'reales_correctos': self.categorias['real'].correct,
+                    'tasa_reales_correctos': self.categorias['real'].rate(),
+                    'tasa_aciertos_tipo_contenido': {
+                        tipo: sums.rate() for tipo, sums in sorted(self.tipos_contenido.items())
+                    }
+                }
+            }
+
+    # --- Arranque y checkpoint ---
+
+    def load_or_rebuild(self, store):
+        """Carga el checkpoint si coincide con la base de datos; si no, reconstruye"""
+        if self._load_checkpoint(_watermark(store)):
+            print(f"==> Estadísticas cargadas del checkpoint ({self.total_participantes} participantes)")
+            return
+
+        with self._lock:
+            self._reset()
+            for row in store.query('SELECT genero, edad, completado FROM participants'):
+                self._add_participant(row['genero'], row['edad'], row['completado'])
+            for row in store.query(
+                'SELECT es_fake, es_evidente, tipo_contenido, respuesta_slider FROM responses'
+            ):
+                self._add_response(dict(row))
+        print(f"==> Estadísticas reconstruidas ({self.total_participantes} participantes, "
+              f"{self.total_respuestas} respuestas)")
+        self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Escribe el agregado a disco
+
+        La marca guardada son los propios contadores (participantes,
+        completados, filas de respuestas), así el checkpoint describe
+        exactamente lo que incluye aunque haya escrituras en curso.
+        """
+        with self._lock:
+            record = {
+                'version': CHECKPOINT_VERSION,
+                'watermark': self._watermark(),
+                'total_participantes': self.total_participantes,
+                'completados': self.completados,
+                'edad_total': self.edad_total,
+                'edad_count': self.edad_count,
+                'generos': dict(self.generos),
+                'total_respuestas': self.total_respuestas,
+                'categorias': {k: v.to_record() for k, v in self.categorias.items()},
+                'tipos_contenido': {k: v.to_record() for k, v in self.tipos_contenido.items()}
+            }
+            self._writes = 0
+
+        with self._checkpoint_lock:
+            tmp_path = self.checkpoint_path.with_name(self.checkpoint_path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(tmp_path, self.checkpoint_path)
+
+    def needs_checkpoint(self):
+        with self._lock:
+            return self._writes >= CHECKPOINT_EVERY
+
+    def _wrote(self):
+        self._writes += 1
+
+    def _watermark(self):
+        return [self.total_participantes, self.completados, self.filas_respuestas]
+
+    def _load_checkpoint(self, watermark):
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if record.get('version') != CHECKPOINT_VERSION or record.get('watermark') != watermark:
+            return False
+
+        with self._lock:
+            self._reset()
+            self.total_participantes = record['total_participantes']
+            self.completados = record['completados']
+            self.edad_total = record['edad_total']
+            self.edad_count = record['edad_count']
+            self.generos = Counter(record['generos'])
+            self.total_respuestas = record['total_respuestas']
+            self.filas_respuestas = record['watermark'][2]
+            self.categorias = {k: _SliderSum(*v) for k, v in record['categorias'].items()}
+            self.tipos_contenido = {k: _SliderSum(*v) for k, v in record['tipos_contenido'].items()}
+        return True
+
+
+def _watermark(store):
+    """Participantes, completados y filas de respuestas en la base de datos"""
+    row = store.query("""
+        SELECT (SELECT COUNT(*) FROM participants),
+               (SELECT COUNT(*) FROM participants WHERE completado = 1),
+               (SELECT COUNT(*) FROM responses)
+    """)[0]
+    return list(row)
@@ -0,0 +1,678 @@
+#!/usr/bin/env python3
+"""
+Almacenamiento de los datos de participantes en SQLite
+
+Todos los datos del experimento viven en experiment_data/experiment.db
+(modo WAL). Guardar una respuesta es un INSERT; con WAL y synchronous=NORMAL
+los commits no hacen fsync uno a uno, sino que se sincronizan en lote en cada
+checkpoint. Las estadísticas y exportaciones son consultas sobre índices en
+lugar de leer todos los P*.json.
+
+Formato compacto: los datos de cada video (path, es_fake, calidad,
+tipo_contenido, es_evidente, folder) se guardan una sola vez en la tabla
+videos; los videos asignados (assigned_videos) y las respuestas
+(response_records) solo guardan su id. Las vistas participant_videos y
+responses reconstruyen las filas completas de siempre, así que las
+consultas y exportaciones no cambian.
+
+La primera vez que se abre la base de datos se importan los P*.json (y los
+logs P*.log de sesiones sin terminar) existentes. También se puede lanzar a
+mano: python experiment_store.py
+
+Los scripts de análisis y exportación abren la base de datos con
+readonly=True: no crean el esquema, ni migran, ni importan, ni escriben
+checkpoints, así que no compiten por el bloqueo con el servidor en marcha.
+"""
+
+import json
+import math
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DATA_DIR = Path('experiment_data')
+DB_FILE = 'experiment.db'
+
+PARTICIPANT_FIELDS = ('id', 'genero', 'edad', 'fecha_inicio', 'completado', 'fecha_finalizacion')
+VIDEO_FIELDS = ('path', 'es_fake', 'calidad', 'tipo_contenido', 'es_evidente', 'folder')
+RESPONSE_FIELDS = (
+    'fecha_hora', 'numero_video', 'video_path', 'tipo_contenido', 'es_fake', 'es_evidente',
+    'calidad', 'respuesta_slider', 'causa_fake', 'tiempo_respuesta_segundos'
+)
+BOOLEAN_FIELDS = ('completado', 'es_fake', 'es_evidente')
+
+# Tipo de cada campo de una respuesta recibida del cliente
+RESPONSE_TYPES = {
+    'fecha_hora': str, 'numero_video': int, 'video_path': str, 'tipo_contenido': str,
+    'es_fake': bool, 'es_evidente': bool, 'calidad': str, 'respuesta_slider': float,
+    'causa_fake': str, 'tiempo_respuesta_segundos': float
+}
+
+SCHEMA_VERSION = '2'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS participants (
+    id TEXT PRIMARY KEY,
+    genero TEXT,
+    edad NUMERIC,
+    fecha_inicio TEXT,
+    completado INTEGER NOT NULL DEFAULT 0,
+    fecha_finalizacion TEXT,
+    extra TEXT
+);
+
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY,
+    path TEXT,
+    es_fake INTEGER,
+    calidad TEXT,
+    tipo_contenido TEXT,
+    es_evidente INTEGER,
+    folder TEXT
+);
+
+CREATE TABLE IF NOT EXISTS assigned_videos (
+    participant_id TEXT NOT NULL REFERENCES participants(id),
+    posicion INTEGER NOT NULL,
+    video_id INTEGER REFERENCES videos(id),
+    PRIMARY KEY (participant_id, posicion)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS response_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    participant_id TEXT NOT NULL REFERENCES participants(id),
+    fecha_hora TEXT,
+    numero_video NUMERIC,
+    video_id INTEGER REFERENCES videos(id),
+    respuesta_slider NUMERIC,
+    causa_fake TEXT,
+    tiempo_respuesta_segundos NUMERIC
+);
+
+CREATE INDEX IF NOT EXISTS idx_videos_path ON videos(path);
+CREATE INDEX IF NOT EXISTS idx_assigned_videos_video ON assigned_videos(video_id);
+CREATE INDEX IF NOT EXISTS idx_response_records_participant ON response_records(participant_id);
+"""
+
+# Filas completas, con las mismas columnas que las antiguas tablas
+VIEWS = """
+CREATE VIEW IF NOT EXISTS participant_videos AS
+    SELECT a.participant_id, a.posicion, v.path, v.es_fake, v.calidad,
+           v.tipo_contenido, v.es_evidente, v.folder
+    FROM assigned_videos a LEFT JOIN videos v ON v.id = a.video_id;
+
+CREATE VIEW IF NOT EXISTS responses AS
+    SELECT r.id, r.participant_id, r.fecha_hora, r.numero_video, v.path AS video_path,
+           v.tipo_contenido, v.es_fake, v.es_evidente, v.calidad,
+           r.respuesta_slider, r.causa_fake, r.tiempo_respuesta_segundos
+    FROM response_records r LEFT JOIN videos v ON v.id = r.video_id;
+"""
+
+# Campos de video de una respuesta (sin folder) y su columna en la vista
+RESPONSE_VIDEO_FIELDS = (('path', 'video_path'), ('es_fake', 'es_fake'), ('calidad', 'calidad'),
+                         ('tipo_contenido', 'tipo_contenido'), ('es_evidente', 'es_evidente'))
+
+
+class InvalidResponse(ValueError):
+    """Un campo de la respuesta no se puede guardar con el tipo de su columna"""
+
+
+class StoreNotReady(Exception):
+    """La base de datos no existe o no está al día (readonly=True no la crea ni la migra)"""
+
+
+def coerce_response(response):
+    """
+    Convierte cada campo de una respuesta al tipo de su columna
+
+    Se aceptan números escritos como texto ('3', '4.5') y 0/1 como
+    booleanos; None se mantiene. Los campos que no están en RESPONSE_TYPES
+    se descartan.
+
+    Raises:
+        InvalidResponse: si un campo no se puede convertir (listas, objetos...)
+    """
+    return {field: _coerce(field, kind, response.get(field)) for field, kind in RESPONSE_TYPES.items()}
+
+
+def _coerce(field, kind, value):
+    if value is None:
+        return None
+    try:
+        if kind is bool:
+            if isinstance(value, bool):
+                return value
+            if isinstance(value, (int, float)) and value in (0, 1):
+                return bool(value)
+        elif isinstance(value, bool):
+            pass
+        elif kind is str:
+            if isinstance(value, (str, int, float)):
+                return str(value)
+        elif isinstance(value, (str, int, float)):
+            number = float(value)
+            if math.isfinite(number):
+                if kind is float:
+                    return number
+                if number.is_integer():
+                    return int(number)
+    except ValueError:
+        pass
+    raise InvalidResponse(f'Campo {field!r} no válido: {value!r}')
+
+
+class ExperimentStore:
+    """Base de datos SQLite del experimento (una conexión por hilo)"""
+
+    def __init__(self, data_dir=DATA_DIR, readonly=False):
+        """
+        Args:
+            data_dir: carpeta de experiment.db
+            readonly: solo consultas (mode=ro); la base de datos debe existir
+                y estar al día, si no se lanza StoreNotReady
+        """
+        self.data_dir = Path(data_dir)
+        self.db_path = self.data_dir / DB_FILE
+        self.readonly = readonly
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        # Versión de los datos: cambia con cada escritura (para ETags). La
+        # generación distingue las versiones de distintos arranques.
+        self.generation = '%x' % int(time.time() * 1000)
+        self.data_version = 0
+        self._version_lock = threading.Lock()
+
+        if readonly:
+            if not self.db_path.exists():
+                raise StoreNotReady(f'No existe {self.db_path}')
+            if self._get_meta('schema_version') != SCHEMA_VERSION or self._get_meta('json_import') is None:
+                self.close()
+                raise StoreNotReady(f'{self.db_path} no está al día: arranca el servidor una vez para actualizarla')
+            return
+
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        if self._table_exists('responses'):
+            self._migrate_to_compact()
+        conn.executescript(SCHEMA)
+        conn.executescript(VIEWS)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)", (SCHEMA_VERSION,))
+        if self._get_meta('json_import') is None:
+            imported = self.import_json_files()
+            if imported:
+                print(f"==> Importados {imported} participantes desde P*.json a {self.db_path}")
+
+    # --- Escritura ---
+
+    def create(self, participant_data):
+        """Guarda un participante nuevo con sus videos asignados"""
+        with self._transaction() as conn:
+            self._insert_participant(conn, participant_data)
+        self._bump_version()
+
+    def append_response(self, participante_id, response):
+        """
+        Añade una respuesta del participante
+
+        Returns:
+            False si el participante no existe
+        """
+        with self._transaction() as conn:
+            if conn.execute('SELECT 1 FROM participants WHERE id = ?', (participante_id,)).fetchone() is None:
+                return False
+            self._insert_response(conn, participante_id, response)
+        self._bump_version()
+        return True
+
+    def append_responses(self, rows):
+        """
+        Añade de una vez (una sola transacción) varias respuestas
+
+        Args:
+            rows: lista de (participante_id, respuesta) de participantes que existen
+        """
+        if not rows:
+            return
+        with self._transaction() as conn:
+            for participante_id, response in rows:
+                self._insert_response(conn, participante_id, response)
+        self._bump_version()
+
+    def finish(self, participante_id, fecha_finalizacion):
+        """
+        Marca el experimento como completado
+
+        Returns:
+            (datos completos del participante o None si no existe,
+             True si no estaba completado antes)
+        """
+        with self._transaction() as conn:
+            row = conn.execute('SELECT completado FROM participants WHERE id = ?', (participante_id,)).fetchone()
+            if row is None:
+                return None, False
+            conn.execute(
+                'UPDATE participants SET completado = 1, fecha_finalizacion = ? WHERE id = ?',
+                (fecha_finalizacion, participante_id)
+            )
+        self._bump_version()
+        return self.load(participante_id), not row['completado']
+
+    # --- Lectura ---
+
+    def load(self, participante_id):
+        """Datos del participante con la forma de los antiguos P*.json, o None"""
+        participants = list(self._iter_participants(self._conn(), 'WHERE id = ?', (participante_id,)))
+        return participants[0] if participants else None
+
+    def exists(self, participante_id):
+        return self._conn().execute(
+            'SELECT 1 FROM participants WHERE id = ?', (participante_id,)
+        ).fetchone() is not None
+
+    def participant_ids(self):
+        return [row[0] for row in self._conn().execute('SELECT id FROM participants ORDER BY id')]
+
+    def iter_participants(self):
+        """
+        Recorre todos los participantes (tres consultas en total)
+
+        Usa una conexión propia que se cierra al terminar: si el consumidor
+        abandona el generador sin cerrarlo (p. ej. un cliente que se
+        desconecta a mitad de una exportación), la transacción de lectura no
+        queda abierta en la conexión compartida del hilo.
+        """
+        conn = self._connect()
+        try:
+            yield from self._iter_participants(conn)
+        finally:
+            conn.close()
+
+    def iter_response_rows(self, desde=None, hasta=None, completado=None, tipo_contenido=None):
+        """
+        Una fila por respuesta con los datos del participante (para CSV)
+
+        Cada fila es un dict con los campos de RESPONSE_FIELDS más
+        participante_id, genero, edad, fecha_inicio, fecha_finalizacion y
+        completado. Las filas se leen del cursor a medida que se consumen.
+
+        Args:
+            desde / hasta: rango (inclusivo) de fecha_hora de la respuesta;
+                un prefijo ISO como '2025-01-31' cubre el día completo
+            completado: solo participantes que terminaron (True) o no (False)
+            tipo_contenido: solo respuestas de ese tipo de contenido
+        """
+        conditions = []
+        params = []
+        if desde is not None:
+            conditions.append('r.fecha_hora >= ?')
+            params.append(desde)
+        if hasta is not None:
+            conditions.append('substr(r.fecha_hora, 1, ?) <= ?')
+            params.extend([len(hasta), hasta])
+        if completado is not None:
+            conditions.append('p.completado = ?')
+            params.append(int(completado))
+        if tipo_contenido is not None:
+            conditions.append('r.tipo_contenido = ?')
+            params.append(tipo_contenido)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        cursor = self._conn().execute(f"""
+            SELECT p.id AS participante_id, p.genero, p.edad, p.fecha_inicio,
+                   p.fecha_finalizacion, p.completado, {', '.join('r.' + f for f in RESPONSE_FIELDS)}
+            FROM responses r JOIN participants p ON p.id = r.participant_id
+            {where}
+            ORDER BY p.id, r.id
+        """, params)
+        for row in cursor:
+            yield _decode_row(row)
+
+    def summary(self):
+        """Participantes, edad promedio, géneros y total de respuestas"""
+        conn = self._conn()
+        total_participantes, edad_promedio = conn.execute("""
+            SELECT COUNT(*),
+                   AVG(CASE WHEN typeof(edad) IN ('integer', 'real') AND edad != 0 THEN edad END)
+            FROM participants
+        """).fetchone()
+        generos = dict(conn.execute('SELECT lower(genero), COUNT(*) FROM participants GROUP BY lower(genero)').fetchall())
+        total_respuestas = conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        return {
+            'total_participantes': total_participantes,
+            'edad_promedio': edad_promedio or 0,
+            'generos': generos,
+            'total_respuestas': total_respuestas
+        }
+
+    def video_exposures(self):
+        """dict path -> número de participantes a los que se asignó el video"""
+        return dict(self._conn().execute(
+            'SELECT path, COUNT(*) FROM participant_videos GROUP BY path'
+        ).fetchall())
+
+    def query(self, sql, params=()):
+        """Consulta de solo lectura (filas sqlite3.Row) para los scripts de análisis"""
+        return self._conn().execute(sql, params).fetchall()
+
+    def iter_query(self, sql, params=()):
+        """Como query, pero las filas se leen del cursor a medida que se consumen"""
+        return self._conn().execute(sql, params)
+
+    # --- Importación ---
+
+    def import_json_files(self):
+        """
+        Importa los P*.json (y sus P*.log) que aún no estén en la base de datos
+
+        Returns:
+            número de participantes importados
+        """
+        imported = 0
+        with self._transaction() as conn:
+            existing = {row[0] for row in conn.execute('SELECT id FROM participants')}
+            for snapshot_path in sorted(self.data_dir.glob('P*.json')):
+                try:
+                    participant_data = _load_json_participant(snapshot_path)
+                except (OSError, ValueError) as e:
+                    print(f"Error reading {snapshot_path.name}: {e}")
+                    continue
+
+                participant_data.setdefault('id', snapshot_path.stem)
+                if participant_data['id'] in existing:
+                    continue
+
+                self._insert_participant(conn, participant_data)
+                for response in participant_data.get('respuestas', []):
+                    self._insert_response(conn, participant_data['id'], response, add_video=True)
+                existing.add(participant_data['id'])
+                imported += 1
+
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_import', datetime('now'))")
+        if imported:
+            self._bump_version()
+        return imported
+
+    # --- Sincronización ---
+
+    def flush(self):
+        """Vuelca el WAL a la base de datos (checkpoint)"""
+        self._conn().execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    def close(self):
+        """Hace checkpoint y cierra todas las conexiones"""
+        if not self.readonly:
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"==> Advertencia: checkpoint fallido: {e}")
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    # --- Internos ---
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _connect(self):
+        if self.readonly:
+            conn = sqlite3.connect(f'{self.db_path.resolve().as_uri()}?mode=ro', uri=True, timeout=30,
+                                   isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            return conn
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._conn())
+
+    def _bump_version(self):
+        with self._version_lock:
+            self.data_version += 1
+
+    def version_tag(self):
+        """Identificador de la versión actual de los datos ('<generación>-<versión>')"""
+        with self._version_lock:
+            return f'{self.generation}-{self.data_version}'
+
+    def _get_meta(self, key):
+        row = self._conn().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _table_exists(self, name):
+        return self._conn().execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone() is not None
+
+    def _migrate_to_compact(self):
+        """Pasa una base de datos con las tablas completas (versión 1) al formato compacto"""
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+
+        def same_video(alias, path_column):
+            conditions = [f'v.path IS {alias}.{path_column}']
+            conditions += [f'v.{field} IS {alias}.{field}' for field, _ in RESPONSE_VIDEO_FIELDS[1:]]
+            return ' AND '.join(conditions)
+
+        with self._transaction() as conn:
+            conn.execute(f"""
+                INSERT INTO videos ({', '.join(VIDEO_FIELDS)})
+                SELECT DISTINCT {', '.join(VIDEO_FIELDS)} FROM participant_videos
+            """)
+            conn.execute(f"""
+                INSERT INTO videos (path, es_fake, calidad, tipo_contenido, es_evidente)
+                SELECT DISTINCT video_path, es_fake, calidad, tipo_contenido, es_evidente
+                FROM responses r
+                WHERE NOT EXISTS (SELECT 1 FROM videos v WHERE {same_video('r', 'video_path')})
+            """)
+            conn.execute(f"""
+                INSERT INTO assigned_videos (participant_id, posicion, video_id)
+                SELECT pv.participant_id, pv.posicion,
+                       (SELECT v.id FROM videos v
+                        WHERE {same_video('pv', 'path')} AND v.folder IS pv.folder)
+                FROM participant_videos pv
+            """)
+            conn.execute(f"""
+                INSERT INTO response_records (id, participant_id, fecha_hora, numero_video, video_id,
+                                              respuesta_slider, causa_fake, tiempo_respuesta_segundos)
+                SELECT r.id, r.participant_id, r.fecha_hora, r.numero_video,
+                       (SELECT v.id FROM videos v WHERE {same_video('r', 'video_path')} ORDER BY v.id LIMIT 1),
+                       r.respuesta_slider, r.causa_fake, r.tiempo_respuesta_segundos
+                FROM responses r
+            """)
+            conn.execute('DROP TABLE participant_videos')
+            conn.execute('DROP TABLE responses')
+        conn.execute('VACUUM')
+        print(f"==> Base de datos convertida al formato compacto: {self.db_path}")
+
+    def _video_id(self, conn, video, with_folder=True, create=True):
+        """
+        Id del video en la tabla videos (se añade si no está y create es True)
+
+        Las respuestas no traen folder: se asocian a cualquier video con los
+        mismos datos. Si no está y no se puede crear, devuelve None.
+        """
+        fields = [field for field, _ in RESPONSE_VIDEO_FIELDS] + (['folder'] if with_folder else [])
+        values = tuple(_encode(video.get(field)) for field in fields)
+        conditions = ' AND '.join(f'{field} IS ?' for field in fields)
+
+        row = conn.execute(f'SELECT id FROM videos WHERE {conditions} ORDER BY id LIMIT 1', values).fetchone()
+        if row is not None:
+            return row[0]
+        if not create:
+            return None
+        return conn.execute(
+            f"INSERT INTO videos ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})", values
+        ).lastrowid
+
+    def _insert_participant(self, conn, participant_data):
+        extra = {k: v for k, v in participant_data.items()
+                 if k not in PARTICIPANT_FIELDS and k not in ('videos', 'respuestas')}
+        conn.execute(
+            'INSERT INTO participants (id, genero, edad, fecha_inicio, completado, fecha_finalizacion, extra) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (participant_data['id'], participant_data.get('genero'), participant_data.get('edad'),
+             participant_data.get('fecha_inicio'), int(bool(participant_data.get('completado', False))),
+             participant_data.get('fecha_finalizacion'),
+             json.dumps(extra, ensure_ascii=False, separators=(',', ':')) if extra else None)
+        )
+        conn.executemany(
+            'INSERT INTO assigned_videos (participant_id, posicion, video_id) VALUES (?, ?, ?)',
+            [(participant_data['id'], posicion, self._video_id(conn, video))
+             for posicion, video in enumerate(participant_data.get('videos', []))]
+        )
+
+    def _insert_response(self, conn, participante_id, response, add_video=False):
+        """
+        Inserta una respuesta
+
+        Las respuestas del servidor solo enlazan videos que ya están en la
+        tabla (los asignados al crear participantes, tomados del catálogo):
+        nunca se crean filas de videos a partir de lo que envía el cliente.
+        add_video solo se usa al importar P*.json locales.
+        """
+        video = {field: response.get(column) for field, column in RESPONSE_VIDEO_FIELDS}
+        conn.execute(
+            'INSERT INTO response_records (participant_id, fecha_hora, numero_video, video_id, '
+            'respuesta_slider, causa_fake, tiempo_respuesta_segundos) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (participante_id, response.get('fecha_hora'), response.get('numero_video'),
+             self._video_id(conn, video, with_folder=False, create=add_video),
+             _encode(response.get('respuesta_slider')),
+             response.get('causa_fake'), _encode(response.get('tiempo_respuesta_segundos')))
+        )
+
+    def _iter_participants(self, conn, where='', params=()):
+        """
+        Reconstruye los participantes en streaming
+
+        Las tres tablas se leen ordenadas por participante y se combinan sobre
+        la marcha (merge join), de modo que la memoria no crece con el número
+        de participantes. Todo se lee dentro de una transacción de lectura
+        para ver un estado coherente aunque haya escrituras en paralelo.
+        """
+        scope = f'WHERE participant_id IN (SELECT id FROM participants {where})' if where else ''
+
+        conn.execute('BEGIN')
+        try:
+            participant_rows = conn.execute(f'SELECT * FROM participants {where} ORDER BY id', params)
+            videos = _GroupedRows(conn.execute(
+                f'SELECT * FROM participant_videos {scope} ORDER BY participant_id, posicion', params
+            ), VIDEO_FIELDS)
+            responses = _GroupedRows(conn.execute(
+                f'SELECT * FROM responses {scope} ORDER BY participant_id, id', params
+            ), RESPONSE_FIELDS)
+
+            for row in participant_rows:
+                participant_data = {
+                    'id': row['id'],
+                    'genero': row['genero'],
+                    'edad': row['edad'],
+                    'fecha_inicio': row['fecha_inicio'],
+                    'videos': videos.take(row['id']),
+                    'respuestas': responses.take(row['id']),
+                    'completado': bool(row['completado'])
+                }
+                if row['fecha_finalizacion'] is not None:
+                    participant_data['fecha_finalizacion'] = row['fecha_finalizacion']
+                if row['extra']:
+                    participant_data.update(json.loads(row['extra']))
+                yield participant_data
+        finally:
+            # También si el consumidor abandona el generador a medias
+            conn.execute('COMMIT')
+
+
+class _GroupedRows:
+    """Filas de un cursor ordenado por participant_id, agrupadas bajo demanda"""
+
+    def __init__(self, cursor, fields):
+        self.cursor = cursor
+        self.fields = fields
+        self.current = next(cursor, None)
+
+    def take(self, participant_id):
+        """Filas del participante (las de participantes anteriores se saltan)"""
+        rows = []
+        while self.current is not None and self.current['participant_id'] <= participant_id:
+            if self.current['participant_id'] == participant_id:
+                rows.append({f: _decode(f, self.current[f]) for f in self.fields})
+            self.current = next(self.cursor, None)
+        return rows
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK sobre una conexión en autocommit"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+def _encode(value):
+    return int(value) if isinstance(value, bool) else value
+
+
+def _decode(field, value):
+    if field in BOOLEAN_FIELDS and value is not None:
+        return bool(value)
+    return value
+
+
+def _decode_row(row):
+    return {key: _decode(key, row[key]) for key in row.keys()}
+
+
+def _load_json_participant(snapshot_path):
+    """Lee un P*.json antiguo junto con su log de respuestas P*.log (si lo hay)"""
+    with open(snapshot_path, 'r', encoding='utf-8') as f:
+        participant_data = json.load(f)
+    participant_data.setdefault('respuestas', [])
+
+    log_path = snapshot_path.with_suffix('.log')
+    if log_path.exists():
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Última línea truncada por una caída
+                    continue
+                if 'respuesta' in entry:
+                    participant_data['respuestas'].append(entry['respuesta'])
+
+    return participant_data
+
+
+if __name__ == '__main__':
+    store = ExperimentStore(DATA_DIR)
+    imported = store.import_json_files()
+    total = store.summary()['total_participantes']
+    print(f"Importados {imported} participantes nuevos ({total} en total) en {store.db_path}")
+    store.close()
@@ -4,10 +4,11 @@ Script para exportar datos del experimento a formato CSV (compatible con Excel)
 Ejecuta: python export_to_excel.py
 """
 
-import json
 import csv
 from pathlib import Path
 from datetime import datetime
+from collections import Counter
+from experiment_store import ExperimentStore, StoreNotReady
 
 DATA_DIR = Path('experiment_data')
 OUTPUT_FILE = f'resultados_experimento_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
@@ -19,14 +20,27 @@ def export_to_csv():
         print(f"ERROR: No se encontró la carpeta {DATA_DIR}")
         return
 
-    # Obtener todos los archivos JSON de participantes
-    participant_files = list(DATA_DIR.glob('P*.json'))
+    # Obtener los IDs de participantes de la base de datos SQLite (solo lectura)
+    try:
+        store = ExperimentStore(DATA_DIR, readonly=True)
+    except StoreNotReady as e:
+        print(f"ERROR: {e}")
+        return
+    try:
+        export_store(store)
+    finally:
+        store.close()
+
+
+def export_store(store):
+    """Write the CSV from an open store"""
+    participant_ids = store.participant_ids()
 
-    if not participant_files:
+    if not participant_ids:
         print(f"No se encontraron participantes en {DATA_DIR}")
         return
 
-    print(f"\nEncontrados {len(participant_files)} participantes")
+    print(f"\nEncontrados {len(participant_ids)} participantes")
     print(f"Exportando a: {OUTPUT_FILE}\n")
 
     # Abrir archivo CSV
@@ -55,52 +69,41 @@ def export_to_csv():
 
         total_respuestas = 0
 
-        # Procesar cada participante
-        for participant_file in sorted(participant_files):
-            try:
-                with open(participant_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-
-                participante_id = data['id']
-                genero = data['genero']
-                edad = data['edad']
-                fecha_inicio = data['fecha_inicio']
-                fecha_fin = data.get('fecha_finalizacion', '')
-                completado = data.get('completado', False)
-
-                # Escribir una fila por cada respuesta
-                for respuesta in data.get('respuestas', []):
-                    row = {
-                        'participante_id': participante_id,
-                        'genero': genero,
-                        'edad': edad,
-                        'fecha_inicio_experimento': fecha_inicio,
-                        'fecha_finalizacion_experimento': fecha_fin,
-                        'completado': 'Sí' if completado else 'No',
-                        'fecha_hora_respuesta': respuesta.get('fecha_hora', ''),
-                        'numero_video': respuesta.get('numero_video', ''),
-                        'video_path': respuesta.get('video_path', ''),
-                        'tipo_contenido': respuesta.get('tipo_contenido', ''),
-                        'es_fake': 'Sí' if respuesta.get('es_fake', False) else 'No',
-                        'es_evidente': 'Sí' if respuesta.get('es_evidente', False) else 'No',
-                        'calidad': respuesta.get('calidad', ''),
-                        'respuesta_slider': respuesta.get('respuesta_slider', ''),
-                        'causa_fake': respuesta.get('causa_fake', ''),
-                        'tiempo_respuesta_segundos': respuesta.get('tiempo_respuesta_segundos', 0)
-                    }
-                    writer.writerow(row)
-                    total_respuestas += 1
-
-                print(f"✓ {participante_id}: {len(data.get('respuestas', []))} respuestas")
-
-            except Exception as e:
-                print(f"✗ Error procesando {participant_file.name}: {e}")
+        respuestas_por_participante = Counter()
+
+        # Una sola consulta: respuestas unidas a los datos del participante
+        for respuesta in store.iter_response_rows():
+            participante_id = respuesta['participante_id']
+            row = {
+                'participante_id': participante_id,
+                'genero': respuesta['genero'],
+                'edad': respuesta['edad'],
+                'fecha_inicio_experimento': respuesta['fecha_inicio'],
+                'fecha_finalizacion_experimento': respuesta['fecha_finalizacion'] or '',
+                'completado': 'Sí' if respuesta['completado'] else 'No',
+                'fecha_hora_respuesta': respuesta['fecha_hora'] or '',
+                'numero_video': respuesta['numero_video'] if respuesta['numero_video'] is not None else '',
+                'video_path': respuesta['video_path'] or '',
+                'tipo_contenido': respuesta['tipo_contenido'] or '',
+                'es_fake': 'Sí' if respuesta['es_fake'] else 'No',
+                'es_evidente': 'Sí' if respuesta['es_evidente'] else 'No',
+                'calidad': respuesta['calidad'] or '',
+                'respuesta_slider': respuesta['respuesta_slider'] if respuesta['respuesta_slider'] is not None else '',
+                'causa_fake': respuesta['causa_fake'] or '',
+                'tiempo_respuesta_segundos': respuesta['tiempo_respuesta_segundos'] or 0
+            }
+            writer.writerow(row)
+            respuestas_por_participante[participante_id] += 1
+            total_respuestas += 1
+
+    for participante_id in participant_ids:
+        print(f"✓ {participante_id}: {respuestas_por_participante[participante_id]} respuestas")
 
     print(f"\n{'='*60}")
     print(f"EXPORTACIÓN COMPLETADA")
     print(f"{'='*60}")
     print(f"Archivo generado: {OUTPUT_FILE}")
-    print(f"Total participantes: {len(participant_files)}")
+    print(f"Total participantes: {len(participant_ids)}")
     print(f"Total respuestas: {total_respuestas}")
     print(f"\nPuedes abrir este archivo con Microsoft Excel o Google Sheets")
 
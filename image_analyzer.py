@@ -5,19 +5,82 @@ Parte del experimento de detección de deepfakes
 """
 
 from PIL import Image
+import numpy as np
 import io
 import colorsys
+import hashlib
+import json
+import os
+import random
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+ANALYSIS_CACHE_FILE = Path('cache') / 'image_analysis.json'
+ANALYSIS_CACHE_SIZE = int(os.environ.get('ANALYSIS_CACHE_SIZE', '500'))
+# Entradas nuevas que se acumulan en memoria antes de reescribir el archivo
+ANALYSIS_CACHE_SAVE_EVERY = int(os.environ.get('ANALYSIS_CACHE_SAVE_EVERY', '20'))
 
 class ImageAnalyzer:
     """Analiza imágenes para generar prompts contextuales y realistas"""
 
-    def __init__(self, image_data):
+    # Lado máximo de la imagen de trabajo: los análisis son promedios y
+    # varianzas globales, no necesitan la resolución completa
+    WORKING_MAX_SIDE = 512
+
+    def __init__(self, image_data=None, image=None):
         """
         Args:
             image_data: bytes de la imagen
+            image: imagen PIL ya abierta (evita decodificar de nuevo los bytes)
         """
-        self.image = Image.open(io.BytesIO(image_data))
-        self.width, self.height = self.image.size
+        if image is None:
+            image = Image.open(io.BytesIO(image_data))
+
+        # El ratio de aspecto se calcula sobre el tamaño original
+        self.width, self.height = image.size
+        self.image = self._working_image(image)
+        self.work_width, self.work_height = self.image.size
+
+        # Planos NumPy calculados una sola vez y compartidos por todos los análisis
+        self.rgb = np.asarray(self.image)
+        self.gray = np.asarray(self.image.convert('L'))
+
+    @classmethod
+    def _working_image(cls, image):
+        """Decodifica la imagen una vez, reducida a WORKING_MAX_SIDE y en RGB"""
+        max_side = max(image.size)
+
+        if max_side > cls.WORKING_MAX_SIDE:
+            # JPEG: decodificar directamente a escala 1/2, 1/4 o 1/8 (no hace
+            # nada si la imagen ya estaba cargada)
+            scale = cls.WORKING_MAX_SIDE / max_side
+            image.draft('RGB', (int(image.width * scale) + 1, int(image.height * scale) + 1))
+
+        if image.mode != 'RGB':
+            # Escala de grises / paleta / alfa: analizar su equivalente RGB
+            image = image.convert('RGB')
+
+        factor = max(image.size) // cls.WORKING_MAX_SIDE
+        if factor >= 2:
+            image = image.reduce(factor)
+
+        return image
+
+    @staticmethod
+    def _mean(values):
+        """Media exacta (suma entera), igual que sum(pixels) / len(pixels)"""
+        return int(values.sum(dtype=np.int64)) / values.size
+
+    @staticmethod
+    def _variance(values):
+        """Varianza poblacional calculada con enteros exactos"""
+        n = values.size
+        if n == 0:
+            return 0.0
+        total = int(values.sum(dtype=np.int64))
+        squares = int(np.square(values, dtype=np.int64).sum())
+        return (n * squares - total * total) / (n * n)
 
     def analyze(self):
         """Analiza la imagen y retorna características detectadas"""
@@ -44,10 +107,7 @@ class ImageAnalyzer:
 
     def _get_brightness(self):
         """Calcula el brillo promedio de la imagen"""
-        # Convert to grayscale and get average
-        grayscale = self.image.convert('L')
-        pixels = list(grayscale.getdata())
-        avg_brightness = sum(pixels) / len(pixels)
+        avg_brightness = self._mean(self.gray)
 
         if avg_brightness < 85:
             return 'dark'
@@ -60,12 +120,10 @@ class ImageAnalyzer:
         """Obtiene el color dominante"""
         # Resize for faster processing
         small_image = self.image.resize((50, 50))
-        pixels = list(small_image.getdata())
+        small_rgb = np.asarray(small_image).reshape(-1, 3)
 
         # Get average RGB
-        r = sum(p[0] for p in pixels if len(p) >= 3) / len(pixels)
-        g = sum(p[1] for p in pixels if len(p) >= 3) / len(pixels)
-        b = sum(p[2] for p in pixels if len(p) >= 3) / len(pixels)
+        r, g, b = (self._mean(small_rgb[:, channel]) for channel in range(3))
 
         # Determine dominant color category
         max_channel = max(r, g, b)
@@ -82,65 +140,44 @@ class ImageAnalyzer:
     def _get_color_temperature(self):
         """Determina la temperatura de color (cálida/fría)"""
         # Sample center region
-        center_x = self.width // 2
-        center_y = self.height // 2
-        sample_size = min(self.width, self.height) // 4
+        center_x = self.work_width // 2
+        center_y = self.work_height // 2
+        sample_size = min(self.work_width, self.work_height) // 4
 
-        try:
-            region = self.image.crop((
-                center_x - sample_size,
-                center_y - sample_size,
-                center_x + sample_size,
-                center_y + sample_size
-            ))
-
-            pixels = list(region.getdata())
-            r_avg = sum(p[0] for p in pixels if len(p) >= 3) / len(pixels)
-            b_avg = sum(p[2] for p in pixels if len(p) >= 3) / len(pixels)
-
-            if r_avg > b_avg + 10:
-                return 'warm'
-            elif b_avg > r_avg + 10:
-                return 'cool'
-            else:
-                return 'neutral'
-        except:
+        if sample_size == 0:
+            return 'neutral'
+
+        region = self.rgb[
+            center_y - sample_size:center_y + sample_size,
+            center_x - sample_size:center_x + sample_size
+        ]
+
+        r_avg = self._mean(region[..., 0])
+        b_avg = self._mean(region[..., 2])
+
+        if r_avg > b_avg + 10:
+            return 'warm'
+        elif b_avg > r_avg + 10:
+            return 'cool'
+        else:
             return 'neutral'
 
     def _detect_face_region(self):
         """Detecta si hay una región probable de rostro (basado en composición)"""
         # Simple heuristic: check if there's a concentrated region in upper half
-        upper_half = self.image.crop((0, 0, self.width, self.height // 2))
-
-        # Convert to grayscale and check variance
-        grayscale = upper_half.convert('L')
-        pixels = list(grayscale.getdata())
-
-        avg = sum(pixels) / len(pixels)
-        variance = sum((p - avg) ** 2 for p in pixels) / len(pixels)
+        upper_half = self.gray[:self.work_height // 2]
 
         # High variance in upper half suggests possible face/subject
-        return variance > 500
+        return self._variance(upper_half) > 500
 
     def _analyze_composition(self):
         """Analiza la composición general de la imagen"""
         # Check vertical distribution of detail
-        third_height = self.height // 3
+        third_height = self.work_height // 3
 
-        top_third = self.image.crop((0, 0, self.width, third_height))
-        middle_third = self.image.crop((0, third_height, self.width, third_height * 2))
-        bottom_third = self.image.crop((0, third_height * 2, self.width, self.height))
-
-        def get_detail_score(region):
-            gray = region.convert('L')
-            pixels = list(gray.getdata())
-            avg = sum(pixels) / len(pixels)
-            variance = sum((p - avg) ** 2 for p in pixels) / len(pixels)
-            return variance
-
-        top_detail = get_detail_score(top_third)
-        middle_detail = get_detail_score(middle_third)
-        bottom_detail = get_detail_score(bottom_third)
+        top_detail = self._variance(self.gray[:third_height])
+        middle_detail = self._variance(self.gray[third_height:third_height * 2])
+        bottom_detail = self._variance(self.gray[third_height * 2:])
 
         max_detail = max(top_detail, middle_detail, bottom_detail)
 
@@ -172,12 +209,15 @@ class PromptGenerator:
         "controlled natural movement"
     ]
 
-    def __init__(self, video_type='e'):
+    def __init__(self, video_type='e', seed=None):
         """
         Args:
             video_type: 'e' para entretenimiento, 'i' para informativo
+            seed: semilla para la elección aleatoria del prompt base
+                  (misma imagen -> mismo prompt)
         """
         self.video_type = video_type
+        self.rng = random.Random(seed)
 
     def generate_prompt(self, image_analysis, custom_prompt=None):
         """
@@ -195,7 +235,7 @@ class PromptGenerator:
             base_prompt = custom_prompt.strip()
         else:
             # Generar prompt automático basado en análisis
-            base_prompt = self._generate_automatic_prompt(image_analysis)
+            base_prompt = self.generate_automatic_prompt(image_analysis)
 
         # Prompts diferenciados para alta y baja calidad
         return {
@@ -203,18 +243,16 @@ class PromptGenerator:
             'low_quality': self._enhance_for_quality(base_prompt, 'low', image_analysis)
         }
 
-    def _generate_automatic_prompt(self, analysis):
+    def generate_automatic_prompt(self, analysis):
         """Genera un prompt automático basado en el análisis de la imagen"""
 
         components = []
 
         # 1. Tipo de movimiento base
         if self.video_type == 'e':
-            import random
-            components.append(random.choice(self.ENTERTAINMENT_BASE))
+            components.append(self.rng.choice(self.ENTERTAINMENT_BASE))
         else:
-            import random
-            components.append(random.choice(self.INFORMATIVE_BASE))
+            components.append(self.rng.choice(self.INFORMATIVE_BASE))
 
         # 2. Ajustes por composición
         if analysis['composition'] == 'top_focused' or analysis['has_face_region']:
@@ -284,7 +322,85 @@ class PromptGenerator:
         return full_prompt
 
 
-def generate_prompts_for_experiment(image_data, video_type, custom_prompt=None):
+class AnalysisCache:
+    """
+    Caché persistente de análisis y prompts automáticos por contenido
+
+    La clave es el sha256 de los bytes de la imagen más el tipo de video, así
+    que volver a subir la misma foto (reintentos tras un fallo de Runway)
+    reutiliza el análisis y el mismo prompt. Se eliminan las entradas menos
+    usadas recientemente al superar max_entries.
+
+    El archivo no se reescribe en cada entrada nueva: se guarda cada
+    save_every entradas, al eliminar alguna y en flush() (al detener el
+    servidor).
+    """
+
+    def __init__(self, cache_file=ANALYSIS_CACHE_FILE, max_entries=ANALYSIS_CACHE_SIZE,
+                 save_every=ANALYSIS_CACHE_SAVE_EVERY):
+        self.cache_file = Path(cache_file)
+        self.max_entries = max_entries
+        self.save_every = save_every
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._unsaved = 0
+
+    @staticmethod
+    def key(image_hash, video_type):
+        return f'{image_hash}:{video_type}'
+
+    def get(self, key):
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._load()
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._unsaved += 1
+            evicted = False
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted = True
+            if evicted or self._unsaved >= self.save_every:
+                self._save()
+
+    def flush(self):
+        """Guarda en disco las entradas aún no escritas"""
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                self._entries.update(json.load(f))
+        except (OSError, ValueError):
+            # Sin caché previa (o corrupta): se empieza vacía
+            pass
+
+    def _save(self):
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.cache_file.with_name(self.cache_file.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp_file, self.cache_file)
+        self._unsaved = 0
+
+
+analysis_cache = AnalysisCache()
+
+
+def generate_prompts_for_experiment(image_data, video_type, custom_prompt=None, image=None):
     """
     Función principal para generar prompts para el experimento
 
@@ -292,20 +408,37 @@ def generate_prompts_for_experiment(image_data, video_type, custom_prompt=None):
         image_data: bytes de la imagen
         video_type: 'e' o 'i'
         custom_prompt: prompt personalizado opcional
+        image: imagen PIL ya decodificada de esos bytes (opcional)
 
     Returns:
         dict con prompts y análisis
     """
-    # Analizar imagen
-    analyzer = ImageAnalyzer(image_data)
-    analysis = analyzer.analyze()
+    image_hash = hashlib.sha256(image_data).hexdigest()
+    cache_key = AnalysisCache.key(image_hash, video_type)
+    generator = PromptGenerator(video_type, seed=image_hash)
+
+    cached = analysis_cache.get(cache_key)
+    if cached is None:
+        # Analizar imagen
+        analyzer = ImageAnalyzer(image_data, image=image)
+        analysis = analyzer.analyze()
+        cached = {
+            'analysis': analysis,
+            'automatic_prompt': generator.generate_automatic_prompt(analysis)
+        }
+        analysis_cache.put(cache_key, cached)
+        from_cache = False
+    else:
+        analysis = cached['analysis']
+        from_cache = True
 
-    # Generar prompts
-    generator = PromptGenerator(video_type)
-    prompts = generator.generate_prompt(analysis, custom_prompt)
+    # Generar prompts: sin prompt personalizado se reutiliza el automático
+    # guardado, así la misma imagen produce siempre los mismos prompts
+    prompts = generator.generate_prompt(analysis, custom_prompt or cached['automatic_prompt'])
 
     return {
         'prompts': prompts,
         'analysis': analysis,
-        'video_type': 'entretenimiento' if video_type == 'e' else 'informativo'
+        'video_type': 'entretenimiento' if video_type == 'e' else 'informativo',
+        'cached': from_cache
     }
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Preprocesado de imágenes antes de enviarlas a Runway ML
+
+En lugar de rechazar las fotos grandes, se aplica la orientación EXIF, se
+recorta a un ratio aceptado por Runway, se reduce a la resolución máxima que
+usan los ratios de salida configurados y se busca la calidad JPEG más alta
+que quepa en el presupuesto de bytes del data URI.
+"""
+
+import time
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# Runway acepta data URIs de hasta 5MB: en base64 cada 3 bytes ocupan 4
+DATA_URI_LIMIT = 5 * 1024 * 1024
+DATA_URI_HEADER = 64
+BYTE_BUDGET = (DATA_URI_LIMIT - DATA_URI_HEADER) * 3 // 4
+
+# Ratio ancho/alto admitido por Runway
+MIN_ASPECT_RATIO = 0.5
+MAX_ASPECT_RATIO = 2.0
+
+MAX_QUALITY = 95
+MIN_QUALITY = 60
+
+EXIF_ORIENTATION = 0x0112
+
+MIME_TYPES = {'JPEG': 'image/jpg', 'PNG': 'image/png', 'GIF': 'image/gif'}
+
+
+def max_output_size(ratios):
+    """Ancho y alto máximos entre los ratios de salida ('1280:720', ...)"""
+    sizes = [tuple(int(v) for v in ratio.split(':')) for ratio in ratios]
+    return max(w for w, h in sizes), max(h for w, h in sizes)
+
+
+def preprocess_for_runway(image, image_data, ratios, byte_budget=BYTE_BUDGET):
+    """
+    Prepara una imagen subida para enviarla como data URI
+
+    Args:
+        image: imagen PIL abierta (sin cargar) de image_data
+        image_data: bytes originales subidos
+        ratios: ratios de salida de Runway que se van a pedir
+        byte_budget: bytes máximos de la imagen codificada
+
+    Returns:
+        dict con 'image' (PIL), 'image_data' (bytes), 'mime_type' y las
+        métricas 'original_bytes', 'final_bytes', 'bytes_saved',
+        'seconds', 'width', 'height', 'quality' (None si no se recodificó)
+    """
+    started = time.monotonic()
+    original_format = image.format or 'JPEG'
+    original_size = image.size
+    max_width, max_height = max_output_size(ratios)
+
+    orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+    rotated = orientation in (5, 6, 7, 8)
+
+    # Tamaño final: cubrir el mayor fotograma de salida sin pasar de él
+    upright = original_size[::-1] if rotated else original_size
+    width, height = _crop_size(*upright)
+    scale = min(1.0, max(max_width / width, max_height / height))
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+    needs_changes = (
+        orientation != 1
+        or (width, height) != upright
+        or scale < 1.0
+        or len(image_data) > byte_budget
+        or original_format not in MIME_TYPES
+    )
+
+    if not needs_changes:
+        return _result(image, image_data, MIME_TYPES[original_format], len(image_data), None, started)
+
+    if scale < 1.0:
+        # JPEG: decodificar directamente a una escala reducida suficiente
+        image.draft('RGB', (int(original_size[0] * scale) + 1, int(original_size[1] * scale) + 1))
+
+    if orientation != 1:
+        image = ImageOps.exif_transpose(image)
+
+    image = _crop_to_aspect(image)
+
+    if image.size != target:
+        image = image.resize(target, Image.LANCZOS)
+
+    if image.mode != 'RGB':
+        image = _flatten_to_rgb(image)
+
+    image, encoded, quality = _encode_within_budget(image, byte_budget)
+    return _result(image, encoded, 'image/jpg', len(image_data), quality, started)
+
+
+def _crop_size(width, height):
+    """Tamaño tras recortar al rango de ratios admitido por Runway"""
+    if width / height > MAX_ASPECT_RATIO:
+        return int(height * MAX_ASPECT_RATIO), height
+    if width / height < MIN_ASPECT_RATIO:
+        return width, int(width / MIN_ASPECT_RATIO)
+    return width, height
+
+
+def _crop_to_aspect(image):
+    """Recorta desde el centro si el ratio está fuera de lo que acepta Runway"""
+    width, height = image.size
+    new_width, new_height = _crop_size(width, height)
+    if (new_width, new_height) == (width, height):
+        return image
+
+    left = (width - new_width) // 2
+    top = (height - new_height) // 2
+    print(f"==> Image adjusted: {new_width}x{new_height} (ratio: {new_width / new_height:.3f})")
+    return image.crop((left, top, left + new_width, top + new_height))
+
+
+def _flatten_to_rgb(image):
+    """Convierte a RGB poniendo las zonas transparentes sobre blanco"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode_within_budget(image, byte_budget):
+    """
+    Busca (bisección) la mayor calidad JPEG que cabe en byte_budget
+
+    Si ni con MIN_QUALITY cabe, se reduce la imagen un 25% y se repite.
+
+    Returns:
+        (imagen codificada, bytes JPEG, calidad): la imagen es la reducida
+        si hizo falta reducirla
+    """
+    while True:
+        best = None
+        low, high = MIN_QUALITY, MAX_QUALITY
+        while low <= high:
+            quality = (low + high) // 2
+            encoded = _encode_jpeg(image, quality)
+            if len(encoded) <= byte_budget:
+                best = (image, encoded, quality)
+                low = quality + 1
+            else:
+                high = quality - 1
+
+        if best is not None:
+            return best
+
+        image = image.resize((max(1, image.width * 3 // 4), max(1, image.height * 3 // 4)), Image.LANCZOS)
+
+
+def _encode_jpeg(image, quality):
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _result(image, image_data, mime_type, original_bytes, quality, started):
+    return {
+        'image': image,
+        'image_data': image_data,
+        'mime_type': mime_type,
+        'original_bytes': original_bytes,
+        'final_bytes': len(image_data),
+        'bytes_saved': original_bytes - len(image_data),
+        'seconds': round(time.monotonic() - started, 3),
+        'width': image.width,
+        'height': image.height,
+        'quality': quality
+    }
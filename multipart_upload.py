@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Parser incremental de multipart/form-data
+
+Lee el cuerpo de la petición por bloques directamente del socket, sin
+cargarlo entero en memoria ni partirlo con split(). Los archivos se vuelcan a
+un SpooledTemporaryFile (memoria hasta SPOOL_MEMORY_LIMIT, disco a partir de
+ahí) y los límites de tamaño se comprueban a medida que llegan los bytes, de
+modo que una subida demasiado grande se corta sin leer el resto.
+"""
+
+import re
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_MEMORY_LIMIT = 1024 * 1024
+MAX_HEADER_SIZE = 16 * 1024
+MAX_FIELD_SIZE = 1024 * 1024
+
+
+class MultipartError(ValueError):
+    """Cuerpo multipart mal formado o truncado"""
+
+
+class UploadTooLarge(MultipartError):
+    """Un archivo (o el cuerpo completo) supera el límite permitido"""
+
+    def __init__(self, field_name, limit, unread=0):
+        super().__init__(f'Field {field_name!r} exceeds {limit} bytes')
+        self.field_name = field_name
+        self.limit = limit
+        # Bytes del cuerpo que quedaron sin leer al cortar la subida
+        self.unread = unread
+
+
+class UploadedFile:
+    """Archivo recibido en un campo multipart (volcado a un archivo temporal)"""
+
+    def __init__(self, field_name, filename, content_type):
+        self.field_name = field_name
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_LIMIT)
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def read(self):
+        """Devuelve el contenido completo como bytes"""
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self):
+        self.file.close()
+
+
+class _TextField:
+    def __init__(self, field_name):
+        self.field_name = field_name
+        self.size = 0
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+        self.size += len(data)
+
+    def value(self):
+        return self.data.decode('utf-8', errors='ignore')
+
+
+def parse_multipart(rfile, content_length, boundary, max_file_size, max_body_size=None):
+    """
+    Parsea un cuerpo multipart leyendo de rfile por bloques
+
+    Args:
+        rfile: flujo de entrada (self.rfile del handler)
+        content_length: bytes del cuerpo según Content-Length
+        boundary: boundary del Content-Type (str o bytes)
+        max_file_size: bytes máximos por archivo
+        max_body_size: bytes máximos del cuerpo completo (opcional)
+
+    Returns:
+        dict campo -> str (campos de texto) o UploadedFile (archivos)
+
+    Raises:
+        UploadTooLarge: si se supera un límite (se deja de leer en ese punto)
+        MultipartError: si el cuerpo está mal formado o llega incompleto
+    """
+    if max_body_size is not None and content_length > max_body_size:
+        raise UploadTooLarge('request body', max_body_size, content_length)
+
+    boundary = boundary.encode() if isinstance(boundary, str) else boundary
+    # Con el \r\n inicial la primera frontera tiene la misma forma que las demás
+    delimiter = b'\r\n--' + boundary
+    keep = len(delimiter) - 1
+
+    buffer = bytearray(b'\r\n')
+    remaining = content_length
+    parts = {}
+    current = None
+    state = 'preamble'
+
+    def fill():
+        nonlocal remaining
+        if remaining <= 0:
+            raise MultipartError('Unexpected end of multipart body')
+        chunk = rfile.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            raise MultipartError('Connection closed before end of multipart body')
+        remaining -= len(chunk)
+        buffer.extend(chunk)
+
+    def write(part, end):
+        limit = max_file_size if isinstance(part, UploadedFile) else MAX_FIELD_SIZE
+        if part.size + end > limit:
+            raise UploadTooLarge(part.field_name, limit)
+        with memoryview(buffer) as view:
+            part.write(view[:end])
+        del buffer[:end]
+
+    try:
+        while True:
+            if state == 'preamble':
+                index = buffer.find(delimiter)
+                if index < 0:
+                    del buffer[:max(0, len(buffer) - keep)]
+                    fill()
+                    continue
+                del buffer[:index + len(delimiter)]
+                state = 'delimiter'
+
+            elif state == 'delimiter':
+                if len(buffer) < 2:
+                    fill()
+                    continue
+                if buffer[:2] == b'--':
+                    # Frontera final: lo que quede (epílogo) se ignora
+                    break
+                if buffer[:2] != b'\r\n':
+                    raise MultipartError('Malformed multipart boundary')
+                del buffer[:2]
+                state = 'headers'
+
+            elif state == 'headers':
+                index = buffer.find(b'\r\n\r\n')
+                if index < 0:
+                    if len(buffer) > MAX_HEADER_SIZE:
+                        raise MultipartError('Multipart headers too large')
+                    fill()
+                    continue
+                headers = bytes(buffer[:index]).decode('utf-8', errors='ignore')
+                del buffer[:index + 4]
+                current = _new_part(headers)
+                state = 'body'
+
+            elif state == 'body':
+                index = buffer.find(delimiter)
+                if index < 0:
+                    safe = len(buffer) - keep
+                    if safe > 0:
+                        write(current, safe)
+                    fill()
+                    continue
+                write(current, index)
+                del buffer[:len(delimiter)]
+                if current.field_name is None:
+                    if isinstance(current, UploadedFile):
+                        current.close()
+                elif isinstance(current, UploadedFile):
+                    parts[current.field_name] = current
+                else:
+                    parts[current.field_name] = current.value()
+                current = None
+                state = 'delimiter'
+    except Exception as e:
+        close_parts(parts)
+        if isinstance(current, UploadedFile):
+            current.close()
+        if isinstance(e, UploadTooLarge):
+            e.unread = remaining
+        raise
+
+    return parts
+
+
+def close_parts(parts):
+    """Cierra (y borra del disco) los archivos temporales de un parse"""
+    for value in parts.values():
+        if isinstance(value, UploadedFile):
+            value.close()
+
+
+def _new_part(headers):
+    name_match = re.search(r'\bname="([^"]*)"', headers)
+    field_name = name_match.group(1) if name_match else None
+
+    filename_match = re.search(r'filename="([^"]*)"', headers)
+    if filename_match is None:
+        return _TextField(field_name)
+
+    type_match = re.search(r'content-type:\s*([^\r\n]+)', headers, re.IGNORECASE)
+    return UploadedFile(field_name, filename_match.group(1),
+                        type_match.group(1).strip() if type_match else None)
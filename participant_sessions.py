@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Sesiones de participantes en memoria con escritura diferida
+
+Cada respuesta ya no es una transacción propia en la base de datos: se
+guarda en la sesión del participante (caché LRU por participante_id) y un
+hilo escritor agrupa todas las respuestas pendientes en una sola
+transacción. Ninguna respuesta espera más de FLUSH_DELAY segundos a llegar
+a disco. Finalizar el experimento, exportar y detener el servidor escriben
+antes todo lo pendiente.
+
+La caché también evita consultar la base de datos para comprobar que el
+participante existe en cada respuesta.
+
+Si un lote falla por un error transitorio de SQLite (base de datos
+bloqueada, disco), se reintenta entero. Con cualquier otro error se escribe
+fila a fila: las respuestas que no se pueden guardar se apartan en
+rejected (y se avisa por consola) en lugar de bloquear a las demás.
+
+on_written recibe las respuestas después de escribirlas (las estadísticas
+del servidor cuentan así solo lo que de verdad está en disco).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+
+FLUSH_DELAY = float(os.environ.get('RESPONSE_FLUSH_DELAY', '0.5'))
+MAX_SESSIONS = int(os.environ.get('MAX_SESSIONS', '512'))
+# Respuestas descartadas que se conservan en memoria para diagnóstico
+MAX_REJECTED = 1000
+
+
+class _Session:
+    """Participante activo y sus respuestas aún sin escribir"""
+
+    __slots__ = ('participante_id', 'lock', 'pending', 'pending_since')
+
+    def __init__(self, participante_id):
+        self.participante_id = participante_id
+        self.lock = threading.Lock()
+        self.pending = []
+        self.pending_since = None
+
+    def take_pending(self):
+        with self.lock:
+            pending, self.pending, self.pending_since = self.pending, [], None
+        return pending
+
+    def restore_pending(self, responses):
+        """Devuelve respuestas que no se pudieron escribir (delante de las nuevas)"""
+        with self.lock:
+            self.pending[:0] = responses
+            self.pending_since = self.pending_since or time.monotonic()
+
+
+class SessionCache:
+    """Caché LRU de sesiones con un hilo que escribe las respuestas en lote"""
+
+    def __init__(self, store, flush_delay=FLUSH_DELAY, max_sessions=MAX_SESSIONS, on_written=None):
+        self.store = store
+        self.on_written = on_written
+        self.flush_delay = flush_delay
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._sessions_lock = threading.Lock()
+        # Sesiones con respuestas pendientes, en orden de llegada (aunque
+        # ya hayan salido de la caché LRU)
+        self._dirty = {}
+        self._wakeup = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stopping = False
+        # (participante_id, respuesta, error) de las respuestas que no se pudieron guardar
+        self.rejected = deque(maxlen=MAX_REJECTED)
+        self._flusher = threading.Thread(target=self._run, name='response-flusher', daemon=True)
+        self._flusher.start()
+
+    # --- Sesiones ---
+
+    def create(self, participant_data):
+        """Guarda un participante nuevo y abre su sesión"""
+        self.store.create(participant_data)
+        self._remember(_Session(participant_data['id']))
+
+    def _session(self, participante_id):
+        """Sesión del participante (cargándola si existe en la base de datos) o None"""
+        with self._sessions_lock:
+            session = self._sessions.get(participante_id)
+            if session is not None:
+                self._sessions.move_to_end(participante_id)
+                return session
+
+        if not self.store.exists(participante_id):
+            return None
+        return self._remember(_Session(participante_id))
+
+    def _remember(self, session):
+        with self._sessions_lock:
+            # Si otro hilo la cargó a la vez, quedarse con la primera
+            session = self._sessions.setdefault(session.participante_id, session)
+            self._sessions.move_to_end(session.participante_id)
+            while len(self._sessions) > self.max_sessions:
+                # Una sesión expulsada con respuestas pendientes sigue en _dirty
+                self._sessions.popitem(last=False)
+        return session
+
+    # --- Escritura ---
+
+    def append_response(self, participante_id, response):
+        """
+        Añade una respuesta (se escribe en disco en menos de flush_delay)
+
+        Returns:
+            False si el participante no existe
+        """
+        session = self._session(participante_id)
+        if session is None:
+            return False
+
+        with session.lock:
+            session.pending.append(response)
+            if session.pending_since is None:
+                session.pending_since = time.monotonic()
+        with self._wakeup:
+            self._dirty.setdefault(id(session), session)
+            self._wakeup.notify()
+        return True
+
+    def finish(self, participante_id, fecha_finalizacion):
+        """Escribe lo pendiente y marca el experimento como completado (ver ExperimentStore.finish)"""
+        self.flush()
+        return self.store.finish(participante_id, fecha_finalizacion)
+
+    def flush(self):
+        """Escribe ya todas las respuestas pendientes (en una transacción si se puede)"""
+        with self._flush_lock:
+            with self._wakeup:
+                sessions = list(self._dirty.values())
+                self._dirty.clear()
+
+            batches = [(session, session.take_pending()) for session in sessions]
+            rows = [(session.participante_id, response)
+                    for session, pending in batches for response in pending]
+            try:
+                self.store.append_responses(rows)
+            except sqlite3.OperationalError:
+                # Transitorio: se reintenta todo en la siguiente escritura
+                self._restore(batches)
+                raise
+            except Exception:
+                # Alguna fila no se puede guardar: apartarla y escribir el resto
+                return self._flush_rows(batches)
+            self._written([response for _, response in rows])
+            return len(rows)
+
+    def _flush_rows(self, batches):
+        """Escribe las respuestas una a una, apartando las que fallan"""
+        written = []
+        try:
+            for index, (session, pending) in enumerate(batches):
+                for position, response in enumerate(pending):
+                    try:
+                        self.store.append_responses([(session.participante_id, response)])
+                    except sqlite3.OperationalError:
+                        self._restore([(session, pending[position:])] + batches[index + 1:])
+                        raise
+                    except Exception as e:
+                        print(f"==> Respuesta descartada ({session.participante_id}, "
+                              f"video {response.get('numero_video')}): {e}")
+                        self.rejected.append((session.participante_id, response, str(e)))
+                    else:
+                        written.append(response)
+        finally:
+            # Las escritas antes de un error transitorio también cuentan
+            self._written(written)
+        return len(written)
+
+    def _written(self, responses):
+        if responses and self.on_written is not None:
+            self.on_written(responses)
+
+    def _restore(self, batches):
+        """Devuelve respuestas no escritas a sus sesiones para reintentarlas"""
+        batches = [(session, pending) for session, pending in batches if pending]
+        for session, pending in batches:
+            session.restore_pending(pending)
+        with self._wakeup:
+            for session, _ in batches:
+                self._dirty.setdefault(id(session), session)
+
+    def shutdown(self):
+        """Detiene el escritor y escribe lo pendiente"""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify()
+        self._flusher.join()
+        written = self.flush()
+        if written:
+            print(f"==> {written} respuestas pendientes guardadas")
+
+    def pending_count(self):
+        with self._wakeup:
+            return sum(len(session.pending) for session in self._dirty.values())
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self._dirty and not self._stopping:
+                    self._wakeup.wait()
+                if self._stopping:
+                    return
+
+                # Esperar a que la respuesta más antigua cumpla flush_delay,
+                # así las que llegan mientras tanto van en la misma transacción
+                oldest = min((session.pending_since for session in self._dirty.values()
+                              if session.pending_since is not None), default=time.monotonic())
+                remaining = oldest + self.flush_delay - time.monotonic()
+                if remaining > 0:
+                    self._wakeup.wait(remaining)
+                    if self._stopping:
+                        return
+                    if oldest + self.flush_delay > time.monotonic():
+                        # Despertado por una respuesta nueva: recalcular
+                        continue
+
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"==> Error guardando respuestas pendientes: {e}")
+                traceback.print_exc()
+                time.sleep(self.flush_delay)
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Carga columnar de los resultados para el análisis
+
+Participantes y respuestas se cargan en arrays de NumPy (una posición por
+fila) en lugar de listas de dicts, así las estadísticas se calculan con
+operaciones vectorizadas (np.bincount como group-by).
+
+Dos orígenes:
+  - load_from_store: la base de datos SQLite del servidor (una consulta por
+    tabla, sin construir dicts)
+  - load_from_json_dir: una carpeta con P*.json sueltos (copias de
+    seguridad, datos de otro equipo...). Los archivos se leen en paralelo
+    con un pool de procesos y cada proceso devuelve sus columnas ya hechas.
+
+Las columnas de texto (género, tipo de contenido, calidad, causa) se guardan
+como códigos enteros con su lista de etiquetas en orden de aparición.
+"""
+
+import array
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from experiment_store import _load_json_participant
+from experiment_stats import CATEGORIAS
+
+EVIDENTE, FAKE, REAL = (CATEGORIAS.index(c) for c in ('evidente', 'fake', 'real'))
+
+# Archivos por tarea del pool (suficientes para amortizar el envío entre procesos)
+FILES_PER_TASK = 256
+
+LABEL_COLUMNS = ('genero', 'tipo_contenido', 'calidad', 'causa_fake')
+
+
+class _Labels:
+    """Etiqueta -> código entero, en orden de aparición"""
+
+    def __init__(self):
+        self.labels = []
+        self._codes = {}
+
+    def code(self, label):
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+
+class ResultColumns:
+    """
+    Resultados en columnas
+
+    Participantes: participant_ids, genero, edad (NaN si falta), completado
+    y sources (archivo de origen, en la carga desde P*.json)
+    Respuestas: participant (índice del participante; -1 si el participante
+    no está en estas columnas), categoria (EVIDENTE, FAKE, REAL),
+    tipo_contenido, calidad, slider (NaN si falta), causa_fake (-1 si no
+    hay), tiempo (0 si falta)
+
+    labels[columna] da el texto de cada código de las columnas de texto.
+    """
+
+    def __init__(self):
+        self.labels = {name: _Labels() for name in LABEL_COLUMNS}
+        self.participant_ids = []
+        self.sources = []
+        # Última fila leída (rowid de participants, id de responses) en la carga desde SQLite
+        self.watermark = None
+        self._index = {}
+        self._genero = array.array('l')
+        self._edad = array.array('d')
+        self._completado = array.array('b')
+        self._participant = array.array('l')
+        self._categoria = array.array('b')
+        self._tipo_contenido = array.array('l')
+        self._calidad = array.array('l')
+        self._slider = array.array('d')
+        self._causa_fake = array.array('l')
+        self._tiempo = array.array('d')
+
+    # --- Construcción ---
+
+    def add_participant(self, participante_id, genero, edad, completado, source=None):
+        self._index[participante_id] = len(self.participant_ids)
+        self.participant_ids.append(participante_id)
+        self.sources.append(source)
+        self._genero.append(self.labels['genero'].code(genero))
+        self._edad.append(_float(edad))
+        self._completado.append(bool(completado))
+
+    def add_response(self, participante_id, es_fake, es_evidente, tipo_contenido, calidad,
+                     respuesta_slider, causa_fake, tiempo_respuesta_segundos):
+        """Añade una respuesta de un participante"""
+        if es_evidente:
+            categoria = EVIDENTE
+        elif es_fake:
+            categoria = FAKE
+        else:
+            categoria = REAL
+
+        self._participant.append(self._index.get(participante_id, -1))
+        self._categoria.append(categoria)
+        self._tipo_contenido.append(self.labels['tipo_contenido'].code(tipo_contenido or ''))
+        self._calidad.append(self.labels['calidad'].code(calidad or ''))
+        self._slider.append(_float(respuesta_slider))
+        self._causa_fake.append(self.labels['causa_fake'].code(causa_fake) if causa_fake else -1)
+        self._tiempo.append(_float(tiempo_respuesta_segundos or 0))
+
+    def extend(self, other):
+        """Añade las filas de otro ResultColumns (recodificando sus etiquetas)"""
+        offset = len(self.participant_ids)
+        for participante_id in other.participant_ids:
+            self._index[participante_id] = len(self.participant_ids)
+            self.participant_ids.append(participante_id)
+        self.sources.extend(other.sources)
+
+        def append_codes(target, name, codes):
+            # Código de other -> código propio; el -1 (sin valor) toma el último elemento
+            mapping = [self.labels[name].code(label) for label in other.labels[name].labels] + [-1]
+            target.frombytes(np.asarray(mapping, dtype=codes.dtype)[codes].tobytes())
+
+        append_codes(self._genero, 'genero', other.genero)
+        self._edad.extend(other._edad)
+        self._completado.extend(other._completado)
+
+        participant = other.participant
+        self._participant.frombytes(np.where(participant >= 0, participant + offset, -1).tobytes())
+        self._categoria.extend(other._categoria)
+        append_codes(self._tipo_contenido, 'tipo_contenido', other.tipo_contenido)
+        append_codes(self._calidad, 'calidad', other.calidad)
+        self._slider.extend(other._slider)
+        append_codes(self._causa_fake, 'causa_fake', other.causa_fake)
+        self._tiempo.extend(other._tiempo)
+
+    # --- Columnas NumPy (sin copia: comparten memoria con los array.array) ---
+
+    @property
+    def genero(self):
+        return np.frombuffer(self._genero, dtype=np.dtype(self._genero.typecode))
+
+    @property
+    def edad(self):
+        return np.frombuffer(self._edad, dtype=np.float64)
+
+    @property
+    def completado(self):
+        return np.frombuffer(self._completado, dtype=np.int8).astype(bool)
+
+    @property
+    def participant(self):
+        return np.frombuffer(self._participant, dtype=np.dtype(self._participant.typecode))
+
+    @property
+    def categoria(self):
+        return np.frombuffer(self._categoria, dtype=np.int8)
+
+    @property
+    def tipo_contenido(self):
+        return np.frombuffer(self._tipo_contenido, dtype=np.dtype(self._tipo_contenido.typecode))
+
+    @property
+    def calidad(self):
+        return np.frombuffer(self._calidad, dtype=np.dtype(self._calidad.typecode))
+
+    @property
+    def slider(self):
+        return np.frombuffer(self._slider, dtype=np.float64)
+
+    @property
+    def causa_fake(self):
+        return np.frombuffer(self._causa_fake, dtype=np.dtype(self._causa_fake.typecode))
+
+    @property
+    def tiempo(self):
+        return np.frombuffer(self._tiempo, dtype=np.float64)
+
+    @property
+    def total_participantes(self):
+        return len(self.participant_ids)
+
+    @property
+    def total_respuestas(self):
+        return len(self._participant)
+
+
+def load_from_store(store, since=(0, 0)):
+    """
+    Columnas de la base de datos SQLite del servidor
+
+    Args:
+        since: (rowid de participants, id de responses) ya leídos; solo se
+            cargan las filas posteriores (carga incremental)
+
+    columns.watermark queda con las últimas filas leídas.
+    """
+    # Límite superior fijado antes de leer: el servidor puede seguir escribiendo
+    watermark = tuple(store.query(
+        'SELECT (SELECT IFNULL(MAX(rowid), 0) FROM participants), '
+        '(SELECT IFNULL(MAX(id), 0) FROM response_records)'
+    )[0])
+
+    columns = ResultColumns()
+    columns.watermark = watermark
+    for row in store.query(
+        'SELECT id, genero, edad, completado FROM participants WHERE rowid > ? AND rowid <= ? ORDER BY id',
+        (since[0], watermark[0])
+    ):
+        columns.add_participant(row['id'], row['genero'], row['edad'], row['completado'])
+
+    for row in store.iter_query("""
+        SELECT participant_id, es_fake, es_evidente, tipo_contenido, calidad,
+               respuesta_slider, causa_fake, tiempo_respuesta_segundos
+        FROM responses WHERE id > ? AND id <= ? ORDER BY participant_id, id
+    """, (since[1], watermark[1])):
+        columns.add_response(*row)
+    return columns
+
+
+def load_from_json_dir(data_dir, workers=None, paths=None):
+    """
+    Columnas de los P*.json de una carpeta, leídos con un pool de procesos
+
+    Args:
+        data_dir: carpeta con los P*.json (y sus P*.log, si los hay)
+        workers: procesos (None = uno por núcleo)
+        paths: leer solo estos archivos (None = todos los P*.json)
+    """
+    if paths is None:
+        paths = sorted(str(path) for path in Path(data_dir).glob('P*.json'))
+    tasks = [paths[i:i + FILES_PER_TASK] for i in range(0, len(paths), FILES_PER_TASK)]
+
+    columns = ResultColumns()
+    if len(tasks) <= 1:
+        # Pocos archivos: arrancar procesos costaría más que leerlos
+        for task in tasks:
+            columns.extend(_load_json_files(task))
+        return columns
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for partial in pool.map(_load_json_files, tasks):
+            columns.extend(partial)
+    return columns
+
+
+def _load_json_files(paths):
+    """Tarea del pool: columnas de una lista de P*.json"""
+    columns = ResultColumns()
+    for path in paths:
+        try:
+            data = _load_json_participant(Path(path))
+        except (OSError, ValueError) as e:
+            print(f"  Advertencia: no se pudo leer {path}: {e}")
+            continue
+        participante_id = data.get('id') or Path(path).stem
+        if participante_id in columns._index:
+            continue
+        columns.add_participant(participante_id, data.get('genero'), data.get('edad'),
+                                data.get('completado', False), path)
+        for response in data.get('respuestas', []):
+            columns.add_response(participante_id, response.get('es_fake'), response.get('es_evidente'),
+                                 response.get('tipo_contenido'), response.get('calidad'),
+                                 response.get('respuesta_slider'), response.get('causa_fake'),
+                                 response.get('tiempo_respuesta_segundos'))
+    return columns
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Cliente mínimo de la API de Runway ML (creación de tareas, estado y descargas)
+"""
+
+import hashlib
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+import urllib.error
+
+RUNWAY_API_KEY = 'key_657eb6a1e66411ca3e285d1b2a9ccebc5e329abcdaa3f77a68d702fc1f6236652d8b2ccc1553f839924ea5e5f80b012d04cbbd4ece748ae6bd501e897a0ee133'
+RUNWAY_API_BASE = 'https://api.dev.runwayml.com/v1'
+RUNWAY_API_VERSION = '2024-11-06'
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_RETRIES = 3
+
+
+class RunwayError(Exception):
+    """Error devuelto por la API de Runway (con el detalle de la respuesta)"""
+
+    def __init__(self, message, details=None, status=None):
+        super().__init__(message)
+        self.message = message
+        self.details = details
+        # Código HTTP de la respuesta (None si el error no viene de una)
+        self.status = status
+
+
+def _headers(with_body=False):
+    headers = {
+        'Authorization': f'Bearer {RUNWAY_API_KEY}',
+        'X-Runway-Version': RUNWAY_API_VERSION
+    }
+    if with_body:
+        headers['Content-Type'] = 'application/json'
+    return headers
+
+
+def create_task(image_data_uri, config):
+    """
+    Crea una tarea image_to_video y devuelve su ID
+
+    Args:
+        image_data_uri: imagen en formato data URI (base64)
+        config: dict con 'prompt', 'model', 'duration' y 'ratio'
+    """
+    request_data = {
+        'promptImage': image_data_uri,
+        'promptText': config['prompt'],
+        'model': config['model'],
+        'duration': config['duration'],
+        'ratio': config['ratio']
+    }
+
+    req = urllib.request.Request(
+        f"{RUNWAY_API_BASE}/image_to_video",
+        data=json.dumps(request_data).encode('utf-8'),
+        headers=_headers(with_body=True)
+    )
+
+    try:
+        with urllib.request.urlopen(req) as response:
+            response_data = json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        error_body = e.read().decode('utf-8')
+        print(f"\n==> API ERROR (HTTP {e.code}):")
+        print(f"    {error_body}")
+        try:
+            details = json.loads(error_body)
+        except ValueError:
+            details = error_body
+        raise RunwayError(f'API error (HTTP {e.code})', details, status=e.code)
+
+    task_id = response_data.get('id')
+    if not task_id:
+        print(f"==> ERROR: No task ID in response")
+        print(f"    Response: {response_data}")
+        raise RunwayError('No task ID received', response_data)
+
+    return task_id
+
+
+class _TrackedTask:
+    def __init__(self, task_id, expected_seconds):
+        self.task_id = task_id
+        self.expected_seconds = expected_seconds
+        self.started = time.monotonic()
+        self.next_check = self.started + TaskPoller.MIN_INTERVAL
+        self.version = 0
+        self.status = None
+        self.progress = 0
+        self.data = None
+
+
+class TaskPoller:
+    """
+    Sondeo compartido de todas las tareas de Runway pendientes
+
+    Un único hilo consulta /tasks/{id} sobre una conexión HTTPS keep-alive.
+    El intervalo de cada tarea se adapta a su progreso: se estima el tiempo
+    restante (por el progreso reportado o, si no hay, por la duración
+    esperada) y se vuelve a consultar a mitad de ese tiempo. Los trabajos
+    que esperan se despiertan en cuanto su tarea cambia de estado.
+    """
+
+    MIN_INTERVAL = 1.0
+    MAX_INTERVAL = 10.0
+    QUEUED_INTERVAL = 5.0  # PENDING / THROTTLED: todavía no ha empezado
+    FAILED_STATUSES = ('FAILED', 'CANCELLED')
+
+    def __init__(self):
+        self._tasks = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._connection = None
+        parsed = urllib.parse.urlparse(RUNWAY_API_BASE)
+        self._host = parsed.netloc
+        self._base_path = parsed.path.rstrip('/')
+
+    def track(self, task_id, expected_seconds=90):
+        """Empieza a sondear una tarea (idempotente)"""
+        with self._cond:
+            if task_id not in self._tasks:
+                self._tasks[task_id] = _TrackedTask(task_id, expected_seconds)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='runway-poller', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def untrack(self, task_ids):
+        with self._cond:
+            for task_id in task_ids:
+                self._tasks.pop(task_id, None)
+
+    def wait_for_update(self, versions, timeout):
+        """
+        Espera a que alguna de las tareas cambie de estado
+
+        Args:
+            versions: dict task_id -> última versión vista por el llamante
+            timeout: segundos máximos de espera
+
+        Returns:
+            lista de (task_id, version, status_data); vacía si venció el plazo
+        """
+        deadline = time.monotonic() + timeout
+
+        def changed():
+            return [
+                (task_id, task.version, task.data)
+                for task_id, task in ((t, self._tasks.get(t)) for t in versions)
+                if task is not None and task.version > versions[task_id]
+            ]
+
+        with self._cond:
+            while True:
+                updates = changed()
+                remaining = deadline - time.monotonic()
+                if updates or remaining <= 0:
+                    return updates
+                self._cond.wait(remaining)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                pending = [t for t in self._tasks.values() if not self._is_final(t)]
+                if not pending:
+                    self._cond.wait()
+                    continue
+                task = min(pending, key=lambda t: t.next_check)
+                delay = task.next_check - time.monotonic()
+                if delay > 0:
+                    # Despertar antes si se añade una tarea nueva
+                    self._cond.wait(delay)
+                    continue
+
+            try:
+                status_data = self._fetch(task.task_id)
+            except Exception as e:
+                print(f"Error checking status: {e}")
+                if isinstance(e, RunwayError) and _is_client_error(e.status):
+                    # 401, 404...: reintentar no va a cambiar la respuesta
+                    status_data = {'status': 'FAILED', 'failure': e.message, 'details': e.details}
+                else:
+                    with self._cond:
+                        task.next_check = time.monotonic() + self.QUEUED_INTERVAL
+                    continue
+
+            with self._cond:
+                status = status_data.get('status')
+                progress = status_data.get('progress') or 0
+                changed = (status != task.status or progress != task.progress or
+                           task_output_url(status_data) != task_output_url(task.data or {}))
+                if changed:
+                    task.status = status
+                    task.progress = progress
+                    task.data = status_data
+                    task.version += 1
+                    self._cond.notify_all()
+                task.next_check = time.monotonic() + self._interval(task)
+
+    def _is_final(self, task):
+        """Terminada: fallida, o SUCCEEDED y ya con URL de salida"""
+        if task.status in self.FAILED_STATUSES:
+            return True
+        return task.status == 'SUCCEEDED' and bool(task_output_url(task.data))
+
+    def _interval(self, task):
+        """Segundos hasta la siguiente consulta según progreso y duración esperada"""
+        if task.status in (None, 'PENDING', 'THROTTLED'):
+            return self.QUEUED_INTERVAL
+
+        elapsed = time.monotonic() - task.started
+        if task.progress > 0:
+            remaining = elapsed * (1 - task.progress) / task.progress
+        else:
+            remaining = task.expected_seconds - elapsed
+
+        return min(self.MAX_INTERVAL, max(self.MIN_INTERVAL, remaining / 2))
+
+    def _fetch(self, task_id):
+        """GET /tasks/{id} reutilizando la conexión keep-alive"""
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = http.client.HTTPSConnection(self._host, timeout=30)
+            try:
+                self._connection.request('GET', f'{self._base_path}/tasks/{task_id}', headers=_headers())
+                response = self._connection.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                # Conexión cerrada por el servidor: reabrir una vez
+                self._connection.close()
+                self._connection = None
+                if attempt:
+                    raise
+                continue
+
+            if response.status >= 400:
+                raise RunwayError(f'API error (HTTP {response.status})', body.decode('utf-8', errors='replace'),
+                                  status=response.status)
+            return json.loads(body.decode('utf-8'))
+
+
+def _is_client_error(status):
+    """4xx que no se arregla reintentando (429 es límite de peticiones: sí se reintenta)"""
+    return status is not None and 400 <= status < 500 and status != 429
+
+
+poller = TaskPoller()
+
+
+def task_output_url(status_data):
+    """Extrae la URL del video de una tarea SUCCEEDED (None si aún no hay)"""
+    return (status_data.get('output') or [None])[0] or \
+        (status_data.get('artifacts') or [{}])[0].get('url')
+
+
+def download_video(video_url, file_path, expected_sha256=None):
+    """
+    Descarga el video generado en file_path sin cargarlo entero en memoria
+
+    Se escribe por bloques en un archivo .part que se renombra de forma
+    atómica al terminar. Si la conexión se corta, se reanuda con una
+    cabecera Range desde el último byte recibido. Si la descarga falla
+    definitivamente, el .part se borra.
+
+    Args:
+        video_url: URL de salida de la tarea
+        file_path: Path de destino
+        expected_sha256: hash esperado (opcional); si no coincide se lanza RunwayError
+
+    Returns:
+        sha256 hexadecimal del archivo descargado
+    """
+    part_path = file_path.with_name(file_path.name + '.part')
+    hasher = hashlib.sha256()
+    received = 0
+    total = None
+
+    try:
+        with open(part_path, 'wb') as f:
+            for attempt in range(DOWNLOAD_RETRIES + 1):
+                headers = {'Range': f'bytes={received}-'} if received else {}
+                try:
+                    request = urllib.request.Request(video_url, headers=headers)
+                    with urllib.request.urlopen(request, timeout=60) as response:
+                        if received and response.status != 206:
+                            # El servidor no admite Range: empezar de nuevo
+                            f.seek(0)
+                            f.truncate()
+                            hasher = hashlib.sha256()
+                            received = 0
+
+                        if total is None or response.status == 200:
+                            length = response.headers.get('Content-Length')
+                            total = received + int(length) if length else None
+
+                        while True:
+                            chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            f.write(chunk)
+                            hasher.update(chunk)
+                            received += len(chunk)
+
+                    if total is None or received >= total:
+                        break
+                    print(f"==> Descarga incompleta ({received}/{total} bytes), reanudando...")
+                except (OSError, http.client.HTTPException) as e:
+                    if attempt == DOWNLOAD_RETRIES:
+                        raise
+                    print(f"==> Descarga interrumpida en {received} bytes ({e}), reanudando...")
+                    time.sleep(1 + attempt)
+            else:
+                raise RunwayError(f'Incomplete download ({received}/{total} bytes)')
+    except BaseException:
+        # No dejar un .part a medias del que otra llamada pudiera reanudar
+        part_path.unlink(missing_ok=True)
+        raise
+
+    digest = hasher.hexdigest()
+    if expected_sha256 and digest != expected_sha256.lower():
+        part_path.unlink()
+        raise RunwayError('Checksum mismatch for downloaded video', {'expected': expected_sha256, 'actual': digest})
+
+    os.replace(part_path, file_path)
+    return digest
@@ -9,36 +9,161 @@ import json
 import base64
 import os
 import time
-import urllib.request
 import urllib.parse
 from pathlib import Path
 from io import BytesIO
 import re
 from datetime import datetime
-import glob
-import random
-from image_analyzer import generate_prompts_for_experiment
+import textwrap
+import threading
+import zlib
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from image_analyzer import analysis_cache, generate_prompts_for_experiment
+from image_preprocessing import preprocess_for_runway
+from video_jobs import FINAL_STATES, JobManager, QUALITY_CONFIGS
+from experiment_store import ExperimentStore, InvalidResponse, coerce_response
+from experiment_stats import ExperimentStats
+from video_catalog import VideoCatalog
+from video_assignment import VideoAssigner, seed_from_env
+from participant_sessions import SessionCache
+from static_files import (HotFileCache, file_etag, last_modified, cache_control, not_modified,
+                          requested_range, RangeNotSatisfiable)
+from multipart_upload import parse_multipart, close_parts, UploadedFile, UploadTooLarge, MultipartError
+
+try:
+    import zstandard
+except ImportError:  # Opcional: sin él las exportaciones solo se comprimen con gzip
+    zstandard = None
 
 PORT = 8000
-RUNWAY_API_KEY = 'key_657eb6a1e66411ca3e285d1b2a9ccebc5e329abcdaa3f77a68d702fc1f6236652d8b2ccc1553f839924ea5e5f80b012d04cbbd4ece748ae6bd501e897a0ee133'
-RUNWAY_API_BASE = 'https://api.dev.runwayml.com/v1'
 DATA_DIR = Path('experiment_data')
 
+# Tamaño máximo de una imagen subida; las grandes se reducen antes de enviarlas
+# a Runway (ver image_preprocessing.py)
+MAX_IMAGE_BYTES = int(os.environ.get('MAX_IMAGE_MB', '25')) * 1024 * 1024
+MAX_BATCH_BYTES = 200 * 1024 * 1024
+# Tiempo máximo que un lote mantiene abierta la respuesta (los pendientes siguen en /jobs)
+BATCH_STREAM_TIMEOUT = int(os.environ.get('BATCH_STREAM_TIMEOUT', '1800'))
+# Margen para cabeceras y campos de texto en una subida de una sola imagen
+MULTIPART_OVERHEAD = 64 * 1024
+# Máximo que se descarta de una subida rechazada antes de cerrar la conexión
+MAX_DRAIN_BYTES = 32 * 1024 * 1024
+DRAIN_TIMEOUT = 2
+
+# Tamaño aproximado de cada bloque de las exportaciones en streaming
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Número de peticiones atendidas en paralelo (configurable por variable de entorno)
+MAX_WORKERS = int(os.environ.get('SERVER_WORKERS', '32'))
+
+
+class ThreadPoolHTTPServer(socketserver.TCPServer):
+    """TCPServer que atiende cada conexión en un pool acotado de hilos"""
+
+    # Cola de conexiones pendientes suficiente para una clase entera a la vez
+    request_queue_size = 64
+
+    def __init__(self, server_address, handler_class, max_workers=MAX_WORKERS):
+        # El pool se crea antes del bind: si el puerto está ocupado,
+        # TCPServer llama a server_close() desde su constructor
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='http')
+        super().__init__(server_address, handler_class)
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_participant_id_lock = threading.Lock()
+_last_participant_ts = 0
+
+
+def new_participant_id():
+    """Genera un ID P<timestamp> único aunque lleguen dos altas en el mismo milisegundo"""
+    global _last_participant_ts
+    with _participant_id_lock:
+        timestamp = max(int(time.time() * 1000), _last_participant_ts + 1)
+        _last_participant_ts = timestamp
+    return f"P{timestamp}"
+
+
+class ChunkedBodyWriter:
+    """Write a chunked response body, optionally compressed (gzip/zstd) on the fly"""
+
+    def __init__(self, handler, encoding=None):
+        self.handler = handler
+        if encoding == 'gzip':
+            self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        elif encoding == 'zstd':
+            self.compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        else:
+            self.compressor = None
+
+    def write(self, data):
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        self.handler.write_chunk(data)
+
+    def close(self):
+        if self.compressor is not None:
+            self.handler.write_chunk(self.compressor.flush())
+        self.handler.end_chunked_response()
+
+
+class UploadError(ValueError):
+    """Imagen subida que no se puede enviar a Runway (respuesta 400)"""
+
+    def __init__(self, message, **extra):
+        super().__init__(message)
+        self.message = message
+        self.extra = extra
+
+    def to_dict(self):
+        return dict({'success': False, 'message': self.message}, **self.extra)
+
+
 class RunwayHandler(http.server.SimpleHTTPRequestHandler):
+    chunked_started = False
+
     def do_GET(self):
         if self.path == '/get-stats':
             self.handle_get_stats()
-        elif self.path == '/export-csv':
+        elif urllib.parse.urlparse(self.path).path == '/export-csv':
             self.handle_export_csv()
-        elif self.path == '/export-json':
+        elif urllib.parse.urlparse(self.path).path == '/export-json':
             self.handle_export_json()
+        elif self.path == '/transcode-stats':
+            self.handle_transcode_stats()
+        elif urllib.parse.urlparse(self.path).path.rstrip('/') == '/jobs':
+            self.handle_list_jobs()
+        elif urllib.parse.urlparse(self.path).path.startswith('/jobs/'):
+            self.handle_get_job()
         else:
-            # Default behavior for all other GET requests
-            super().do_GET()
+            # Static files (videos, HTML...) with Range and conditional GET
+            self.handle_static_file()
+
+    def do_HEAD(self):
+        self.handle_static_file(head_only=True)
 
     def do_POST(self):
         if self.path == '/generate-from-local-image':
             self.handle_video_generation()
+        elif self.path == '/generate-batch':
+            self.handle_batch_generation()
         elif self.path == '/init-experiment.php' or self.path == '/init-experiment':
             self.handle_init_experiment()
         elif self.path == '/save-response.php' or self.path == '/save-response':
@@ -48,184 +173,167 @@ class RunwayHandler(http.server.SimpleHTTPRequestHandler):
         else:
             self.send_error(404, "Not Found")
 
-    def parse_multipart(self, body, boundary):
-        """Simple multipart/form-data parser for Python 3.13+"""
-        parts = {}
-        boundary = boundary.encode() if isinstance(boundary, str) else boundary
-
-        # Split by boundary
-        sections = body.split(b'--' + boundary)
-
-        for section in sections:
-            if not section or section == b'--\r\n' or section == b'--':
-                continue
-
-            # Find headers end
-            header_end = section.find(b'\r\n\r\n')
-            if header_end == -1:
-                continue
+    def read_multipart(self, max_body_size=None):
+        """
+        Parse a multipart/form-data body as it streams in
 
-            headers = section[:header_end].decode('utf-8', errors='ignore')
-            content = section[header_end + 4:]
+        Returns None if the request was already answered with an error.
+        File fields come back as UploadedFile; the caller must close them
+        with close_parts().
+        """
+        content_type = self.headers['Content-Type'] or ''
 
-            # Remove trailing \r\n
-            if content.endswith(b'\r\n'):
-                content = content[:-2]
+        if 'multipart/form-data' not in content_type:
+            self.send_json_response({'success': False, 'message': 'Invalid content type'}, 400)
+            return None
 
-            # Extract field name
-            name_match = re.search(r'name="([^"]+)"', headers)
-            if not name_match:
-                continue
+        # Get boundary
+        boundary_match = re.search(r'boundary=(.+)', content_type)
+        if not boundary_match:
+            self.send_json_response({'success': False, 'message': 'No boundary found'}, 400)
+            return None
 
-            field_name = name_match.group(1)
+        boundary = boundary_match.group(1).strip().strip('"')
 
-            # Check if it's a file
-            if 'filename=' in headers:
-                parts[field_name] = content
-            else:
-                # Text field
-                parts[field_name] = content.decode('utf-8', errors='ignore')
+        if self.headers['Content-Length'] is None:
+            self.send_json_response({'success': False, 'message': 'Content-Length required'}, 411)
+            return None
 
-        return parts
+        content_length = int(self.headers['Content-Length'])
 
-    def handle_video_generation(self):
         try:
-            # Parse multipart form data
-            content_type = self.headers['Content-Type']
-
-            if 'multipart/form-data' not in content_type:
-                self.send_json_response({'success': False, 'message': 'Invalid content type'}, 400)
-                return
-
-            # Get boundary
-            boundary_match = re.search(r'boundary=(.+)', content_type)
-            if not boundary_match:
-                self.send_json_response({'success': False, 'message': 'No boundary found'}, 400)
-                return
-
-            boundary = boundary_match.group(1).strip()
-
-            # Read body
-            content_length = int(self.headers['Content-Length'])
-            body = self.rfile.read(content_length)
+            return parse_multipart(self.rfile, content_length, boundary, MAX_IMAGE_BYTES, max_body_size)
+        except UploadTooLarge as e:
+            # No seguir procesando la subida: responder y cerrar la conexión
+            self.close_connection = True
+            limit_mb = e.limit / (1024 * 1024)
+            self.send_json_response({
+                'success': False,
+                'message': f'Upload too large: {e.field_name} exceeds {limit_mb:.1f}MB',
+                'suggestion': 'Please resize or compress the image before uploading'
+            }, 413)
+            self.discard_body(e.unread)
+            return None
+        except MultipartError as e:
+            self.close_connection = True
+            self.send_json_response({'success': False, 'message': f'Invalid multipart body: {e}'}, 400)
+            return None
+
+    def prepare_generation(self, image_data, folder_path, prompt_text):
+        """
+        Preprocess an uploaded image, build its data URI and generate the prompts
 
-            # Parse multipart data
-            parts = self.parse_multipart(body, boundary)
+        Returns (image_data_uri, prompt_data, preprocessing report).
 
-            # Get image data
-            if 'image' not in parts:
-                self.send_json_response({'success': False, 'message': 'No image received'}, 400)
-                return
+        Raises:
+            UploadError: if the image can't be sent to Runway
+        """
+        if isinstance(image_data, UploadedFile):
+            image_data = image_data.read()
+        elif isinstance(image_data, str):
+            image_data = image_data.encode('latin1')
 
-            image_data = parts['image']
-            if isinstance(image_data, str):
-                image_data = image_data.encode('latin1')
+        if not image_data:
+            raise UploadError('Empty image data')
 
-            # Get other fields
-            folder_path = parts.get('folderPath', '')
-            prompt_text = parts.get('promptText', '')
+        try:
+            img = Image.open(BytesIO(image_data))
+        except OSError:
+            raise UploadError('Invalid image data')
+
+        print(f"==> Image original: {img.width}x{img.height} ({len(image_data)} bytes)")
+
+        # Orientación EXIF, ratio <= 2:1, resolución de salida y presupuesto de bytes
+        ratios = [config['ratio'] for config in QUALITY_CONFIGS.values()]
+        processed = preprocess_for_runway(img, image_data, ratios)
+        img = processed['image']
+        image_data = processed['image_data']
+        mime_type = processed['mime_type']
+
+        preprocessing = {key: processed[key] for key in (
+            'original_bytes', 'final_bytes', 'bytes_saved', 'seconds', 'width', 'height', 'quality'
+        )}
+        if processed['quality'] is not None:
+            print(f"==> Image preprocessed: {img.width}x{img.height}, quality {processed['quality']}, "
+                  f"{processed['bytes_saved'] / 1024:.0f} KB saved in {processed['seconds']:.2f} s")
+
+        # Convert image to base64 data URI
+        image_base64 = base64.b64encode(image_data).decode('utf-8')
+
+        # Format: data:content/type;base64,{encoded_data}
+        image_data_uri = f"data:{mime_type};base64,{image_base64}"
+
+        # IMPORTANTE: Detectar tipo de video desde el nombre de carpeta
+        # Formato esperado: cualquier cosa con 'e' o 'i' en el nombre
+        video_type = 'e'  # default: entretenimiento
+        if folder_path:
+            folder_lower = folder_path.lower()
+            if 'informativ' in folder_lower or '_i' in folder_lower or folder_lower.endswith('i'):
+                video_type = 'i'
+
+        # Analizar imagen y generar prompts inteligentes
+        print(f"\n==> Analizando imagen...")
+        prompt_data = generate_prompts_for_experiment(
+            image_data,
+            video_type,
+            prompt_text if prompt_text else None,
+            image=img
+        )
+
+        print(f"==> Análisis de imagen{' (caché)' if prompt_data['cached'] else ''}:")
+        print(f"    Tipo: {prompt_data['video_type']}")
+        print(f"    Brillo: {prompt_data['analysis']['brightness']}")
+        print(f"    Composición: {prompt_data['analysis']['composition']}")
+        print(f"    Temperatura: {prompt_data['analysis']['color_temperature']}")
+
+        print(f"\n==> Generando videos...")
+        print(f"    Folder: {folder_path}")
+        print(f"    Image size: {len(image_data)} bytes")
+
+        return image_data_uri, prompt_data, preprocessing
 
-            if not image_data:
-                self.send_json_response({'success': False, 'message': 'Empty image data'}, 400)
+    def handle_video_generation(self):
+        try:
+            # Parse multipart form data (rejects oversized bodies before reading them)
+            parts = self.read_multipart(MAX_IMAGE_BYTES + MULTIPART_OVERHEAD)
+            if parts is None:
                 return
 
-            # Detect image type FIRST (before processing)
-            if image_data.startswith(b'\xff\xd8\xff'):
-                original_format = 'JPEG'
-                mime_type = 'image/jpg'
-            elif image_data.startswith(b'\x89PNG'):
-                original_format = 'PNG'
-                mime_type = 'image/png'
-            elif image_data.startswith(b'GIF'):
-                original_format = 'GIF'
-                mime_type = 'image/gif'
-            else:
-                original_format = 'JPEG'
-                mime_type = 'image/jpg'
+            try:
+                # Get image data
+                if 'image' not in parts:
+                    self.send_json_response({'success': False, 'message': 'No image received'}, 400)
+                    return
 
-            # Check and fix image aspect ratio
-            # Runway ML requires width/height ratio <= 2.0
-            from PIL import Image
-            from io import BytesIO
+                # Get other fields
+                folder_path = parts.get('folderPath', '')
+                prompt_text = parts.get('promptText', '')
 
-            img = Image.open(BytesIO(image_data))
-            width, height = img.size
-            aspect_ratio = width / height
-
-            print(f"==> Image original: {width}x{height} (ratio: {aspect_ratio:.3f})")
-
-            # If aspect ratio is too wide, crop or resize
-            if aspect_ratio > 2.0:
-                # Resize to max 2:1 ratio
-                new_width = int(height * 2.0)
-                # Crop from center
-                left = (width - new_width) // 2
-                img = img.crop((left, 0, left + new_width, height))
-                width, height = img.size
-                aspect_ratio = width / height
-                print(f"==> Image adjusted: {width}x{height} (ratio: {aspect_ratio:.3f})")
-
-                # Convert back to bytes
-                buffer = BytesIO()
-                img.save(buffer, format=original_format, quality=95)
-                image_data = buffer.getvalue()
-
-            # Check image size (must be <3.3MB to fit in 5MB after base64 encoding)
-            image_size_mb = len(image_data) / (1024 * 1024)
-            if image_size_mb > 3.3:
-                self.send_json_response({
-                    'success': False,
-                    'message': f'Image too large: {image_size_mb:.2f}MB. Must be less than 3.3MB (becomes 5MB after encoding)',
-                    'suggestion': 'Please resize or compress the image before uploading'
-                }, 400)
+                image_data_uri, prompt_data, preprocessing = self.prepare_generation(
+                    parts['image'], folder_path, prompt_text
+                )
+            except UploadError as e:
+                self.send_json_response(e.to_dict(), 400)
                 return
+            finally:
+                close_parts(parts)
 
-            # Convert image to base64 data URI
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-
-            # Format: data:content/type;base64,{encoded_data}
-            image_data_uri = f"data:{mime_type};base64,{image_base64}"
-
-            # IMPORTANTE: Detectar tipo de video desde el nombre de carpeta
-            # Formato esperado: cualquier cosa con 'e' o 'i' en el nombre
-            video_type = 'e'  # default: entretenimiento
-            if folder_path:
-                folder_lower = folder_path.lower()
-                if 'informativ' in folder_lower or '_i' in folder_lower or folder_lower.endswith('i'):
-                    video_type = 'i'
-
-            # Analizar imagen y generar prompts inteligentes
-            print(f"\n==> Analizando imagen...")
-            prompt_data = generate_prompts_for_experiment(
-                image_data,
-                video_type,
-                prompt_text if prompt_text else None
-            )
-
-            print(f"==> Análisis de imagen:")
-            print(f"    Tipo: {prompt_data['video_type']}")
-            print(f"    Brillo: {prompt_data['analysis']['brightness']}")
-            print(f"    Composición: {prompt_data['analysis']['composition']}")
-            print(f"    Temperatura: {prompt_data['analysis']['color_temperature']}")
-
-            print(f"\n==> Generando videos...")
-            print(f"    Folder: {folder_path}")
-            print(f"    Image size: {len(image_data)} bytes")
-
-            # Generate videos with differentiated prompts
-            result = self.generate_videos(
+            # Encolar la generación: el trabajo sigue en segundo plano
+            job = self.server.job_manager.submit(
                 image_data_uri,
                 prompt_data['prompts'],
                 folder_path,
                 prompt_data['analysis']
             )
 
-            if result['success']:
-                print(f"==> Success! Videos generated")
-                self.send_json_response(result, 200)
-            else:
-                print(f"==> Error: {result.get('message', 'Unknown error')}")
-                self.send_json_response(result, 500)
+            self.send_json_response({
+                'success': True,
+                'message': 'Generación en cola',
+                'jobId': job.id,
+                'statusUrl': f'/jobs/{job.id}',
+                'job': job.to_dict(),
+                'preprocessing': preprocessing
+            }, 202)
 
         except Exception as e:
             print(f"\n==> ERROR in handle_video_generation:")
@@ -238,230 +346,150 @@ class RunwayHandler(http.server.SimpleHTTPRequestHandler):
                 'error_type': type(e).__name__
             }, 500)
 
-    def generate_videos(self, image_data_uri, prompts_dict, folder_path, image_analysis):
-        """
-        Generate both high and low quality videos with different prompts
-
-        Args:
-            image_data_uri: Base64 encoded image
-            prompts_dict: dict with 'high_quality' and 'low_quality' prompts
-            folder_path: Destination folder
-            image_analysis: Image analysis results
-        """
-
-        # Configuración que funcionaba:
-        # Gen-4 Turbo para ALTA calidad (mejor calidad)
-        # Gen-3 Alpha Turbo para BAJA calidad (ahorro de créditos)
-
-        quality_configs = {
-            'high': {
-                'duration': 10,
-                'model': 'gen4_turbo',  # VOLVIENDO a Gen-4 para alta calidad
-                'ratio': '1280:720',  # Gen-4 acepta este ratio
-                'target_size_mb': 10,
-                'bitrate': '4000k',  # High bitrate
-                'label': 'Alta',
-                'fileName': 'video_high_quality.mp4',
-                'prompt': prompts_dict['high_quality'],
-                'compress': False  # No comprimir
-            },
-            'low': {
-                'duration': 10,
-                'model': 'gen3a_turbo',  # Gen-3 para baja calidad (ahorra créditos)
-                'ratio': '1280:768',  # Gen-3 solo acepta 1280:768 o 768:1280
-                'target_size_mb': 2,
-                'bitrate': '600k',  # Low bitrate
-                'label': 'Baja',
-                'fileName': 'video_low_quality.mp4',
-                'prompt': prompts_dict['low_quality'],
-                'compress': True  # Comprimir agresivamente
-            }
-        }
-
-        # COSTE TOTAL: 50 + 20 = 70 créditos
-        # Para tu experimento: 4 imágenes × 70 = 280 créditos
-
-        video_task_ids = {}
+    def queue_batch(self, parts):
+        """Validate a batch manifest and queue one job per valid item (None if answered with 400)"""
+        try:
+            manifest = json.loads(parts.get('manifest', ''))
+        except ValueError:
+            self.send_json_response({'success': False, 'message': 'Invalid or missing manifest'}, 400)
+            return None
+
+        if not isinstance(manifest, list) or not manifest:
+            self.send_json_response({'success': False, 'message': 'Manifest must be a non-empty list'}, 400)
+            return None
+
+        items = []
+        for index, entry in enumerate(manifest):
+            if not isinstance(entry, dict):
+                items.append({'index': index, 'folderPath': '', 'success': False,
+                              'message': 'Manifest entry must be an object'})
+                continue
 
-        # Create both video generation tasks with DIFFERENT PROMPTS
-        for quality, config in quality_configs.items():
-            # Request data for gen4_turbo with quality-specific prompt
-            request_data = {
-                'promptImage': image_data_uri,
-                'promptText': config['prompt'],  # Different prompt per quality!
-                'model': config['model'],
-                'duration': config['duration'],
-                'ratio': config['ratio']  # Required for gen4_turbo
-            }
+            folder_path = entry.get('folderPath', '')
+            item = {'index': index, 'folderPath': folder_path}
 
-            print(f"\n==> Creating {quality} quality video task...")
-            print(f"    Model: {config['model']}")
-            print(f"    Duration: {config['duration']}s")
-            print(f"    Ratio: {config['ratio']}")
-            print(f"    Prompt: {config['prompt'][:80]}...")
-
-            req = urllib.request.Request(
-                f"{RUNWAY_API_BASE}/image_to_video",
-                data=json.dumps(request_data).encode('utf-8'),
-                headers={
-                    'Content-Type': 'application/json',
-                    'Authorization': f'Bearer {RUNWAY_API_KEY}',
-                    'X-Runway-Version': '2024-11-06'
-                }
-            )
+            image_field = entry.get('image')
+            if image_field not in parts:
+                item.update(success=False, message=f'No image received for field {image_field!r}')
+                items.append(item)
+                continue
 
             try:
-                with urllib.request.urlopen(req) as response:
-                    response_data = json.loads(response.read().decode('utf-8'))
-                    task_id = response_data.get('id')
-
-                    if not task_id:
-                        print(f"==> ERROR: No task ID in response")
-                        print(f"    Response: {response_data}")
-                        return {
-                            'success': False,
-                            'message': f'No task ID received for {quality} quality',
-                            'response': response_data
-                        }
-
-                    print(f"==> Task created: {task_id}")
-                    video_task_ids[quality] = {
-                        'taskId': task_id,
-                        'config': config
-                    }
-            except urllib.error.HTTPError as e:
-                error_body = e.read().decode('utf-8')
-                print(f"\n==> API ERROR (HTTP {e.code}):")
-                print(f"    {error_body}")
-                try:
-                    error_json = json.loads(error_body)
-                    return {
-                        'success': False,
-                        'message': f'API error for {quality} quality (HTTP {e.code})',
-                        'details': error_json
-                    }
-                except:
-                    return {
-                        'success': False,
-                        'message': f'API error for {quality} quality (HTTP {e.code})',
-                        'details': error_body
-                    }
-
-        # Poll for both videos to complete
-        max_attempts = 48  # 4 minutes
-        attempt = 0
-        completed_videos = {}
-
-        while attempt < max_attempts and len(completed_videos) < 2:
-            time.sleep(5)
-
-            for quality, task_info in video_task_ids.items():
-                if quality in completed_videos:
-                    continue
-
-                req = urllib.request.Request(
-                    f"{RUNWAY_API_BASE}/tasks/{task_info['taskId']}",
-                    headers={
-                        'Authorization': f'Bearer {RUNWAY_API_KEY}',
-                        'X-Runway-Version': '2024-11-06'
-                    }
+                image_data_uri, prompt_data, preprocessing = self.prepare_generation(
+                    parts[image_field], folder_path, entry.get('promptText', '')
                 )
+            except UploadError as e:
+                item.update(e.to_dict())
+                items.append(item)
+                continue
 
-                try:
-                    with urllib.request.urlopen(req) as response:
-                        status_data = json.loads(response.read().decode('utf-8'))
-
-                        if status_data.get('status') == 'SUCCEEDED':
-                            video_url = (status_data.get('output') or [None])[0] or \
-                                       (status_data.get('artifacts') or [{}])[0].get('url')
-                            if video_url:
-                                completed_videos[quality] = {
-                                    'url': video_url,
-                                    'config': task_info['config']
-                                }
-                        elif status_data.get('status') == 'FAILED':
-                            return {
-                                'success': False,
-                                'message': f'Video generation failed for {quality} quality',
-                                'details': status_data
-                            }
-                except Exception as e:
-                    print(f"Error checking status: {e}")
-
-            attempt += 1
-
-        if len(completed_videos) < 2:
-            return {
-                'success': False,
-                'message': f'Timeout generating videos (completed: {len(completed_videos)}/2)'
-            }
-
-        # Download and save videos
-        base_path = Path('VIDEOS') / folder_path
-        base_path.mkdir(parents=True, exist_ok=True)
-
-        results = {}
-
-        for quality, video_info in completed_videos.items():
-            config = video_info['config']
-            video_url = video_info['url']
-
-            # Download video
-            with urllib.request.urlopen(video_url) as response:
-                video_content = response.read()
-
-            # Save video
-            file_name = config['fileName']
-            file_path = base_path / file_name
+            job = self.server.job_manager.submit(
+                image_data_uri,
+                prompt_data['prompts'],
+                folder_path,
+                prompt_data['analysis']
+            )
+            item.update(success=True, jobId=job.id, status=job.status, preprocessing=preprocessing)
+            items.append(item)
 
-            with open(file_path, 'wb') as f:
-                f.write(video_content)
+        return items
 
-                    # Get file size
-            file_size_mb = file_path.stat().st_size / (1024 * 1024)
+    def handle_batch_generation(self):
+        """
+        Generate videos for many images at once
+
+        Multipart body: a 'manifest' field with a JSON list of
+        {"image": <file field name>, "folderPath": ..., "promptText": ...}
+        plus one file field per image. All items are queued as jobs right
+        away and the response streams one NDJSON line per item as it finishes.
+        Jobs still running after BATCH_STREAM_TIMEOUT (or at shutdown) are
+        reported as 'pending' lines and can be followed through /jobs.
+        """
+        try:
+            parts = self.read_multipart(MAX_BATCH_BYTES)
+            if parts is None:
+                return
 
-            # Aplicar compresión adicional si es necesario
-            if config.get('compress', False) or file_size_mb > config['target_size_mb'] * 1.2:
-                compressed_path = base_path / 'temp_compressed.mp4'
-                bitrate = config['bitrate']
+            try:
+                items = self.queue_batch(parts)
+            finally:
+                close_parts(parts)
+            if items is None:
+                return
 
-                # Comando ffmpeg para compresión
-                cmd = f'ffmpeg -i "{file_path}" -b:v {bitrate} -maxrate {bitrate} -bufsize 1M -y "{compressed_path}"'
+            job_items = {item['jobId']: item for item in items if item.get('jobId')}
+            print(f"==> Lote recibido: {len(items)} imágenes, {len(job_items)} trabajos encolados")
+
+            self.begin_chunked_response(200, 'application/x-ndjson')
+            self.write_chunk(json.dumps({
+                'type': 'accepted',
+                'total': len(items),
+                'queued': len(job_items),
+                'items': items
+            }, ensure_ascii=False).encode('utf-8') + b'\n')
+
+            pending = 0
+            for job in self.server.job_manager.iter_finished(job_items, BATCH_STREAM_TIMEOUT):
+                item = job_items[job['jobId']]
+                if job['status'] not in FINAL_STATES:
+                    pending += 1
+                self.write_chunk(json.dumps({
+                    'type': 'item' if job['status'] in FINAL_STATES else 'pending',
+                    'index': item['index'],
+                    'folderPath': item['folderPath'],
+                    'job': job
+                }, ensure_ascii=False).encode('utf-8') + b'\n')
+
+            self.write_chunk(json.dumps({'type': 'done', 'pending': pending}).encode('utf-8') + b'\n')
+            self.end_chunked_response()
+
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente cerró la conexión: los trabajos siguen en /jobs
+            print("==> Cliente desconectado del lote (los trabajos continúan)")
+        except Exception as e:
+            print(f"\n==> ERROR in handle_batch_generation:")
+            print(f"    {type(e).__name__}: {e}")
+            import traceback
+            traceback.print_exc()
+            self.send_json_response({
+                'success': False,
+                'message': f'Server error: {str(e)}',
+                'error_type': type(e).__name__
+            }, 500)
 
-                try:
-                    import subprocess
-                    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+    def handle_list_jobs(self):
+        """List all video generation jobs (most recent first)"""
+        self.send_json_response({
+            'success': True,
+            'jobs': self.server.job_manager.list()
+        })
 
-                    if result.returncode == 0 and compressed_path.exists():
-                        # Reemplazar con versión comprimida
-                        file_path.unlink()
-                        compressed_path.rename(file_path)
-                        file_size_mb = file_path.stat().st_size / (1024 * 1024)
-                        print(f"==> Video comprimido a {file_size_mb:.2f} MB")
-                except Exception as e:
-                    print(f"==> Advertencia: No se pudo comprimir con ffmpeg: {e}")
+    def handle_get_job(self):
+        """Report progress of one video generation job"""
+        job_id = urllib.parse.urlparse(self.path).path[len('/jobs/'):].strip('/')
+        job = self.server.job_manager.get(job_id)
 
-            relative_path = f'VIDEOS/{folder_path}/{file_name}'
+        if job is None:
+            self.send_json_response({
+                'success': False,
+                'message': 'Trabajo no encontrado'
+            }, 404)
+            return
 
-            results[quality] = {
-                'fileName': file_name,
-                'videoPath': relative_path,
-                'fileSize': f'{file_size_mb:.2f} MB',
-                'duration': config['duration'],
-                'taskId': video_task_ids[quality]['taskId'],
-                'label': config['label']
-            }
+        self.send_json_response({
+            'success': True,
+            'job': job
+        })
 
-        return {
+    def handle_transcode_stats(self):
+        """Report transcode pool throughput (wall time and output size per job)"""
+        self.send_json_response({
             'success': True,
-            'message': 'Ambos videos generados y guardados exitosamente',
-            'folderPath': str(base_path),
-            'imageUsed': 'uploaded_image',
-            'videos': results
-        }
+            'transcoder': self.server.job_manager.transcoder.stats()
+        })
 
     def handle_init_experiment(self):
-        """Initialize experiment - create participant and select random videos"""
+        """Initialize experiment - create participant and assign balanced videos"""
         try:
             # Read POST data
             content_length = int(self.headers['Content-Length'])
@@ -482,145 +510,18 @@ class RunwayHandler(http.server.SimpleHTTPRequestHandler):
             DATA_DIR.mkdir(exist_ok=True)
 
             # Generate participant ID
-            timestamp = int(time.time() * 1000)
-            participante_id = f"P{timestamp}"
-
-            # Scan VIDEOS folder
-            videos_folder = Path('VIDEOS')
-
-            # Videos evidentes con IA (SIEMPRE se incluyen todos)
-            evidentes_folders = ['e2', 'e9', 'e11']
-            videos_evidentes = []
-
-            # Videos IA entretenimiento (e1, e3, e4, etc. - excluyendo evidentes)
-            videos_ia_entretenimiento = []
+            participante_id = new_participant_id()
 
-            # Videos IA informativos (i1, i2, i3, etc.)
-            videos_ia_informativos = []
-
-            # Videos reales de la carpeta 'reales'
-            videos_reales_entretenimiento = []
-            videos_reales_informativos = []
-
-            if not videos_folder.exists():
+            # Videos from the cached catalog (refreshed by mtime, no full scan)
+            if not self.server.catalog.exists():
                 self.send_json_response({
                     'success': False,
                     'message': 'No se encontró la carpeta VIDEOS'
                 }, 404)
                 return
 
-            # Escanear carpeta reales
-            reales_folder = videos_folder / 'reales'
-            if reales_folder.exists():
-                for video_file in reales_folder.glob('*.mp4'):
-                    # Determinar tipo por nombre: e*.mp4 o i*.mp4
-                    if video_file.name.startswith('e'):
-                        videos_reales_entretenimiento.append({
-                            'path': str(video_file.as_posix()),
-                            'es_fake': False,
-                            'calidad': 'real',  # Los reales son todos misma calidad
-                            'tipo_contenido': 'entretenimiento',
-                            'es_evidente': False,
-                            'folder': 'reales'
-                        })
-                    elif video_file.name.startswith('i'):
-                        videos_reales_informativos.append({
-                            'path': str(video_file.as_posix()),
-                            'es_fake': False,
-                            'calidad': 'real',
-                            'tipo_contenido': 'informativo',
-                            'es_evidente': False,
-                            'folder': 'reales'
-                        })
-
-            # Escanear carpetas e* e i*
-            for subfolder in videos_folder.iterdir():
-                if not subfolder.is_dir() or subfolder.name == 'reales':
-                    continue
-
-                folder_name = subfolder.name
-
-                # Carpetas evidentes
-                if folder_name in evidentes_folders:
-                    for video_file in subfolder.glob('video_*.mp4'):
-                        calidad = 'alta' if 'high' in video_file.name else 'baja'
-                        videos_evidentes.append({
-                            'path': str(video_file.as_posix()),
-                            'es_fake': True,
-                            'calidad': calidad,
-                            'tipo_contenido': 'entretenimiento',
-                            'es_evidente': True,
-                            'folder': folder_name
-                        })
-
-                # Carpetas entretenimiento (e*)
-                elif folder_name.startswith('e'):
-                    for video_file in subfolder.glob('video_*.mp4'):
-                        calidad = 'alta' if 'high' in video_file.name else 'baja'
-                        videos_ia_entretenimiento.append({
-                            'path': str(video_file.as_posix()),
-                            'es_fake': True,
-                            'calidad': calidad,
-                            'tipo_contenido': 'entretenimiento',
-                            'es_evidente': False,
-                            'folder': folder_name
-                        })
-
-                # Carpetas informativo (i*)
-                elif folder_name.startswith('i'):
-                    for video_file in subfolder.glob('video_*.mp4'):
-                        calidad = 'alta' if 'high' in video_file.name else 'baja'
-                        videos_ia_informativos.append({
-                            'path': str(video_file.as_posix()),
-                            'es_fake': True,
-                            'calidad': calidad,
-                            'tipo_contenido': 'informativo',
-                            'es_evidente': False,
-                            'folder': folder_name
-                        })
-
-            print(f"\n==> Videos encontrados:")
-            print(f"    Evidentes: {len(videos_evidentes)}")
-            print(f"    IA Entretenimiento: {len(videos_ia_entretenimiento)}")
-            print(f"    IA Informativos: {len(videos_ia_informativos)}")
-            print(f"    Reales Entretenimiento: {len(videos_reales_entretenimiento)}")
-            print(f"    Reales Informativos: {len(videos_reales_informativos)}")
-
-            # Selección de videos según especificación:
-            # TOTAL: 20 videos
-            # - 4 evidentes (TODOS los disponibles de e2, e9, e11)
-            # - 8 entretenimiento (4 IA + 4 reales) - balanceados en calidad
-            # - 8 informativos (4 IA + 4 reales) - balanceados en calidad
-
-            selected_videos = []
-
-            # 1. Agregar TODOS los evidentes disponibles (debería haber 6: 3 carpetas × 2 calidades)
-            selected_videos.extend(videos_evidentes)
-
-            # 2. Seleccionar 4 IA entretenimiento (2 alta + 2 baja)
-            random.shuffle(videos_ia_entretenimiento)
-            ia_ent_alta = [v for v in videos_ia_entretenimiento if v['calidad'] == 'alta']
-            ia_ent_baja = [v for v in videos_ia_entretenimiento if v['calidad'] == 'baja']
-            selected_videos.extend(ia_ent_alta[:2])
-            selected_videos.extend(ia_ent_baja[:2])
-
-            # 3. Seleccionar 4 reales entretenimiento
-            random.shuffle(videos_reales_entretenimiento)
-            selected_videos.extend(videos_reales_entretenimiento[:4])
-
-            # 4. Seleccionar 4 IA informativos (2 alta + 2 baja)
-            random.shuffle(videos_ia_informativos)
-            ia_inf_alta = [v for v in videos_ia_informativos if v['calidad'] == 'alta']
-            ia_inf_baja = [v for v in videos_ia_informativos if v['calidad'] == 'baja']
-            selected_videos.extend(ia_inf_alta[:2])
-            selected_videos.extend(ia_inf_baja[:2])
-
-            # 5. Seleccionar 4 reales informativos
-            random.shuffle(videos_reales_informativos)
-            selected_videos.extend(videos_reales_informativos[:4])
-
-            # Mezclar el orden final (pero conservar la info de cada video)
-            random.shuffle(selected_videos)
+            # Least-exposed videos per stratum, in Latin-square order
+            selected_videos, latin_square_row = self.server.assigner.assign()
 
             print(f"\n==> Videos seleccionados: {len(selected_videos)}")
             print(f"    Evidentes: {len([v for v in selected_videos if v['es_evidente']])}")
@@ -637,12 +538,13 @@ class RunwayHandler(http.server.SimpleHTTPRequestHandler):
                 'fecha_inicio': datetime.now().isoformat(),
                 'videos': selected_videos,
                 'respuestas': [],
-                'completado': False
+                'completado': False,
+                'fila_cuadrado_latino': latin_square_row
             }
 
-            participant_file = DATA_DIR / f'{participante_id}.json'
-            with open(participant_file, 'w', encoding='utf-8') as f:
-                json.dump(participant_data, f, indent=2, ensure_ascii=False)
+            self.server.sessions.create(participant_data)
+            self.server.stats.participant_started(participant_data)
+            self.checkpoint_stats_if_needed()
 
             print(f"==> Experimento iniciado para participante {participante_id}")
             print(f"    Género: {genero}, Edad: {edad}")
@@ -682,38 +584,48 @@ class RunwayHandler(http.server.SimpleHTTPRequestHandler):
                 }, 400)
                 return
 
-            # Load participant data
-            participant_file = DATA_DIR / f'{participante_id}.json'
+            # Add response with all fields, each converted to its column type
+            try:
+                response = coerce_response({
+                    'fecha_hora': data.get('fecha_hora', datetime.now().isoformat()),
+                    'numero_video': numero_video,
+                    'video_path': data.get('video_path', ''),
+                    'tipo_contenido': data.get('tipo_contenido', ''),
+                    'es_fake': data.get('es_fake', False),
+                    'es_evidente': data.get('es_evidente', False),
+                    'calidad': data.get('calidad', ''),
+                    'respuesta_slider': respuesta_slider,
+                    'causa_fake': data.get('causa_fake', ''),
+                    'tiempo_respuesta_segundos': data.get('tiempo_respuesta_segundos', 0)
+                })
+            except InvalidResponse as e:
+                self.send_json_response({
+                    'success': False,
+                    'message': str(e)
+                }, 400)
+                return
+
+            # Video data comes from the catalog, not from the client. An answer
+            # for a video that is not in the catalog is still kept, unlinked
+            # (NULL video_id) and without the metadata the client claimed.
+            video = self.server.catalog.find(urllib.parse.unquote(response['video_path'] or '').lstrip('/'))
+            if video is not None:
+                response['video_path'] = video['path']
+            else:
+                print(f"==> Respuesta de {participante_id} para un video fuera del catálogo: {response['video_path']!r}")
+            for field in ('tipo_contenido', 'es_fake', 'es_evidente', 'calidad'):
+                response[field] = video[field] if video is not None else None
 
-            if not participant_file.exists():
+            # Queued in the participant's session; written in batches by the flusher
+            if not self.server.sessions.append_response(participante_id, response):
                 self.send_json_response({
                     'success': False,
                     'message': 'Participante no encontrado'
                 }, 404)
                 return
 
-            with open(participant_file, 'r', encoding='utf-8') as f:
-                participant_data = json.load(f)
-
-            # Add response with all fields
-            response = {
-                'fecha_hora': data.get('fecha_hora', datetime.now().isoformat()),
-                'numero_video': numero_video,
-                'video_path': data.get('video_path', ''),
-                'tipo_contenido': data.get('tipo_contenido', ''),
-                'es_fake': data.get('es_fake', False),
-                'es_evidente': data.get('es_evidente', False),
-                'calidad': data.get('calidad', ''),
-                'respuesta_slider': respuesta_slider,
-                'causa_fake': data.get('causa_fake', ''),
-                'tiempo_respuesta_segundos': data.get('tiempo_respuesta_segundos', 0)
-            }
-
-            participant_data['respuestas'].append(response)
-
-            # Save updated data
-            with open(participant_file, 'w', encoding='utf-8') as f:
-                json.dump(participant_data, f, indent=2, ensure_ascii=False)
+            # Stats count the answer once the flusher has written it (SessionCache on_written)
+            self.checkpoint_stats_if_needed()
 
             causa_info = f" - Causa: {response['causa_fake']}" if response['causa_fake'] else ""
             print(f"==> Respuesta guardada: {participante_id} - Video {numero_video} - Slider: {respuesta_slider}{causa_info}")
@@ -748,26 +660,18 @@ class RunwayHandler(http.server.SimpleHTTPRequestHandler):
                 }, 400)
                 return
 
-            # Load participant data
-            participant_file = DATA_DIR / f'{participante_id}.json'
-
-            if not participant_file.exists():
+            # Write pending answers, then mark as completed
+            participant_data, newly_completed = self.server.sessions.finish(participante_id, datetime.now().isoformat())
+            if participant_data is None:
                 self.send_json_response({
                     'success': False,
                     'message': 'Participante no encontrado'
                 }, 404)
                 return
 
-            with open(participant_file, 'r', encoding='utf-8') as f:
-                participant_data = json.load(f)
-
-            # Mark as completed
-            participant_data['completado'] = True
-            participant_data['fecha_finalizacion'] = datetime.now().isoformat()
-
-            # Save updated data
-            with open(participant_file, 'w', encoding='utf-8') as f:
-                json.dump(participant_data, f, indent=2, ensure_ascii=False)
+            if newly_completed:
+                self.server.stats.participant_finished()
+                self.checkpoint_stats_if_needed()
 
             print(f"==> Experimento finalizado: {participante_id}")
             print(f"    Total respuestas: {len(participant_data['respuestas'])}")
@@ -787,94 +691,11 @@ class RunwayHandler(http.server.SimpleHTTPRequestHandler):
             }, 500)
 
     def handle_get_stats(self):
-        """Get statistics from all experiment data"""
+        """Get statistics from the in-memory aggregate (updated on every write)"""
         try:
-            # Ensure data directory exists
-            if not DATA_DIR.exists():
-                DATA_DIR.mkdir(parents=True)
-
-            # Get all participant files
-            json_files = list(DATA_DIR.glob('P*.json'))
-
-            if len(json_files) == 0:
-                self.send_json_response({
-                    'success': True,
-                    'stats': {
-                        'total_participantes': 0,
-                        'edad_promedio': 0,
-                        'genero': {
-                            'masculino': 0,
-                            'femenino': 0,
-                            'otro': 0,
-                            'porcentaje_masculino': 0,
-                            'porcentaje_femenino': 0,
-                            'porcentaje_otro': 0
-                        },
-                        'total_respuestas': 0
-                    }
-                })
-                return
-
-            # Collect stats
-            total_participantes = 0
-            edades = []
-            generos = {'masculino': 0, 'femenino': 0, 'otro': 0}
-            total_respuestas = 0
-
-            for json_file in json_files:
-                try:
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-
-                        total_participantes += 1
-
-                        # Age
-                        edad = data.get('edad')
-                        if edad and isinstance(edad, (int, float)):
-                            edades.append(edad)
-
-                        # Gender
-                        genero = data.get('genero', '').lower()
-                        if genero in generos:
-                            generos[genero] += 1
-
-                        # Responses
-                        respuestas = data.get('respuestas', [])
-                        total_respuestas += len(respuestas)
-
-                except Exception as e:
-                    print(f"Error reading {json_file}: {e}")
-                    continue
-
-            # Calculate averages and percentages
-            edad_promedio = sum(edades) / len(edades) if edades else 0
-
-            # Gender percentages
-            total_genero = sum(generos.values())
-            if total_genero > 0:
-                porcentaje_masculino = round((generos['masculino'] / total_genero) * 100, 1)
-                porcentaje_femenino = round((generos['femenino'] / total_genero) * 100, 1)
-                porcentaje_otro = round((generos['otro'] / total_genero) * 100, 1)
-            else:
-                porcentaje_masculino = porcentaje_femenino = porcentaje_otro = 0
-
-            stats = {
-                'total_participantes': total_participantes,
-                'edad_promedio': edad_promedio,
-                'genero': {
-                    'masculino': generos['masculino'],
-                    'femenino': generos['femenino'],
-                    'otro': generos['otro'],
-                    'porcentaje_masculino': porcentaje_masculino,
-                    'porcentaje_femenino': porcentaje_femenino,
-                    'porcentaje_otro': porcentaje_otro
-                },
-                'total_respuestas': total_respuestas
-            }
-
             self.send_json_response({
                 'success': True,
-                'stats': stats
+                'stats': self.server.stats.snapshot()
             })
 
         except Exception as e:
@@ -886,26 +707,44 @@ class RunwayHandler(http.server.SimpleHTTPRequestHandler):
                 'message': f'Error al obtener estadísticas: {str(e)}'
             }, 500)
 
+    def checkpoint_stats_if_needed(self):
+        """Persist the stats aggregate every CHECKPOINT_EVERY writes"""
+        if self.server.stats.needs_checkpoint():
+            try:
+                self.server.stats.checkpoint()
+            except OSError as e:
+                print(f"==> Advertencia: no se pudo guardar el checkpoint de estadísticas: {e}")
+
     def handle_export_csv(self):
-        """Export data to CSV"""
+        """
+        Export responses to CSV, streamed with chunked transfer encoding
+
+        Query string filters (all optional): desde / hasta (response date,
+        ISO prefix such as 2025-01-31), completado (si/no) and
+        tipo_contenido. The body is gzip-compressed when the client accepts it.
+        """
         try:
             import csv
             import io
 
+            try:
+                filters = self.export_filters()
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+
             # Ensure data directory exists
             if not DATA_DIR.exists():
                 self.send_error(404, "No data available")
                 return
 
-            # Get all participant files
-            json_files = list(DATA_DIR.glob('P*.json'))
+            # Include answers still waiting for the write-behind flusher
+            self.server.sessions.flush()
 
-            if len(json_files) == 0:
+            if self.server.store.summary()['total_participantes'] == 0:
                 self.send_error(404, "No data available")
                 return
 
-            # Create CSV in memory
-            output = io.StringIO()
             fieldnames = [
                 'participante_id', 'genero', 'edad',
                 'fecha_hora_respuesta', 'numero_video',
@@ -914,98 +753,351 @@ class RunwayHandler(http.server.SimpleHTTPRequestHandler):
                 'tiempo_respuesta_segundos'
             ]
 
+            encoding = self.negotiate_encoding()
+            self.begin_chunked_response(200, 'text/csv; charset=utf-8', {
+                'Content-Disposition': 'attachment; filename="resultados_experimento.csv"',
+                'Content-Encoding': encoding
+            })
+            body = ChunkedBodyWriter(self, encoding)
+
+            # Rows are written while the joined query is read, EXPORT_CHUNK_SIZE at a time
+            output = io.StringIO()
+            output.write('\ufeff')  # UTF-8 BOM for Excel
             writer = csv.DictWriter(output, fieldnames=fieldnames)
             writer.writeheader()
 
-            # Process each participant
-            for json_file in json_files:
-                try:
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-
-                        participante_id = data.get('participante_id', json_file.stem)
-                        genero = data.get('genero', '')
-                        edad = data.get('edad', '')
-
-                        for respuesta in data.get('respuestas', []):
-                            writer.writerow({
-                                'participante_id': participante_id,
-                                'genero': genero,
-                                'edad': edad,
-                                'fecha_hora_respuesta': respuesta.get('fecha_hora', ''),
-                                'numero_video': respuesta.get('numero_video', ''),
-                                'tipo_contenido': respuesta.get('tipo_contenido', ''),
-                                'es_fake': respuesta.get('es_fake', ''),
-                                'es_evidente': respuesta.get('es_evidente', ''),
-                                'calidad': respuesta.get('calidad', ''),
-                                'respuesta_slider': respuesta.get('respuesta_slider', ''),
-                                'causa_fake': respuesta.get('causa_fake', ''),
-                                'tiempo_respuesta_segundos': respuesta.get('tiempo_respuesta_segundos', '')
-                            })
-
-                except Exception as e:
-                    print(f"Error processing {json_file}: {e}")
-                    continue
-
-            # Send CSV file
-            csv_content = output.getvalue()
-            csv_bytes = csv_content.encode('utf-8-sig')  # UTF-8 with BOM for Excel
-
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/csv; charset=utf-8')
-            self.send_header('Content-Disposition', f'attachment; filename="resultados_experimento.csv"')
-            self.send_header('Content-Length', str(len(csv_bytes)))
-            self.end_headers()
-            self.wfile.write(csv_bytes)
-
+            # closing(): if the client disconnects, the cursor is released right away
+            with closing(self.server.store.iter_response_rows(**filters)) as rows:
+                for row in rows:
+                    writer.writerow({
+                        'participante_id': row['participante_id'],
+                        'genero': row['genero'] or '',
+                        'edad': row['edad'] if row['edad'] is not None else '',
+                        'fecha_hora_respuesta': row['fecha_hora'] or '',
+                        'numero_video': row['numero_video'] if row['numero_video'] is not None else '',
+                        'tipo_contenido': row['tipo_contenido'] or '',
+                        'es_fake': row['es_fake'] if row['es_fake'] is not None else '',
+                        'es_evidente': row['es_evidente'] if row['es_evidente'] is not None else '',
+                        'calidad': row['calidad'] or '',
+                        'respuesta_slider': row['respuesta_slider'] if row['respuesta_slider'] is not None else '',
+                        'causa_fake': row['causa_fake'] or '',
+                        'tiempo_respuesta_segundos': row['tiempo_respuesta_segundos'] if row['tiempo_respuesta_segundos'] is not None else ''
+                    })
+                    if output.tell() >= EXPORT_CHUNK_SIZE:
+                        body.write(output.getvalue().encode('utf-8'))
+                        output.seek(0)
+                        output.truncate()
+
+            body.write(output.getvalue().encode('utf-8'))
+            body.close()
+
+        except (BrokenPipeError, ConnectionResetError):
+            print("==> Cliente desconectado durante la exportación CSV")
         except Exception as e:
             print(f"Error exporting CSV: {e}")
             import traceback
             traceback.print_exc()
-            self.send_error(500, f"Error exporting CSV: {str(e)}")
+            self.fail_export(f"Error exporting CSV: {str(e)}")
 
     def handle_export_json(self):
-        """Export all data as JSON"""
+        """
+        Export all data as JSON, streamed while the participants are read
+
+        ?format=ndjson emits one participant per line instead of a JSON
+        array. Responses carry an ETag derived from the store's data version,
+        so a client sending it back in If-None-Match gets 304 until
+        something changes.
+        """
         try:
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            ndjson = query.get('format', ['json'])[0] == 'ndjson'
+
             # Ensure data directory exists
             if not DATA_DIR.exists():
                 self.send_error(404, "No data available")
                 return
 
-            # Get all participant files
-            json_files = list(DATA_DIR.glob('P*.json'))
+            # Include answers still waiting for the write-behind flusher
+            self.server.sessions.flush()
 
-            if len(json_files) == 0:
-                self.send_error(404, "No data available")
+            # Version read before the query: the body is never older than its ETag
+            encoding = self.negotiate_encoding()
+            etag = f'"{self.server.store.version_tag()}-{"ndjson" if ndjson else "json"}-{encoding or "identity"}"'
+
+            if self.etag_matches(etag):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Vary', 'Accept-Encoding')
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
                 return
 
-            # Collect all data
-            all_data = []
-            for json_file in json_files:
-                try:
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        all_data.append(data)
-                except Exception as e:
-                    print(f"Error reading {json_file}: {e}")
-                    continue
-
-            # Send JSON file
-            json_content = json.dumps(all_data, indent=2, ensure_ascii=False)
-            json_bytes = json_content.encode('utf-8')
-
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json; charset=utf-8')
-            self.send_header('Content-Disposition', f'attachment; filename="resultados_experimento.json"')
-            self.send_header('Content-Length', str(len(json_bytes)))
-            self.end_headers()
-            self.wfile.write(json_bytes)
+            if self.server.store.summary()['total_participantes'] == 0:
+                self.send_error(404, "No data available")
+                return
 
+            if ndjson:
+                content_type = 'application/x-ndjson; charset=utf-8'
+                filename = 'resultados_experimento.ndjson'
+            else:
+                content_type = 'application/json; charset=utf-8'
+                filename = 'resultados_experimento.json'
+
+            self.begin_chunked_response(200, content_type, {
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'Content-Encoding': encoding,
+                'ETag': etag,
+                'Vary': 'Accept-Encoding',
+                'Cache-Control': 'no-cache'
+            })
+            body = ChunkedBodyWriter(self, encoding)
+
+            # Same layout as json.dumps(all_data, indent=2), one participant at a time
+            buffer = []
+            buffered = 0
+            first = True
+            if not ndjson:
+                buffer.append('[\n')
+
+            # closing(): if the client disconnects, the read transaction ends right away
+            with closing(self.server.store.iter_participants()) as participants:
+                for data in participants:
+                    if ndjson:
+                        item = json.dumps(data, ensure_ascii=False, separators=(',', ':')) + '\n'
+                    else:
+                        item = ('' if first else ',\n') + textwrap.indent(
+                            json.dumps(data, indent=2, ensure_ascii=False), '  '
+                        )
+                    first = False
+                    buffer.append(item)
+                    buffered += len(item)
+                    if buffered >= EXPORT_CHUNK_SIZE:
+                        body.write(''.join(buffer).encode('utf-8'))
+                        buffer = []
+                        buffered = 0
+
+            if not ndjson:
+                buffer.append('\n]')
+            body.write(''.join(buffer).encode('utf-8'))
+            body.close()
+
+        except (BrokenPipeError, ConnectionResetError):
+            print("==> Cliente desconectado durante la exportación JSON")
         except Exception as e:
             print(f"Error exporting JSON: {e}")
             import traceback
             traceback.print_exc()
-            self.send_error(500, f"Error exporting JSON: {str(e)}")
+            self.fail_export(f"Error exporting JSON: {str(e)}")
+
+    def discard_body(self, unread):
+        """
+        Drain (without buffering) the rest of a rejected upload
+
+        Closing the socket with unread data makes the client see a connection
+        reset instead of our error response, so up to MAX_DRAIN_BYTES are read
+        and thrown away before closing.
+        """
+        self.wfile.flush()
+        self.connection.settimeout(DRAIN_TIMEOUT)
+        to_drain = min(unread, MAX_DRAIN_BYTES)
+        try:
+            while to_drain > 0:
+                chunk = self.rfile.read1(min(64 * 1024, to_drain))
+                if not chunk:
+                    break
+                to_drain -= len(chunk)
+        except OSError:
+            pass
+
+    def handle_static_file(self, head_only=False):
+        """Serve a file with byte ranges, ETag/Last-Modified and Cache-Control"""
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and self.path.split('?', 1)[0].endswith('/'):
+            path = os.path.join(path, 'index.html')
+
+        # HTML/JS pages: already in memory and compressed
+        cached = self.server.hot_files.get(path)
+        if cached is not None:
+            self.send_cached_file(cached, head_only)
+            return
+
+        if urllib.parse.urlparse(self.path).path.endswith('/') or not os.path.isfile(path):
+            # Directory listings, redirects and 404s as before
+            return super().do_HEAD() if head_only else super().do_GET()
+
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(404, "File not found")
+            return
+
+        with f:
+            stat = os.fstat(f.fileno())
+            etag = file_etag(stat)
+            headers = {
+                'ETag': etag,
+                'Last-Modified': last_modified(stat),
+                'Cache-Control': cache_control(path),
+                'Accept-Ranges': 'bytes'
+            }
+
+            if not_modified(self.headers, etag, stat.st_mtime):
+                self.send_response(304)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                return
+
+            try:
+                byte_range = requested_range(self.headers, stat.st_size, etag, stat)
+            except RangeNotSatisfiable:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{stat.st_size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            if byte_range is None:
+                start, end = 0, stat.st_size - 1
+                self.send_response(200)
+            else:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{stat.st_size}')
+
+            count = end - start + 1
+            self.send_header('Content-Type', self.guess_type(path))
+            self.send_header('Content-Length', str(count))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+
+            if head_only or count <= 0:
+                return
+            try:
+                # Kernel copy (os.sendfile) where available; plain send() on Windows
+                self.wfile.flush()
+                self.connection.sendfile(f, start, count)
+            except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+                # The player seeked or closed the tab: nothing left to send
+                self.close_connection = True
+
+    def send_cached_file(self, cached, head_only=False):
+        """Serve an in-memory page in the best encoding the client accepts"""
+        encoding = cached.choose_encoding(self.accepted_encodings())
+        body = cached.variants[encoding]
+        etag = cached.etag(encoding)
+        headers = {
+            'ETag': etag,
+            'Last-Modified': cached.last_modified,
+            'Cache-Control': cache_control(cached.path),
+            'Vary': 'Accept-Encoding'
+        }
+
+        if not_modified(self.headers, etag, cached.mtime):
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', cached.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head_only:
+            self.wfile.write(body)
+
+    def begin_chunked_response(self, status_code, content_type, headers=None):
+        """Start an HTTP/1.1 chunked response (body sent with write_chunk)"""
+        self.protocol_version = 'HTTP/1.1'
+        self.chunked_started = True
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            if value is not None:
+                self.send_header(name, value)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+    def write_chunk(self, data):
+        if data:
+            self.wfile.write(b'%x\r\n' % len(data) + data + b'\r\n')
+            self.wfile.flush()
+
+    def end_chunked_response(self):
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+    def fail_export(self, message):
+        """Answer 500, or just drop the connection if a streamed body already started"""
+        if self.chunked_started:
+            # The client sees a truncated body (no final chunk)
+            self.close_connection = True
+        else:
+            self.send_error(500, message)
+
+    def etag_matches(self, etag):
+        """True if If-None-Match names this ETag (or is '*')"""
+        header = self.headers.get('If-None-Match')
+        if not header:
+            return False
+        candidates = [tag.strip() for tag in header.split(',')]
+        return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+    def accepted_encodings(self):
+        """Content codings named in Accept-Encoding (without those with q=0)"""
+        accepted = set()
+        for item in (self.headers.get('Accept-Encoding') or '').split(','):
+            name, _, params = item.strip().partition(';')
+            if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                continue
+            accepted.add(name.strip().lower())
+        return accepted
+
+    def negotiate_encoding(self):
+        """Content-Encoding to use for an export ('zstd', 'gzip' or None) from Accept-Encoding"""
+        accepted = self.accepted_encodings()
+        if 'zstd' in accepted and zstandard is not None:
+            return 'zstd'
+        return 'gzip' if 'gzip' in accepted else None
+
+    def export_filters(self):
+        """
+        Parse export filters from the query string
+
+        Raises:
+            ValueError: if a filter value is invalid
+        """
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        filters = {}
+
+        for name in ('desde', 'hasta'):
+            if name in query:
+                value = query[name][0]
+                if not re.fullmatch(r'\d{4}-\d{2}-\d{2}([T ][\d:.]+)?', value):
+                    raise ValueError(f'Invalid date for {name}: {value!r} (expected YYYY-MM-DD)')
+                filters[name] = value
+
+        if 'completado' in query:
+            value = query['completado'][0].lower()
+            if value in ('1', 'true', 'si', 'sí', 'yes'):
+                filters['completado'] = True
+            elif value in ('0', 'false', 'no'):
+                filters['completado'] = False
+            else:
+                raise ValueError(f'Invalid value for completado: {value!r}')
+
+        if 'tipo_contenido' in query:
+            filters['tipo_contenido'] = query['tipo_contenido'][0]
+
+        return filters
 
     def send_json_response(self, data, status_code=200):
         self.send_response(status_code)
@@ -1030,7 +1122,7 @@ if __name__ == '__main__':
 
     for attempt in range(max_attempts):
         try:
-            httpd = socketserver.TCPServer(("", port), RunwayHandler)
+            httpd = ThreadPoolHTTPServer(("", port), RunwayHandler, MAX_WORKERS)
             break
         except OSError as e:
             if e.errno == 10048:  # Port already in use
@@ -1045,8 +1137,24 @@ if __name__ == '__main__':
             else:
                 raise
 
+    httpd.job_manager = JobManager()
+    httpd.store = ExperimentStore(DATA_DIR)
+    httpd.stats = ExperimentStats(DATA_DIR)
+    httpd.stats.load_or_rebuild(httpd.store)
+    httpd.sessions = SessionCache(httpd.store, on_written=httpd.stats.responses_saved)
+    httpd.catalog = VideoCatalog()
+    httpd.hot_files = HotFileCache('.')
+    httpd.assigner = VideoAssigner(
+        httpd.catalog,
+        httpd.store.video_exposures(),
+        httpd.store.summary()['total_participantes'],
+        seed_from_env()
+    )
+
     print(f"==> Servidor iniciado en http://localhost:{port}")
     print(f"==> Directorio: {os.getcwd()}")
+    print(f"==> Peticiones en paralelo: {httpd.max_workers} (variable SERVER_WORKERS)")
+    print(f"==> Trabajos de generación en paralelo: {httpd.job_manager.max_workers} (variable JOB_WORKERS)")
     print(f"\n==> Abre tu navegador en: http://localhost:{port}/generador-local.html\n")
 
     try:
@@ -1054,4 +1162,10 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         print("\n\n==> Servidor detenido")
     finally:
+        httpd.job_manager.shutdown()
+        # Pending answers first, so the stats checkpoint matches the database
+        httpd.sessions.shutdown()
+        httpd.stats.checkpoint()
+        analysis_cache.flush()
+        httpd.store.close()
         httpd.server_close()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Medidas de detección de señales (SDT) con intervalos de confianza bootstrap
+
+Para cada grupo (global, tipo de contenido, calidad, género, franja de edad)
+se calcula, tratando los videos de IA como "señal" y los reales como "ruido":
+
+  - d' = z(aciertos) - z(falsas alarmas), con el umbral del slider
+    (>= DETECTION_THRESHOLD es "parece falso") y la corrección log-lineal
+    (Hautus, 1995) para tasas de 0 o 1
+  - criterio c = -(z(aciertos) + z(falsas alarmas)) / 2 (positivo = tendencia
+    a decir "real")
+  - AUC de la curva ROC recorriendo todos los umbrales del slider: la
+    probabilidad de que un video de IA reciba más puntuación que uno real
+
+Los evidentes no cuentan como señal (son controles); se informan aparte.
+
+Los intervalos son percentiles de un bootstrap por participante (las
+respuestas de una persona no son independientes). Todo se hace con
+histogramas del slider por participante: un remuestreo es un vector de
+pesos por participante, así que cada lote de remuestreos es un producto de
+matrices (pesos x histogramas). Los lotes se reparten entre hilos (NumPy
+libera el GIL) y cada lote tiene su propia semilla derivada de la semilla
+fija, de modo que el resultado no depende del número de hilos.
+"""
+
+import math
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from experiment_stats import DETECTION_THRESHOLD
+from result_columns import EVIDENTE, FAKE, REAL
+
+RESAMPLES = int(os.environ.get('BOOTSTRAP_RESAMPLES', '2000'))
+SEED = int(os.environ.get('BOOTSTRAP_SEED', '20240101'))
+CONFIDENCE = 0.95
+# Remuestreos por lote (fijo: así cada lote tiene siempre la misma semilla)
+CHUNK_SIZE = 250
+
+# Franjas de edad: (etiqueta, mínima incluida, máxima excluida)
+EDAD_FRANJAS = (('18-24', 18, 25), ('25-34', 25, 35), ('35-44', 35, 45),
+                ('45-54', 45, 55), ('55+', 55, math.inf))
+
+# Inversa de la normal estándar: algoritmo AS241 de Wichura (1988), error
+# relativo ~1e-16. Coeficientes en orden de potencias crecientes.
+_CENTRAL = (
+    (3.387132872796366608, 133.14166789178437745, 1971.5909503065514427, 13731.693765509461125,
+     45921.953931549871457, 67265.770927008700853, 33430.575583588128105, 2509.0809287301226727),
+    (1.0, 42.313330701600911252, 687.1870074920579083, 5394.1960214247511077,
+     21213.794301586595867, 39307.89580009271061, 28729.085735721942674, 5226.495278852545925)
+)
+_INTERMEDIATE = (
+    (1.42343711074968357734, 4.6303378461565452959, 5.7694972214606914055, 3.64784832476320460504,
+     1.27045825245236838258, 0.24178072517745061177, 0.0227238449892691845833, 7.7454501427834140764e-4),
+    (1.0, 2.05319162663775882187, 1.6763848301838038494, 0.68976733498510000455,
+     0.14810397642748007459, 0.0151986665636164571966, 5.475938084995344946e-4, 1.05075007164441684324e-9)
+)
+_FAR = (
+    (6.6579046435011037772, 5.4637849111641143699, 1.7848265399172913358, 0.29656057182850489123,
+     0.026532189526576123093, 0.0012426609473880784386, 2.71155556874348757815e-5, 2.01033439929228813265e-7),
+    (1.0, 0.59983220655588793769, 0.13692988092273580531, 0.0148753612908506148525,
+     7.868691311456132591e-4, 1.8463183175100546818e-5, 1.4215117583164458887e-7, 2.04426310338993978564e-15)
+)
+
+
+def _polyval(x, coefficients):
+    """Polinomio por Horner, en el sitio (más rápido que numpy.polynomial)"""
+    result = np.full_like(x, coefficients[-1])
+    for coefficient in coefficients[-2::-1]:
+        result *= x
+        result += coefficient
+    return result
+
+
+def _z(p):
+    """Cuantil de la normal estándar de cada elemento de p (vectorizado)"""
+    p = np.asarray(p, dtype=float)
+    q = p - 0.5
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = 0.180625 - q * q
+        central = q * _polyval(r, _CENTRAL[0]) / _polyval(r, _CENTRAL[1])
+
+        # Colas: r = sqrt(-log(min(p, 1 - p)))
+        r = np.sqrt(-np.log(np.minimum(p, 1 - p)))
+        tail = np.where(r <= 5,
+                        _polyval(r - 1.6, _INTERMEDIATE[0]) / _polyval(r - 1.6, _INTERMEDIATE[1]),
+                        _polyval(r - 5, _FAR[0]) / _polyval(r - 5, _FAR[1]))
+        tail = np.where(q < 0, -tail, tail)
+
+    z = np.where(np.abs(q) <= 0.425, central, tail)
+    z = np.where(p == 0, -np.inf, z)
+    return np.where(p == 1, np.inf, z)
+
+
+def sdt_measures(signal, noise, threshold_bin):
+    """
+    d', criterio y AUC a partir de histogramas del slider
+
+    Args:
+        signal, noise: arrays (..., K) con el número de respuestas por valor
+            del slider (ordenados de menor a mayor) de videos de IA y reales
+        threshold_bin: primer índice de K que cuenta como "parece falso"
+
+    Returns:
+        (d', criterio, auc) con la forma de los ejes iniciales (NaN si un
+        grupo no tiene respuestas de alguna clase)
+    """
+    n_signal = signal.sum(axis=-1)
+    n_noise = noise.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hits = (signal[..., threshold_bin:].sum(axis=-1) + 0.5) / (n_signal + 1)
+        false_alarms = (noise[..., threshold_bin:].sum(axis=-1) + 0.5) / (n_noise + 1)
+        z_hits = _z(hits)
+        z_false_alarms = _z(false_alarms)
+        d_prime = z_hits - z_false_alarms
+        criterion = -(z_hits + z_false_alarms) / 2
+
+        # AUC = P(señal > ruido) + P(señal = ruido) / 2
+        noise_below = np.cumsum(noise, axis=-1) - noise
+        auc = (signal * (noise_below + noise / 2)).sum(axis=-1) / (n_signal * n_noise)
+
+    empty = (n_signal == 0) | (n_noise == 0)
+    return (np.where(empty, np.nan, d_prime), np.where(empty, np.nan, criterion),
+            np.where(empty, np.nan, auc))
+
+
+def analyze(columns, resamples=RESAMPLES, seed=SEED, confidence=CONFIDENCE, workers=None):
+    """
+    Medidas SDT por grupo con intervalos bootstrap
+
+    Args:
+        columns: ResultColumns (result_columns.py) con todas las respuestas
+        resamples: número de remuestreos bootstrap (0 = sin intervalos)
+        seed: semilla (mismo resultado en cada ejecución)
+        confidence: nivel de los intervalos (0.95 = percentiles 2.5 y 97.5)
+        workers: hilos para los remuestreos (None = uno por núcleo)
+
+    Returns:
+        lista de dicts: grupo, nivel, n_senal, n_ruido, participantes y
+        d_prima, criterio, auc (cada uno como (estimación, inferior, superior))
+    """
+    slider = columns.slider
+    valid = ~np.isnan(slider) & (columns.participant >= 0)
+    values, bins = np.unique(slider[valid], return_inverse=True)
+    threshold_bin = int(np.searchsorted(values, DETECTION_THRESHOLD))
+    n_participants = columns.total_participantes
+
+    participant = columns.participant[valid]
+    categoria = columns.categoria[valid]
+    tipo = columns.tipo_contenido[valid]
+    calidad = columns.calidad[valid]
+
+    groups = _groups(columns, participant, categoria, tipo, calidad)
+    if not groups or not len(values):
+        return []
+
+    # Histograma por participante: (participante, grupo, señal/ruido, valor del slider)
+    n_bins = len(values)
+    histograms = np.zeros((n_participants, len(groups), 2, n_bins))
+    for g, (_, _, signal_mask, noise_mask) in enumerate(groups):
+        for side, mask in enumerate((signal_mask, noise_mask)):
+            np.add.at(histograms, (participant[mask], g, side, bins[mask]), 1)
+    flat = histograms.reshape(n_participants, -1)
+
+    totals = histograms.sum(axis=0)
+    estimates = sdt_measures(totals[:, 0], totals[:, 1], threshold_bin)
+
+    intervals = None
+    if resamples > 0:
+        samples = _bootstrap(flat, resamples, seed, workers)
+        samples = samples.reshape(resamples, len(groups), 2, n_bins)
+        boot = sdt_measures(samples[:, :, 0], samples[:, :, 1], threshold_bin)
+        alpha = (1 - confidence) / 2 * 100
+        with warnings.catch_warnings():
+            # Grupos sin señal o sin ruido: todo NaN, su intervalo queda NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            intervals = [np.nanpercentile(measure, [alpha, 100 - alpha], axis=0) for measure in boot]
+
+    present = histograms.sum(axis=(2, 3)) > 0
+    results = []
+    for g, (group, level, _, _) in enumerate(groups):
+        row = {
+            'grupo': group,
+            'nivel': level,
+            'n_senal': int(totals[g, 0].sum()),
+            'n_ruido': int(totals[g, 1].sum()),
+            'participantes': int(present[:, g].sum())
+        }
+        for name, estimate, interval in zip(('d_prima', 'criterio', 'auc'), estimates,
+                                            intervals or (None, None, None)):
+            low, high = (interval[0, g], interval[1, g]) if interval is not None else (np.nan, np.nan)
+            row[name] = (float(estimate[g]), float(low), float(high))
+        results.append(row)
+    return results
+
+
+def _groups(columns, participant, categoria, tipo, calidad):
+    """(grupo, nivel, máscara de señal, máscara de ruido) de cada fila del informe"""
+    signal = categoria == FAKE
+    noise = categoria == REAL
+    groups = [('global', 'todos', signal, noise),
+              ('control', 'evidentes', categoria == EVIDENTE, noise)]
+
+    for code, label in enumerate(columns.labels['tipo_contenido'].labels):
+        in_tipo = tipo == code
+        groups.append(('tipo_contenido', label or '(sin dato)', signal & in_tipo, noise & in_tipo))
+
+    # Los reales no tienen calidad: cada calidad de IA frente a todos los reales
+    for code, label in enumerate(columns.labels['calidad'].labels):
+        in_calidad = signal & (calidad == code)
+        if in_calidad.any():
+            groups.append(('calidad', label or '(sin dato)', in_calidad, noise))
+
+    genero = columns.genero[participant]
+    for code, label in enumerate(columns.labels['genero'].labels):
+        in_genero = genero == code
+        groups.append(('genero', label or '(sin dato)', signal & in_genero, noise & in_genero))
+
+    edad = columns.edad[participant]
+    for label, low, high in EDAD_FRANJAS:
+        in_franja = (edad >= low) & (edad < high)
+        if in_franja.any():
+            groups.append(('edad', label, signal & in_franja, noise & in_franja))
+    return groups
+
+
+def _bootstrap(flat, resamples, seed, workers):
+    """
+    Histogramas remuestreados por participante: array (resamples, columnas)
+
+    Cada remuestreo elige participantes con reemplazo; su histograma es la
+    suma ponderada (pesos multinomiales) de los de cada participante.
+    """
+    n_participants = flat.shape[0]
+    chunks = [(start, min(CHUNK_SIZE, resamples - start)) for start in range(0, resamples, CHUNK_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    output = np.empty((resamples, flat.shape[1]))
+    uniform = np.full(n_participants, 1 / n_participants)
+
+    def run(chunk, chunk_seed):
+        start, size = chunk
+        rng = np.random.default_rng(chunk_seed)
+        weights = rng.multinomial(n_participants, uniform, size=size).astype(float)
+        np.matmul(weights, flat, out=output[start:start + size])
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for future in [pool.submit(run, chunk, chunk_seed) for chunk, chunk_seed in zip(chunks, seeds)]:
+            future.result()
+    return output
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Utilidades para servir archivos estáticos (videos de VIDEOS/, HTML, ...)
+
+SimpleHTTPRequestHandler no entiende Range, así que el navegador no puede
+saltar a mitad de un video ni empezar a reproducirlo antes de descargarlo
+entero. Aquí se interpretan Range / If-Range (un solo rango; los rangos
+múltiples se rechazan con 416), se calculan ETag y Last-Modified para
+contestar 304 y se decide el Cache-Control de cada archivo.
+
+Las páginas (index.html, investigador.html...) se guardan además en memoria
+(HotFileCache) ya comprimidas con gzip y, si está instalado, brotli: servirlas
+es escribir unos bytes ya preparados, sin abrir ni comprimir nada.
+"""
+
+import gzip
+import mimetypes
+import os
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin él las páginas se sirven con gzip
+    brotli = None
+
+# Los videos generados no cambian una vez descargados: caché larga. No se
+# marcan 'immutable' porque regenerar una carpeta reutiliza los nombres
+# (video_high.mp4, ...); pasado max-age el navegador revalida con el ETag.
+VIDEO_MAX_AGE = int(os.environ.get('VIDEO_CACHE_MAX_AGE', str(7 * 24 * 3600)))
+VIDEO_EXTENSIONS = ('.mp4', '.webm', '.mov')
+
+# Archivos que se guardan en memoria (precomprimidos) y cada cuánto se
+# comprueba su mtime
+HOT_EXTENSIONS = ('.html', '.js', '.css')
+HOT_FILE_MAX_BYTES = 1024 * 1024
+HOT_CHECK_INTERVAL = float(os.environ.get('STATIC_CHECK_INTERVAL', '2'))
+
+
+class RangeNotSatisfiable(ValueError):
+    """Range inválido, fuera del archivo o con varios rangos (respuesta 416)"""
+
+
+def file_etag(stat):
+    """ETag fuerte a partir del mtime y el tamaño"""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def last_modified(stat):
+    return formatdate(stat.st_mtime, usegmt=True)
+
+
+def cache_control(path):
+    """Cache-Control según el tipo de archivo"""
+    if path.lower().endswith(VIDEO_EXTENSIONS):
+        return f'public, max-age={VIDEO_MAX_AGE}'
+    # HTML, JS...: siempre revalidar (un 304 cuesta casi nada)
+    return 'no-cache'
+
+
+def not_modified(headers, etag, mtime):
+    """True si la petición condicional permite contestar 304"""
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match:
+        # If-None-Match tiene prioridad sobre If-Modified-Since
+        candidates = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+    if_modified_since = headers.get('If-Modified-Since')
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+def requested_range(headers, size, etag, stat):
+    """
+    Rango pedido como (inicio, fin) inclusivo, o None para el archivo entero
+
+    Raises:
+        RangeNotSatisfiable: si el rango no se puede servir
+    """
+    header = headers.get('Range')
+    if not header:
+        return None
+
+    # If-Range: solo se respeta el rango si el archivo no ha cambiado
+    if_range = headers.get('If-Range')
+    if if_range and if_range.strip() not in (etag, last_modified(stat)):
+        return None
+
+    return parse_byte_range(header, size)
+
+
+def parse_byte_range(header, size):
+    """
+    Interpreta 'bytes=inicio-fin', 'bytes=inicio-' o 'bytes=-sufijo'
+
+    Unidades desconocidas se ignoran (None = archivo entero).
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+    if ',' in spec:
+        raise RangeNotSatisfiable('Multiple ranges are not supported')
+
+    first, sep, last = spec.strip().partition('-')
+    if not sep:
+        raise RangeNotSatisfiable(f'Invalid range: {header!r}')
+
+    try:
+        if first == '':
+            # Últimos N bytes
+            suffix = int(last)
+            if suffix <= 0 or size == 0:
+                raise RangeNotSatisfiable(f'Invalid range: {header!r}')
+            return max(0, size - suffix), size - 1
+
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        raise RangeNotSatisfiable(f'Invalid range: {header!r}') from None
+
+    if start < 0 or start > end or start >= size:
+        raise RangeNotSatisfiable(f'Range not satisfiable: {header!r}')
+    return start, min(end, size - 1)
+
+
+class CachedFile:
+    """Contenido de un archivo en memoria con sus variantes comprimidas"""
+
+    def __init__(self, path, stat, data, content_type):
+        self.path = path
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.last_modified = last_modified(stat)
+        self.content_type = content_type
+        self.base_etag = file_etag(stat)[1:-1]
+        self.checked = time.monotonic()
+
+        self.variants = {None: data}
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            self.variants['gzip'] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=11)
+            if len(compressed) < len(data):
+                self.variants['br'] = compressed
+
+    def choose_encoding(self, accepted):
+        """Mejor variante aceptada por el cliente ('br', 'gzip' o None)"""
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.variants:
+                return encoding
+        return None
+
+    def etag(self, encoding):
+        # Cada variante es una representación distinta: ETag distinto
+        return '"%s-%s"' % (self.base_etag, encoding or 'identity')
+
+
+class HotFileCache:
+    """Páginas y scripts en memoria, invalidados cuando cambia su mtime"""
+
+    def __init__(self, root='.', check_interval=HOT_CHECK_INTERVAL):
+        """
+        Args:
+            root: carpeta servida (se precargan sus archivos HOT_EXTENSIONS)
+            check_interval: segundos entre comprobaciones del mtime de un archivo
+        """
+        self.root = os.path.abspath(root)
+        self.check_interval = check_interval
+        self._files = {}
+        self._lock = threading.Lock()
+
+        for entry in os.scandir(self.root):
+            if entry.is_file() and entry.name.lower().endswith(HOT_EXTENSIONS):
+                self.get(entry.path)
+        print(f"==> {len(self._files)} páginas en memoria "
+              f"({'gzip + brotli' if brotli is not None else 'gzip'})")
+
+    def get(self, path):
+        """CachedFile de path, o None si no se guarda en memoria"""
+        if not path.lower().endswith(HOT_EXTENSIONS):
+            return None
+        key = os.path.normcase(os.path.abspath(path))
+        cached = self._files.get(key)
+        if cached is not None and time.monotonic() - cached.checked < self.check_interval:
+            return cached
+
+        try:
+            stat = os.stat(key)
+        except OSError:
+            with self._lock:
+                self._files.pop(key, None)
+            return None
+
+        if cached is not None and (cached.mtime_ns, cached.size) == (stat.st_mtime_ns, stat.st_size):
+            cached.checked = time.monotonic()
+            return cached
+        if stat.st_size > HOT_FILE_MAX_BYTES:
+            with self._lock:
+                self._files.pop(key, None)
+            return None
+        return self._load(key)
+
+    def _load(self, key):
+        with self._lock:
+            try:
+                with open(key, 'rb') as f:
+                    stat = os.fstat(f.fileno())
+                    data = f.read()
+            except OSError:
+                self._files.pop(key, None)
+                return None
+            content_type = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+            cached = CachedFile(key, stat, data, content_type)
+            self._files[key] = cached
+            return cached
@@ -0,0 +1,104 @@
+"""Base de datos del experimento (experiment_store.py)"""
+
+import json
+import sqlite3
+
+import pytest
+
+from experiment_store import ExperimentStore, InvalidResponse, StoreNotReady, coerce_response
+
+VIDEO = {'path': 'VIDEOS/e1/video_high_quality.mp4', 'es_fake': True, 'calidad': 'alta',
+         'tipo_contenido': 'entretenimiento', 'es_evidente': False, 'folder': 'e1'}
+
+
+def make_response(**fields):
+    response = {'fecha_hora': '2024-05-01T10:00:00', 'numero_video': 1, 'video_path': VIDEO['path'],
+                'tipo_contenido': VIDEO['tipo_contenido'], 'es_fake': True, 'es_evidente': False,
+                'calidad': VIDEO['calidad'], 'respuesta_slider': 7, 'causa_fake': '',
+                'tiempo_respuesta_segundos': 3.5}
+    response.update(fields)
+    return response
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ExperimentStore(tmp_path)
+    store.create({'id': 'P1', 'genero': 'mujer', 'edad': 30, 'fecha_inicio': '2024-05-01T09:59:00',
+                  'videos': [VIDEO], 'respuestas': [], 'completado': False})
+    yield store
+    store.close()
+
+
+def test_coerce_response_converts_to_column_types():
+    response = coerce_response(make_response(numero_video='3', respuesta_slider='4.5', es_fake=1,
+                                             tiempo_respuesta_segundos=2, causa_fake=None, extra='x'))
+    assert response['numero_video'] == 3
+    assert response['respuesta_slider'] == 4.5
+    assert response['es_fake'] is True
+    assert response['tiempo_respuesta_segundos'] == 2.0
+    assert response['causa_fake'] is None
+    assert 'extra' not in response
+
+
+@pytest.mark.parametrize('field, value', [
+    ('causa_fake', ['color']),
+    ('respuesta_slider', {'valor': 3}),
+    ('respuesta_slider', 'nan'),
+    ('respuesta_slider', True),
+    ('numero_video', 2.5),
+    ('numero_video', 'dos'),
+    ('es_fake', 'si'),
+])
+def test_coerce_response_rejects_other_types(field, value):
+    with pytest.raises(InvalidResponse):
+        coerce_response(make_response(**{field: value}))
+
+
+def test_responses_never_add_videos(store):
+    videos = store.query('SELECT COUNT(*) FROM videos')[0][0]
+    store.append_responses([('P1', make_response()),
+                            ('P1', make_response(video_path='VIDEOS/inventado.mp4', numero_video=2))])
+
+    assert store.query('SELECT COUNT(*) FROM videos')[0][0] == videos
+    rows = store.query('SELECT numero_video, video_path, es_fake FROM responses ORDER BY id')
+    assert [tuple(row) for row in rows] == [(1, VIDEO['path'], 1), (2, None, None)]
+
+
+def test_json_import_still_adds_missing_videos(tmp_path):
+    participant = {'id': 'P2', 'genero': 'hombre', 'edad': 40, 'videos': [],
+                   'respuestas': [make_response(video_path='VIDEOS/antiguo.mp4')], 'completado': True}
+    (tmp_path / 'P2.json').write_text(json.dumps(participant), encoding='utf-8')
+
+    store = ExperimentStore(tmp_path)
+    try:
+        rows = store.query('SELECT video_path, es_fake FROM responses')
+        assert [tuple(row) for row in rows] == [('VIDEOS/antiguo.mp4', 1)]
+    finally:
+        store.close()
+
+
+def test_abandoned_export_leaves_no_open_transaction(store):
+    store.create({'id': 'P2', 'genero': 'hombre', 'edad': 40, 'videos': [], 'respuestas': [], 'completado': False})
+    participants = store.iter_participants()
+    assert next(participants)['id'] == 'P1'
+
+    # El generador sigue a medias (cliente desconectado): el hilo puede escribir igual
+    assert not store._conn().in_transaction
+    store.append_responses([('P1', make_response())])
+    assert store.load('P1')['respuestas'][0]['respuesta_slider'] == 7
+    participants.close()
+
+
+def test_readonly_store_reads_without_writing(store, tmp_path):
+    with pytest.raises(StoreNotReady):
+        ExperimentStore(tmp_path / 'vacio', readonly=True)
+    assert not (tmp_path / 'vacio').exists()
+
+    readonly = ExperimentStore(tmp_path, readonly=True)
+    try:
+        assert readonly.participant_ids() == ['P1']
+        assert [p['id'] for p in readonly.iter_participants()] == ['P1']
+        with pytest.raises(sqlite3.OperationalError):
+            readonly.create({'id': 'P2', 'videos': [], 'respuestas': []})
+    finally:
+        readonly.close()
@@ -0,0 +1,114 @@
+"""Parser incremental de multipart/form-data (multipart_upload.py)"""
+
+import io
+
+import pytest
+
+from multipart_upload import MultipartError, UploadTooLarge, UploadedFile, close_parts, parse_multipart
+
+BOUNDARY = 'XyZ123boundary'
+FILE_DATA = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 8 + b'\r\n--XyZ123 casi frontera\r\n'
+
+
+class ChunkedReader:
+    """rfile que devuelve como mucho chunk_size bytes por lectura (como un socket)"""
+
+    def __init__(self, data, chunk_size):
+        self.stream = io.BytesIO(data)
+        self.chunk_size = chunk_size
+        self.reads = []
+
+    def read(self, size):
+        chunk = self.stream.read(min(size, self.chunk_size))
+        self.reads.append(chunk)
+        return chunk
+
+
+def build_body(final_boundary=True):
+    body = (
+        b'preambulo ignorado\r\n'
+        b'--' + BOUNDARY.encode() + b'\r\n'
+        b'Content-Disposition: form-data; name="videoType"\r\n\r\n'
+        b'e\r\n'
+        b'--' + BOUNDARY.encode() + b'\r\n'
+        b'Content-Disposition: form-data; name="image"; filename="foto.png"\r\n'
+        b'Content-Type: image/png\r\n\r\n'
+        + FILE_DATA + b'\r\n'
+        b'--' + BOUNDARY.encode()
+    )
+    if final_boundary:
+        body += b'--\r\n'
+    return body
+
+
+def parse(body, chunk_size, **kwargs):
+    kwargs.setdefault('max_file_size', 1024 * 1024)
+    return parse_multipart(ChunkedReader(body, chunk_size), len(body), BOUNDARY, **kwargs)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 13, 64, 1000, 65536])
+def test_same_result_for_any_read_size(chunk_size):
+    parts = parse(build_body(), chunk_size)
+    try:
+        assert parts['videoType'] == 'e'
+        upload = parts['image']
+        assert isinstance(upload, UploadedFile)
+        assert upload.filename == 'foto.png'
+        assert upload.content_type == 'image/png'
+        assert upload.size == len(FILE_DATA)
+        assert upload.read() == FILE_DATA
+    finally:
+        close_parts(parts)
+
+
+def test_boundary_split_across_reads():
+    body = build_body()
+    delimiter = b'\r\n--' + BOUNDARY.encode()
+    # Lecturas que cortan cada frontera por la mitad
+    split_at = body.index(delimiter, body.index(FILE_DATA)) + len(delimiter) // 2
+    reader = ChunkedReader(body, split_at)
+
+    parts = parse_multipart(reader, len(body), BOUNDARY, max_file_size=1024 * 1024)
+    try:
+        assert reader.reads[0].endswith(delimiter[:len(delimiter) // 2])
+        assert parts['image'].read() == FILE_DATA
+    finally:
+        close_parts(parts)
+
+
+def test_crlf_inside_file_data_is_kept():
+    parts = parse(build_body(), 5)
+    try:
+        data = parts['image'].read()
+        assert b'\r\n--XyZ123 casi frontera\r\n' in data
+        assert data == FILE_DATA
+    finally:
+        close_parts(parts)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 17, 65536])
+@pytest.mark.parametrize('cut', [0, len(BOUNDARY) + 4])
+def test_missing_final_boundary(chunk_size, cut):
+    # Sin el "--" de cierre, o sin la última frontera entera
+    body = build_body(final_boundary=False)
+    body = body[:len(body) - cut]
+    with pytest.raises(MultipartError):
+        parse(body, chunk_size)
+
+
+def test_file_over_limit_stops_reading():
+    body = build_body()
+    reader = ChunkedReader(body, 100)
+    with pytest.raises(UploadTooLarge) as info:
+        parse_multipart(reader, len(body), BOUNDARY, max_file_size=512)
+    assert info.value.field_name == 'image'
+    assert info.value.unread > 0
+    assert sum(map(len, reader.reads)) < len(body)
+
+
+def test_body_over_limit_is_rejected_before_reading():
+    body = build_body()
+    reader = ChunkedReader(body, 100)
+    with pytest.raises(UploadTooLarge):
+        parse_multipart(reader, len(body), BOUNDARY, max_file_size=1024 * 1024, max_body_size=100)
+    assert reader.reads == []
@@ -0,0 +1,109 @@
+"""Sesiones con escritura diferida de respuestas (participant_sessions.py)"""
+
+import sqlite3
+
+import pytest
+
+from experiment_stats import ExperimentStats, _watermark
+from experiment_store import ExperimentStore
+from participant_sessions import SessionCache
+
+VIDEO = {'path': 'VIDEOS/reales/e1.mp4', 'es_fake': False, 'calidad': 'real',
+         'tipo_contenido': 'entretenimiento', 'es_evidente': False, 'folder': 'reales'}
+
+
+def make_response(numero_video, **fields):
+    response = {'fecha_hora': '2024-05-01T10:00:00', 'numero_video': numero_video,
+                'video_path': VIDEO['path'], 'tipo_contenido': VIDEO['tipo_contenido'],
+                'es_fake': False, 'es_evidente': False, 'calidad': 'real', 'respuesta_slider': 4,
+                'causa_fake': '', 'tiempo_respuesta_segundos': 2}
+    response.update(fields)
+    return response
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ExperimentStore(tmp_path)
+    for participante_id in ('P1', 'P2'):
+        store.create({'id': participante_id, 'genero': 'mujer', 'edad': 25, 'videos': [VIDEO],
+                      'respuestas': [], 'completado': False})
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def sessions(store):
+    # flush_delay largo: en los tests solo se escribe al llamar a flush()
+    sessions = SessionCache(store, flush_delay=60)
+    yield sessions
+    sessions.shutdown()
+
+
+def saved(store):
+    return [tuple(row) for row in store.query(
+        'SELECT participant_id, numero_video FROM responses ORDER BY participant_id, numero_video')]
+
+
+def test_bad_row_does_not_block_the_batch(store, sessions):
+    assert sessions.append_response('P1', make_response(1))
+    # Una lista no se puede enlazar como parámetro de SQLite
+    assert sessions.append_response('P2', make_response(1, causa_fake=['color', 'bordes']))
+    assert sessions.append_response('P2', make_response(2))
+    assert sessions.append_response('P1', make_response(2))
+
+    assert sessions.flush() == 3
+    assert saved(store) == [('P1', 1), ('P1', 2), ('P2', 2)]
+    assert sessions.pending_count() == 0
+    assert [(participante_id, response['numero_video']) for participante_id, response, _ in sessions.rejected] \
+        == [('P2', 1)]
+
+    # Nada queda atascado: lo siguiente se escribe y se puede finalizar
+    assert sessions.append_response('P2', make_response(3))
+    participant, first_time = sessions.finish('P2', '2024-05-01T10:30:00')
+    assert first_time
+    assert [r['numero_video'] for r in participant['respuestas']] == [2, 3]
+
+
+def test_transient_error_retries_whole_batch(store, sessions, monkeypatch):
+    append_responses = store.append_responses
+    failures = [sqlite3.OperationalError('database is locked')]
+
+    def flaky(rows):
+        if failures:
+            raise failures.pop()
+        return append_responses(rows)
+
+    monkeypatch.setattr(store, 'append_responses', flaky)
+    sessions.append_response('P1', make_response(1))
+    sessions.append_response('P2', make_response(1))
+
+    with pytest.raises(sqlite3.OperationalError):
+        sessions.flush()
+    assert sessions.pending_count() == 2
+    assert not sessions.rejected
+
+    assert sessions.flush() == 2
+    assert saved(store) == [('P1', 1), ('P2', 1)]
+
+
+def test_stats_count_only_written_responses(store, tmp_path):
+    stats = ExperimentStats(tmp_path)
+    stats.load_or_rebuild(store)
+    sessions = SessionCache(store, flush_delay=60, on_written=stats.responses_saved)
+    try:
+        sessions.append_response('P1', make_response(1))
+        sessions.append_response('P2', make_response(1, causa_fake=['color']))
+        sessions.append_response('P2', make_response(2))
+        # Aún en cola: no cuentan
+        assert stats.snapshot()['total_respuestas'] == 0
+        assert sessions.flush() == 2
+    finally:
+        sessions.shutdown()
+
+    assert stats.snapshot()['total_respuestas'] == 2
+    # La respuesta apartada en rejected no descuadra el checkpoint
+    assert stats._watermark() == _watermark(store)
+
+
+def test_unknown_participant_is_refused(sessions):
+    assert not sessions.append_response('P9', make_response(1))
@@ -0,0 +1,74 @@
+"""Guardado de respuestas a través del servidor HTTP (server.py)"""
+
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from experiment_stats import ExperimentStats
+from experiment_store import ExperimentStore
+from participant_sessions import SessionCache
+from server import RunwayHandler, ThreadPoolHTTPServer
+from video_catalog import VideoCatalog
+
+VIDEO_PATH = 'VIDEOS/reales/e1.mp4'
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # El catálogo guarda rutas relativas a la carpeta del servidor (VIDEOS/...)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'VIDEOS' / 'reales').mkdir(parents=True)
+    (tmp_path / 'VIDEOS' / 'reales' / 'e1.mp4').write_bytes(b'')
+
+    httpd = ThreadPoolHTTPServer(('127.0.0.1', 0), RunwayHandler, 4)
+    httpd.store = ExperimentStore(tmp_path / 'data')
+    httpd.stats = ExperimentStats(tmp_path / 'data')
+    httpd.sessions = SessionCache(httpd.store, flush_delay=60)
+    httpd.catalog = VideoCatalog()
+    httpd.store.create({'id': 'P1', 'genero': 'mujer', 'edad': 25,
+                        'videos': [httpd.catalog.find(VIDEO_PATH)], 'respuestas': [], 'completado': False})
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.sessions.shutdown()
+    httpd.store.close()
+    httpd.server_close()
+
+
+def save_response(httpd, **fields):
+    data = {'participante_id': 'P1', 'numero_video': 1, 'respuesta_slider': 5, 'tiempo_respuesta_segundos': 3}
+    data.update(fields)
+    request = urllib.request.Request(
+        f'http://127.0.0.1:{httpd.server_address[1]}/save-response',
+        data=json.dumps(data).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_metadata_comes_from_the_catalog(server):
+    status, body = save_response(server, video_path='/' + VIDEO_PATH, es_fake=True, calidad='alta')
+    assert status == 200 and body['success']
+
+    server.sessions.flush()
+    [row] = server.store.query('SELECT video_path, es_fake, calidad, respuesta_slider FROM responses')
+    assert tuple(row) == (VIDEO_PATH, 0, 'real', 5)
+
+
+@pytest.mark.parametrize('fields', [{}, {'video_path': 'VIDEOS/otra/x.mp4', 'es_fake': True}])
+def test_answer_kept_for_missing_or_unknown_video(server, fields):
+    status, body = save_response(server, **fields)
+    assert status == 200 and body['success']
+
+    server.sessions.flush()
+    [row] = server.store.query('SELECT r.video_id, r.respuesta_slider FROM response_records r')
+    assert tuple(row) == (None, 5)
+    assert server.store.load('P1')['respuestas'][0]['es_fake'] is None
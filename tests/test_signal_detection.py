@@ -0,0 +1,90 @@
+"""Medidas de detección de señales con bootstrap (signal_detection.py)"""
+
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+
+from experiment_stats import DETECTION_THRESHOLD
+from result_columns import FAKE, REAL, ResultColumns
+from signal_detection import _z, analyze, sdt_measures
+
+
+def test_z_matches_normal_quantiles():
+    normal = NormalDist()
+    p = np.concatenate([np.linspace(1e-9, 1 - 1e-9, 2001), np.logspace(-300, -10, 50)])
+    expected = np.array([normal.inv_cdf(value) for value in p])
+    np.testing.assert_allclose(_z(p), expected, rtol=1e-13, atol=1e-13)
+    assert _z(0.0) == -np.inf and _z(1.0) == np.inf
+
+
+def test_sdt_measures_hand_computed():
+    # Tres valores del slider; los dos últimos cuentan como "parece falso"
+    signal = np.array([1.0, 2.0, 3.0])
+    noise = np.array([3.0, 2.0, 1.0])
+    d_prime, criterion, auc = sdt_measures(signal, noise, threshold_bin=1)
+
+    # Corrección log-lineal: (5 + 0.5) / (6 + 1) aciertos, (3 + 0.5) / (6 + 1) = 0.5 falsas alarmas
+    z_hits = NormalDist().inv_cdf(5.5 / 7)
+    assert d_prime == pytest.approx(z_hits)
+    assert criterion == pytest.approx(-z_hits / 2)
+    # 36 pares señal-ruido: 21 con la señal por encima y 10 empates
+    assert auc == pytest.approx((21 + 10 / 2) / 36)
+
+
+def test_sdt_measures_nan_without_signal_or_noise():
+    d_prime, criterion, auc = sdt_measures(np.zeros((2, 3)), np.ones((2, 3)), threshold_bin=1)
+    assert np.isnan(d_prime).all() and np.isnan(criterion).all() and np.isnan(auc).all()
+
+
+def make_columns(participants=60, videos=12, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = ResultColumns()
+    for index in range(participants):
+        participante_id = f'P{index:03d}'
+        columns.add_participant(participante_id, ('hombre', 'mujer')[index % 2], 18 + index % 50, True)
+        bias = rng.normal(0, 1)
+        for video in range(videos):
+            es_fake = video % 2 == 0
+            slider = np.clip(np.round(5 + bias + (1.5 if es_fake else 0) + rng.normal(0, 2)), 0, 10)
+            tipo = 'informativo' if video % 3 == 0 else 'entretenimiento'
+            calidad = ('baja' if video % 4 == 0 else 'alta') if es_fake else 'real'
+            columns.add_response(participante_id, es_fake, video == 0, tipo, calidad, slider, None, 3)
+    return columns
+
+
+def test_global_estimates_match_direct_computation():
+    columns = make_columns()
+    result = analyze(columns, resamples=0)[0]
+    assert (result['grupo'], result['nivel']) == ('global', 'todos')
+
+    signal = columns.slider[columns.categoria == FAKE]
+    noise = columns.slider[columns.categoria == REAL]
+    z = NormalDist().inv_cdf
+    z_hits = z(((signal >= DETECTION_THRESHOLD).sum() + 0.5) / (len(signal) + 1))
+    z_false_alarms = z(((noise >= DETECTION_THRESHOLD).sum() + 0.5) / (len(noise) + 1))
+    auc = (signal[:, None] > noise).mean() + (signal[:, None] == noise).mean() / 2
+
+    assert result['n_senal'] == len(signal) and result['n_ruido'] == len(noise)
+    assert result['d_prima'][0] == pytest.approx(z_hits - z_false_alarms)
+    assert result['criterio'][0] == pytest.approx(-(z_hits + z_false_alarms) / 2)
+    assert result['auc'][0] == pytest.approx(auc)
+    assert np.isnan(result['auc'][1])
+
+
+def test_same_seed_same_intervals_for_any_worker_count():
+    columns = make_columns()
+    one = analyze(columns, resamples=600, seed=42, workers=1)
+    four = analyze(columns, resamples=600, seed=42, workers=4)
+    assert one == four
+
+    other = analyze(columns, resamples=600, seed=43, workers=4)
+    assert [row['d_prima'] for row in other] != [row['d_prima'] for row in one]
+
+
+def test_wider_intervals_for_higher_confidence():
+    columns = make_columns()
+    narrow = analyze(columns, resamples=400, seed=1, confidence=0.5)[0]
+    wide = analyze(columns, resamples=400, seed=1, confidence=0.99)[0]
+    for name in ('d_prima', 'criterio', 'auc'):
+        assert wide[name][1] < narrow[name][1] < narrow[name][2] < wide[name][2]
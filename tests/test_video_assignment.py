@@ -0,0 +1,109 @@
+"""Asignación de videos y orden por cuadrado latino (video_assignment.py)"""
+
+from collections import Counter
+from itertools import permutations
+
+import pytest
+
+from video_assignment import VideoAssigner, williams_row
+from video_catalog import video_key
+
+
+class FakeCatalog:
+    """Catálogo en memoria con la misma interfaz que VideoCatalog.buckets()"""
+
+    def __init__(self, sizes):
+        self._buckets = {}
+        for (tipo, calidad, es_fake, es_evidente), size in sizes.items():
+            videos = tuple({'path': f'VIDEOS/{tipo}_{calidad}_{es_fake}_{es_evidente}_{i}.mp4',
+                            'tipo_contenido': tipo, 'calidad': calidad, 'es_fake': es_fake,
+                            'es_evidente': es_evidente, 'folder': tipo[0]} for i in range(size))
+            self._buckets[video_key(videos[0])] = videos
+
+    def buckets(self):
+        return self._buckets
+
+
+# Tamaños distintos por estrato, ninguno múltiplo de la cuota del diseño
+CATALOG_SIZES = {
+    ('entretenimiento', 'alta', True, True): 3,
+    ('entretenimiento', 'baja', True, True): 3,
+    ('entretenimiento', 'alta', True, False): 7,
+    ('entretenimiento', 'baja', True, False): 5,
+    ('entretenimiento', 'real', False, False): 11,
+    ('informativo', 'alta', True, False): 9,
+    ('informativo', 'baja', True, False): 6,
+    ('informativo', 'real', False, False): 13,
+}
+
+
+def square(n):
+    rows = 2 * n if n % 2 else n
+    return [williams_row(n, row) for row in range(rows)]
+
+
+@pytest.mark.parametrize('n', [2, 3, 4, 5, 6, 7, 8, 9, 22])
+def test_williams_square_is_first_order_balanced(n):
+    rows = square(n)
+    # Con n impar hacen falta 2n filas y cada par aparece dos veces
+    repeats = 2 if n % 2 else 1
+
+    for row in rows:
+        assert sorted(row) == list(range(n))
+    for position in range(n):
+        assert Counter(row[position] for row in rows) == dict.fromkeys(range(n), repeats)
+
+    pairs = Counter(pair for row in rows for pair in zip(row, row[1:]))
+    assert pairs == dict.fromkeys(permutations(range(n), 2), repeats)
+
+
+def test_williams_row_wraps_around_the_square():
+    assert williams_row(4, 5) == williams_row(4, 1)
+    assert williams_row(5, 12) == williams_row(5, 2)
+    assert williams_row(0, 3) == []
+
+
+@pytest.mark.parametrize('participants', [1, 10, 57, 200])
+def test_exposure_within_one_inside_each_stratum(participants):
+    catalog = FakeCatalog(CATALOG_SIZES)
+    assigner = VideoAssigner(catalog, seed=3)
+    for _ in range(participants):
+        assigner.assign()
+
+    for key, videos in catalog.buckets().items():
+        counts = [assigner.exposures.get(video['path'], 0) for video in videos]
+        assert max(counts) - min(counts) <= 1, key
+
+
+def test_assignment_follows_design_and_latin_square_rows():
+    catalog = FakeCatalog(CATALOG_SIZES)
+    assigner = VideoAssigner(catalog, seed=3)
+    for expected_row in range(5):
+        videos, row = assigner.assign()
+        assert row == expected_row
+        assert len(videos) == 6 + 4 + 4 + 4 + 4
+        assert len({video['path'] for video in videos}) == len(videos)
+        assert sum(video['es_evidente'] for video in videos) == 6
+
+
+def test_same_seed_gives_same_sequence():
+    def run(seed):
+        assigner = VideoAssigner(FakeCatalog(CATALOG_SIZES), seed=seed)
+        return [[video['path'] for video in assigner.assign()[0]] for _ in range(30)]
+
+    assert run(11) == run(11)
+    assert run(11) != run(12)
+
+
+def test_resumes_from_stored_exposures_and_row():
+    catalog = FakeCatalog(CATALOG_SIZES)
+    first = VideoAssigner(catalog, seed=5)
+    for _ in range(8):
+        first.assign()
+
+    resumed = VideoAssigner(catalog, exposures=first.exposures, participants=first.participants, seed=9)
+    _, row = resumed.assign()
+    assert row == 8
+    for videos in catalog.buckets().values():
+        counts = [resumed.exposures.get(video['path'], 0) for video in videos]
+        assert max(counts) - min(counts) <= 1
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Pool de transcodificación con ffmpeg
+
+Las compresiones se encolan en un pool de tamaño fijo (por defecto uno por
+núcleo) en lugar de lanzarse dentro del hilo del trabajo. Cada
+transcodificación usa archivos temporales propios, de modo que dos trabajos
+sobre la misma carpeta no se pisan, y registra su tiempo y tamaño final.
+"""
+
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+TRANSCODE_WORKERS = int(os.environ.get('TRANSCODE_WORKERS', str(os.cpu_count() or 2)))
+FFMPEG = os.environ.get('FFMPEG', 'ffmpeg')
+
+# Bitrate del audio (se recodifica a AAC para que su tamaño sea conocido)
+AUDIO_KBPS = int(os.environ.get('TRANSCODE_AUDIO_KBPS', '96'))
+# Parte del tamaño objetivo para audio+video: el resto queda para el
+# contenedor MP4 y las desviaciones del control de bitrate de x264
+SIZE_MARGIN = 0.93
+# Bitrate de video mínimo aunque el tamaño objetivo no dé para más
+MIN_VIDEO_KBPS = 100
+HISTORY_SIZE = 100
+
+
+def build_presets(quality_configs):
+    """
+    Crea los presets de transcodificación a partir de QUALITY_CONFIGS
+
+    El bitrate de video de cada preset es el menor entre el 'bitrate'
+    configurado y el que cabe en 'target_size_mb' durante 'duration'
+    segundos, descontando el audio y un margen para el contenedor.
+    """
+    presets = {}
+    for name, config in quality_configs.items():
+        target_bits = config['target_size_mb'] * 8 * 1024 * 1024 * SIZE_MARGIN
+        audio_kbps = config.get('audio_kbps', AUDIO_KBPS)
+        target_kbps = int(target_bits / config['duration'] / 1000) - audio_kbps
+        max_kbps = int(config['bitrate'].rstrip('k'))
+        presets[name] = {
+            'video_kbps': max(MIN_VIDEO_KBPS, min(max_kbps, target_kbps)),
+            'audio_kbps': audio_kbps,
+            'max_kbps': max_kbps,
+            'target_size_mb': config['target_size_mb'],
+            'two_pass': config.get('two_pass', True)
+        }
+    return presets
+
+
+class TranscodePool:
+    """Cola de transcodificaciones ffmpeg con métricas de rendimiento"""
+
+    def __init__(self, presets, max_workers=TRANSCODE_WORKERS):
+        self.presets = presets
+        self.max_workers = max_workers
+        # Repartir los núcleos entre las transcodificaciones simultáneas
+        self.threads_per_job = max(1, (os.cpu_count() or 1) // max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='transcode')
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._history = deque(maxlen=HISTORY_SIZE)
+        self._totals = {'count': 0, 'failed': 0, 'seconds': 0.0, 'input_mb': 0.0, 'output_mb': 0.0}
+
+    def submit(self, file_path, preset_name):
+        """Encola la transcodificación de file_path (se reemplaza in situ)"""
+        with self._lock:
+            self._queued += 1
+        return self._executor.submit(self._transcode, file_path, preset_name)
+
+    def transcode(self, file_path, preset_name):
+        """Transcodifica y espera el resultado (dict de métricas)"""
+        return self.submit(file_path, preset_name).result()
+
+    def stats(self):
+        with self._lock:
+            count = self._totals['count']
+            return {
+                'workers': self.max_workers,
+                'threadsPerJob': self.threads_per_job,
+                'queued': self._queued,
+                'running': self._running,
+                'completed': count,
+                'failed': self._totals['failed'],
+                'averageSeconds': round(self._totals['seconds'] / count, 2) if count else 0,
+                'inputMb': round(self._totals['input_mb'], 2),
+                'outputMb': round(self._totals['output_mb'], 2),
+                'presets': self.presets,
+                'recent': list(self._history)
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _transcode(self, file_path, preset_name):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return self._transcode_file(file_path, preset_name)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _transcode_file(self, file_path, preset_name):
+        preset = self.presets[preset_name]
+        input_mb = file_path.stat().st_size / (1024 * 1024)
+        started = time.monotonic()
+
+        metrics = {
+            'file': file_path.as_posix(),
+            'preset': preset_name,
+            'videoKbps': preset['video_kbps'],
+            'audioKbps': preset['audio_kbps'],
+            'twoPass': preset['two_pass'],
+            'inputMb': round(input_mb, 2)
+        }
+
+        # El temporal se crea justo antes del try cuyo finally lo borra
+        fd, tmp_name = tempfile.mkstemp(prefix=f'.{file_path.stem}_', suffix='.mp4', dir=file_path.parent)
+        os.close(fd)
+        passlog = tmp_name[:-len('.mp4')] + '_pass'
+
+        try:
+            common = [FFMPEG, '-y', '-loglevel', 'error', '-i', str(file_path),
+                      '-c:v', 'libx264', '-threads', str(self.threads_per_job),
+                      '-b:v', f"{preset['video_kbps']}k",
+                      '-maxrate', f"{preset['max_kbps']}k", '-bufsize', '1M']
+            audio = ['-c:a', 'aac', '-b:a', f"{preset['audio_kbps']}k"]
+
+            if preset['two_pass']:
+                # Primera pasada: solo estadísticas, sin salida útil
+                self._run(common + ['-pass', '1', '-passlogfile', passlog, '-an', '-f', 'mp4', os.devnull])
+                self._run(common + ['-pass', '2', '-passlogfile', passlog] + audio + [tmp_name])
+            else:
+                self._run(common + audio + [tmp_name])
+
+            # Reemplazar con versión comprimida
+            os.replace(tmp_name, file_path)
+            output_mb = file_path.stat().st_size / (1024 * 1024)
+            metrics.update(success=True, outputMb=round(output_mb, 2))
+            print(f"==> Video comprimido a {output_mb:.2f} MB ({preset_name}, "
+                  f"{time.monotonic() - started:.1f} s)")
+
+        except (OSError, subprocess.CalledProcessError) as e:
+            output_mb = input_mb
+            detail = e.stderr.strip()[-300:] if isinstance(e, subprocess.CalledProcessError) else str(e)
+            metrics.update(success=False, outputMb=round(input_mb, 2), error=detail)
+            print(f"==> Advertencia: No se pudo comprimir con ffmpeg: {detail}")
+
+        finally:
+            for leftover in (tmp_name, passlog + '-0.log', passlog + '-0.log.mbtree'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+        metrics['seconds'] = round(time.monotonic() - started, 2)
+
+        with self._lock:
+            self._history.append(metrics)
+            self._totals['count'] += 1
+            self._totals['seconds'] += metrics['seconds']
+            self._totals['input_mb'] += input_mb
+            self._totals['output_mb'] += output_mb
+            if not metrics['success']:
+                self._totals['failed'] += 1
+
+        return metrics
+
+    def _run(self, cmd):
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
@@ -68,6 +68,20 @@ def verificar_sistema():
     print(f"\n[2] Verificando archivos del sistema...")
     archivos_requeridos = [
         'server.py',
+        'runway_client.py',
+        'video_jobs.py',
+        'transcoder.py',
+        'multipart_upload.py',
+        'image_preprocessing.py',
+        'experiment_store.py',
+        'experiment_stats.py',
+        'video_catalog.py',
+        'video_assignment.py',
+        'static_files.py',
+        'participant_sessions.py',
+        'result_columns.py',
+        'analysis_cache.py',
+        'signal_detection.py',
         'cuestionario.html',
         'export_to_excel.py',
         'analizar_resultados.py'
@@ -99,7 +113,9 @@ def verificar_sistema():
         'json': 'json',
         'pathlib': 'pathlib',
         'csv': 'csv',
-        'datetime': 'datetime'
+        'datetime': 'datetime',
+        'Pillow': 'PIL',
+        'numpy': 'numpy'
     }
 
     for modulo, import_name in modulos.items():
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Asignación de videos a participantes
+
+Cada participante recibe los videos del diseño (DESIGN): todos los evidentes
+más una cuota por estrato (tipo de contenido × calidad × fake/real). Dentro de
+cada estrato se eligen los videos MENOS vistos hasta ahora, con una cola de
+prioridad por estrato (heap de (exposiciones, desempate aleatorio, video)):
+elegir k videos cuesta O(k log n) aunque haya miles de estímulos. Así todos
+los videos acumulan un número parecido de respuestas.
+
+El orden de presentación sigue un cuadrado latino balanceado (Williams): el
+participante n usa la fila n, de modo que cada posición del diseño aparece
+igual número de veces en cada lugar de la secuencia y (con un número par de
+videos) cada una precede a cada otra el mismo número de veces.
+
+Con una semilla (ASSIGNMENT_SEED) la asignación es reproducible.
+"""
+
+import heapq
+import os
+import random
+import threading
+
+# (criterios del estrato, número de videos; None = todos los del estrato)
+DESIGN = (
+    # 1. TODOS los evidentes disponibles (3 carpetas × 2 calidades)
+    ({'es_evidente': True}, None),
+    # 2. 4 IA entretenimiento (2 alta + 2 baja)
+    ({'tipo_contenido': 'entretenimiento', 'calidad': 'alta', 'es_fake': True, 'es_evidente': False}, 2),
+    ({'tipo_contenido': 'entretenimiento', 'calidad': 'baja', 'es_fake': True, 'es_evidente': False}, 2),
+    # 3. 4 reales entretenimiento
+    ({'tipo_contenido': 'entretenimiento', 'es_fake': False}, 4),
+    # 4. 4 IA informativos (2 alta + 2 baja)
+    ({'tipo_contenido': 'informativo', 'calidad': 'alta', 'es_fake': True, 'es_evidente': False}, 2),
+    ({'tipo_contenido': 'informativo', 'calidad': 'baja', 'es_fake': True, 'es_evidente': False}, 2),
+    # 5. 4 reales informativos
+    ({'tipo_contenido': 'informativo', 'es_fake': False}, 4),
+)
+
+_KEY_FIELDS = ('tipo_contenido', 'calidad', 'es_fake', 'es_evidente')
+
+
+def williams_row(n, row):
+    """
+    Fila de un cuadrado latino balanceado de Williams para n elementos
+
+    Para n impar hacen falta 2n filas: las n últimas son las primeras
+    invertidas.
+    """
+    if n == 0:
+        return []
+    # Primera fila: 0, 1, n-1, 2, n-2, ...
+    base = [0]
+    low, high = 1, n - 1
+    for i in range(1, n):
+        if i % 2:
+            base.append(low)
+            low += 1
+        else:
+            base.append(high)
+            high -= 1
+
+    row %= n if n % 2 == 0 else 2 * n
+    sequence = [(value + row) % n for value in base]
+    return sequence[::-1] if row >= n else sequence
+
+
+class _Stratum:
+    """Heap de (exposiciones, desempate, path) de los videos de un estrato"""
+
+    def __init__(self, videos, exposures, rng):
+        self.videos = videos  # tuple del catálogo (su identidad marca la versión)
+        self.by_path = {video['path']: video for video in videos}
+        self.heap = [(exposures.get(path, 0), rng.random(), path) for path in self.by_path]
+        heapq.heapify(self.heap)
+
+    def take(self, count, exposures, rng):
+        """Los count videos menos expuestos; vuelven al heap con una exposición más"""
+        chosen = [heapq.heappop(self.heap) for _ in range(min(count, len(self.heap)))]
+        for _, _, path in chosen:
+            exposures[path] = exposures.get(path, 0) + 1
+            heapq.heappush(self.heap, (exposures[path], rng.random(), path))
+        return [self.by_path[path] for _, _, path in chosen]
+
+
+class VideoAssigner:
+    """Selección estratificada por exposición y orden por cuadrado latino"""
+
+    def __init__(self, catalog, exposures=None, participants=0, seed=None, design=DESIGN):
+        """
+        Args:
+            catalog: VideoCatalog con los videos disponibles
+            exposures: dict path -> veces asignado hasta ahora
+            participants: participantes ya asignados (siguiente fila del cuadrado)
+            seed: semilla para los desempates (None = aleatoria)
+        """
+        self.catalog = catalog
+        self.design = design
+        self.exposures = dict(exposures or {})
+        self.participants = participants
+        self.rng = random.Random(seed)
+        self._strata = {}
+        self._lock = threading.Lock()
+
+    def assign(self):
+        """
+        Videos para un nuevo participante, ya en orden de presentación
+
+        Returns:
+            (lista de copias de los videos, fila del cuadrado latino usada)
+        """
+        buckets = self.catalog.buckets()
+        with self._lock:
+            slots = []
+            for criteria, count in self.design:
+                for key in sorted(buckets, key=str):
+                    if not all(dict(zip(_KEY_FIELDS, key))[name] == value for name, value in criteria.items()):
+                        continue
+                    stratum = self._stratum(key, buckets[key])
+                    taken = stratum.take(len(stratum.heap) if count is None else count, self.exposures, self.rng)
+                    slots.extend(taken)
+                    if count is not None:
+                        count -= len(taken)
+                        if count <= 0:
+                            break
+
+            row = self.participants
+            self.participants += 1
+
+        order = williams_row(len(slots), row)
+        return [dict(slots[index]) for index in order], row
+
+    def exposure_summary(self):
+        """Mínimo, máximo y media de exposiciones de los videos del catálogo"""
+        with self._lock:
+            counts = [self.exposures.get(video['path'], 0)
+                      for videos in self.catalog.buckets().values() for video in videos]
+        if not counts:
+            return {'videos': 0, 'min': 0, 'max': 0, 'mean': 0}
+        return {'videos': len(counts), 'min': min(counts), 'max': max(counts),
+                'mean': round(sum(counts) / len(counts), 2)}
+
+    def _stratum(self, key, videos):
+        stratum = self._strata.get(key)
+        if stratum is None or stratum.videos is not videos:
+            # Nuevo estrato o el catálogo cambió: reconstruir su heap (O(n))
+            stratum = _Stratum(videos, self.exposures, self.rng)
+            self._strata[key] = stratum
+        return stratum
+
+
+def seed_from_env():
+    """Semilla de ASSIGNMENT_SEED (None si no está definida)"""
+    value = os.environ.get('ASSIGNMENT_SEED')
+    return int(value) if value else None
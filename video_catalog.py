@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Índice de los videos del experimento (carpeta VIDEOS)
+
+El catálogo se construye una vez al arrancar y se mantiene al día comparando
+el mtime de VIDEOS/ y de cada subcarpeta: solo se vuelven a listar las
+carpetas que cambiaron, y la comprobación se hace como mucho una vez cada
+CHECK_INTERVAL segundos aunque lleguen muchas altas a la vez. (Se usan
+mtimes en lugar de un watcher porque las notificaciones no suelen funcionar
+sobre carpetas compartidas en red.)
+
+Los videos quedan agrupados por (tipo_contenido, calidad, es_fake,
+es_evidente), así que preparar un participante solo tiene que muestrear.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+VIDEOS_DIR = Path('VIDEOS')
+CHECK_INTERVAL = float(os.environ.get('CATALOG_CHECK_INTERVAL', '10'))
+
+# Videos evidentes con IA (SIEMPRE se incluyen todos)
+EVIDENTES_FOLDERS = ('e2', 'e9', 'e11')
+REALES_FOLDER = 'reales'
+
+
+def video_key(video):
+    """Estrato de un video: (tipo_contenido, calidad, es_fake, es_evidente)"""
+    return (video['tipo_contenido'], video['calidad'], video['es_fake'], video['es_evidente'])
+
+
+class VideoCatalog:
+    """Catálogo de VIDEOS/ agrupado por estrato y refrescado por mtime"""
+
+    def __init__(self, videos_dir=VIDEOS_DIR, check_interval=CHECK_INTERVAL):
+        self.videos_dir = Path(videos_dir)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._root_mtime = None
+        self._folders = {}  # nombre -> (mtime, [videos])
+        self._buckets = {}
+        self._by_path = {}
+        self._last_check = 0.0
+        self.refresh(force=True)
+
+    def exists(self):
+        """True si existe la carpeta VIDEOS (se refresca si toca)"""
+        self.buckets()
+        return self._root_mtime is not None
+
+    def buckets(self):
+        """dict estrato -> tuple de videos (se refresca si toca)"""
+        if time.monotonic() - self._last_check >= self.check_interval:
+            self.refresh()
+        return self._buckets
+
+    def videos(self, **criteria):
+        """
+        Videos de los estratos que cumplen los criterios dados
+
+        Ejemplo: videos(tipo_contenido='informativo', es_fake=True)
+        """
+        fields = ('tipo_contenido', 'calidad', 'es_fake', 'es_evidente')
+        result = []
+        for key, videos in sorted(self.buckets().items(), key=lambda item: str(item[0])):
+            values = dict(zip(fields, key))
+            if all(values[name] == value for name, value in criteria.items()):
+                result.extend(videos)
+        return result
+
+    def find(self, path):
+        """Video del catálogo con esa ruta (VIDEOS/...), o None"""
+        self.buckets()
+        return self._by_path.get(path)
+
+    def counts(self):
+        return {key: len(videos) for key, videos in self.buckets().items()}
+
+    def refresh(self, force=False):
+        """Vuelve a listar las carpetas cuyo mtime cambió"""
+        if not self._lock.acquire(blocking=force):
+            # Otro hilo ya está comprobando: usar el catálogo actual
+            return
+        try:
+            self._last_check = time.monotonic()
+            try:
+                root_mtime = self.videos_dir.stat().st_mtime
+            except FileNotFoundError:
+                self._root_mtime = None
+                self._folders = {}
+                self._buckets = {}
+                self._by_path = {}
+                return
+
+            if force or root_mtime != self._root_mtime:
+                names = {entry.name for entry in os.scandir(self.videos_dir) if entry.is_dir()}
+            else:
+                names = set(self._folders)
+
+            folders = {}
+            changed = force or names != set(self._folders)
+            for name in names:
+                try:
+                    mtime = (self.videos_dir / name).stat().st_mtime
+                except FileNotFoundError:
+                    changed = True
+                    continue
+                cached = self._folders.get(name)
+                if cached is not None and cached[0] == mtime:
+                    folders[name] = cached
+                else:
+                    folders[name] = (mtime, _scan_folder(self.videos_dir / name))
+                    changed = True
+
+            self._root_mtime = root_mtime
+            self._folders = folders
+            if changed:
+                self._buckets = _bucket(folders)
+                self._by_path = {video['path']: video for _, videos in folders.values() for video in videos}
+                print(f"==> Catálogo de videos actualizado: "
+                      f"{sum(len(v) for v in self._buckets.values())} videos en {len(folders)} carpetas")
+        finally:
+            self._lock.release()
+
+
+def _scan_folder(folder):
+    """Videos de una subcarpeta de VIDEOS/ según su nombre"""
+    folder_name = folder.name
+    videos = []
+
+    if folder_name == REALES_FOLDER:
+        for video_file in sorted(folder.glob('*.mp4')):
+            # Determinar tipo por nombre: e*.mp4 o i*.mp4
+            if video_file.name.startswith('e'):
+                tipo_contenido = 'entretenimiento'
+            elif video_file.name.startswith('i'):
+                tipo_contenido = 'informativo'
+            else:
+                continue
+            videos.append({
+                'path': str(video_file.as_posix()),
+                'es_fake': False,
+                'calidad': 'real',  # Los reales son todos misma calidad
+                'tipo_contenido': tipo_contenido,
+                'es_evidente': False,
+                'folder': REALES_FOLDER
+            })
+        return videos
+
+    if folder_name in EVIDENTES_FOLDERS:
+        tipo_contenido, es_evidente = 'entretenimiento', True
+    elif folder_name.startswith('e'):
+        tipo_contenido, es_evidente = 'entretenimiento', False
+    elif folder_name.startswith('i'):
+        tipo_contenido, es_evidente = 'informativo', False
+    else:
+        return videos
+
+    for video_file in sorted(folder.glob('video_*.mp4')):
+        videos.append({
+            'path': str(video_file.as_posix()),
+            'es_fake': True,
+            'calidad': 'alta' if 'high' in video_file.name else 'baja',
+            'tipo_contenido': tipo_contenido,
+            'es_evidente': es_evidente,
+            'folder': folder_name
+        })
+    return videos
+
+
+def _bucket(folders):
+    buckets = {}
+    for name in sorted(folders):
+        for video in folders[name][1]:
+            buckets.setdefault(video_key(video), []).append(video)
+    return {key: tuple(videos) for key, videos in buckets.items()}
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Cola de trabajos de generación de video en segundo plano
+
+Cada trabajo pasa por las etapas creación -> sondeo -> descarga -> compresión
+en un pool de hilos propio (JOB_WORKERS trabajos a la vez, que es también el
+límite de concurrencia de los lotes), de modo que el POST de generación
+responde al instante con un ID de trabajo. El estado se guarda en un diario
+JSON-lines para poder retomar los trabajos pendientes tras reiniciar el
+servidor: una línea completa al encolar y después solo los campos que
+cambian (el progreso de Runway no se anota; al reanudar se vuelve a
+consultar).
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import runway_client
+from runway_client import RunwayError
+from transcoder import TranscodePool, build_presets
+
+JOBS_DIR = Path('jobs')
+JOURNAL_FILE = JOBS_DIR / 'journal.jsonl'
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '4'))
+
+POLL_TIMEOUT = 240  # 4 minutos
+EXPECTED_GENERATION_SECONDS = 90
+
+# Estados de un trabajo
+QUEUED = 'queued'
+CREATING = 'creating'
+POLLING = 'polling'
+DOWNLOADING = 'downloading'
+COMPRESSING = 'compressing'
+DONE = 'done'
+FAILED = 'failed'
+FINAL_STATES = (DONE, FAILED)
+
+# Configuración que funcionaba:
+# Gen-4 Turbo para ALTA calidad (mejor calidad)
+# Gen-3 Alpha Turbo para BAJA calidad (ahorro de créditos)
+# COSTE TOTAL: 50 + 20 = 70 créditos por imagen
+QUALITY_CONFIGS = {
+    'high': {
+        'duration': 10,
+        'model': 'gen4_turbo',  # VOLVIENDO a Gen-4 para alta calidad
+        'ratio': '1280:720',  # Gen-4 acepta este ratio
+        'target_size_mb': 10,
+        'bitrate': '4000k',  # High bitrate
+        'label': 'Alta',
+        'fileName': 'video_high_quality.mp4',
+        'compress': False  # No comprimir
+    },
+    'low': {
+        'duration': 10,
+        'model': 'gen3a_turbo',  # Gen-3 para baja calidad (ahorra créditos)
+        'ratio': '1280:768',  # Gen-3 solo acepta 1280:768 o 768:1280
+        'target_size_mb': 2,
+        'bitrate': '600k',  # Low bitrate
+        'label': 'Baja',
+        'fileName': 'video_low_quality.mp4',
+        'compress': True  # Comprimir agresivamente
+    }
+}
+
+
+class GenerationJob:
+    """Estado de un trabajo de generación (alta + baja calidad de una imagen)"""
+
+    def __init__(self, job_id, folder_path, prompts, analysis):
+        self.id = job_id
+        self.folder_path = folder_path
+        self.prompts = prompts
+        self.analysis = analysis
+        self.status = QUEUED
+        self.message = 'En cola'
+        self.details = None
+        self.created_at = datetime.now().isoformat()
+        self.updated_at = self.created_at
+        self.videos = {
+            # status: estado de la tarea en Runway; stage: descarga/compresión local
+            quality: {'taskId': None, 'status': None, 'progress': 0, 'url': None, 'stage': None, 'result': None}
+            for quality in QUALITY_CONFIGS
+        }
+        self.result = None
+
+    @property
+    def image_file(self):
+        return JOBS_DIR / f'{self.id}.image'
+
+    def to_dict(self):
+        """Representación pública (la que devuelven /jobs y /jobs/<id>)"""
+        return {
+            'jobId': self.id,
+            'folderPath': self.folder_path,
+            'status': self.status,
+            'message': self.message,
+            'details': self.details,
+            'createdAt': self.created_at,
+            'updatedAt': self.updated_at,
+            'videos': {
+                quality: {
+                    'taskId': info['taskId'],
+                    'status': info['status'],
+                    'progress': info['progress'],
+                    'stage': info.get('stage')
+                }
+                for quality, info in self.videos.items()
+            },
+            'result': self.result
+        }
+
+    def to_record(self):
+        """Registro completo para el diario en disco"""
+        return {
+            'id': self.id,
+            'folder_path': self.folder_path,
+            'prompts': self.prompts,
+            'analysis': self.analysis,
+            'status': self.status,
+            'message': self.message,
+            'details': self.details,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'videos': self.videos,
+            'result': self.result
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        job = cls(record['id'], record['folder_path'], record['prompts'], record['analysis'])
+        job.status = record['status']
+        job.message = record.get('message', '')
+        job.details = record.get('details')
+        job.created_at = record['created_at']
+        job.updated_at = record['updated_at']
+        job.videos.update(record.get('videos', {}))
+        job.result = record.get('result')
+        return job
+
+    def apply_record(self, record):
+        """Aplica una línea parcial del diario (solo los campos que cambiaron)"""
+        for name, value in record.items():
+            if name == 'videos':
+                for quality, fields in value.items():
+                    self.videos.setdefault(quality, {}).update(fields)
+            elif name != 'id':
+                setattr(self, name, value)
+
+
+class JobManager:
+    """Planificador de trabajos con diario en disco"""
+
+    def __init__(self, max_workers=JOB_WORKERS):
+        self.max_workers = max_workers
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.transcoder = TranscodePool(build_presets(QUALITY_CONFIGS))
+        JOBS_DIR.mkdir(exist_ok=True)
+        self._load_journal()
+
+    # ------------------------------------------------------------------
+    # Diario
+    # ------------------------------------------------------------------
+
+    def _load_journal(self):
+        """Reconstruye los trabajos del diario y reanuda los que no terminaron"""
+        if JOURNAL_FILE.exists():
+            with open(JOURNAL_FILE, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Última línea truncada por un corte: se ignora
+                        continue
+                    job = self._jobs.get(record['id'])
+                    if job is not None:
+                        job.apply_record(record)
+                    elif 'prompts' in record:
+                        self._jobs[record['id']] = GenerationJob.from_record(record)
+
+        # Compactar: una sola línea por trabajo
+        tmp_file = JOURNAL_FILE.with_name(JOURNAL_FILE.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for job in self._jobs.values():
+                f.write(json.dumps(job.to_record(), ensure_ascii=False) + '\n')
+        os.replace(tmp_file, JOURNAL_FILE)
+
+        pending = [job for job in self._jobs.values() if job.status not in FINAL_STATES]
+        for job in pending:
+            if not job.image_file.exists():
+                self._update(job, status=FAILED, message='Imagen del trabajo perdida tras reinicio')
+                continue
+            print(f"==> Reanudando trabajo {job.id} ({job.status})")
+            self._executor.submit(self._run, job)
+
+    def _append_journal(self, record):
+        with open(JOURNAL_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def _update(self, job, **fields):
+        """Cambia campos del trabajo y anota en el diario los que cambiaron"""
+        with self._lock:
+            changed = {name: value for name, value in fields.items() if getattr(job, name) != value}
+            for name, value in changed.items():
+                setattr(job, name, value)
+            self._touch(job, changed)
+
+    def _update_video(self, job, quality, **fields):
+        """
+        Cambia campos del video de una calidad (bajo el lock del gestor)
+
+        Los cambios que solo afectan al progreso no se anotan en el diario.
+        """
+        with self._lock:
+            info = job.videos[quality]
+            changed = {name: value for name, value in fields.items() if info.get(name) != value}
+            info.update(changed)
+
+            journal = {}
+            if set(changed) - {'progress'}:
+                journal['videos'] = {quality: changed}
+            if 'stage' in changed and job.status in (DOWNLOADING, COMPRESSING):
+                previous = job.status
+                self._download_status(job)
+                if job.status != previous:
+                    journal.update(status=job.status, message=job.message)
+            self._touch(job, journal)
+
+    def _download_status(self, job):
+        """Estado global durante la descarga: comprimiendo solo si nada se está descargando"""
+        stages = [info.get('stage') for info in job.videos.values() if not info['result']]
+        if stages and all(stage == COMPRESSING for stage in stages):
+            job.status, job.message = COMPRESSING, 'Comprimiendo videos'
+        else:
+            job.status, job.message = DOWNLOADING, 'Descargando videos'
+
+    def _touch(self, job, changed):
+        """Anota los cambios (con _lock tomado) y despierta a quien espera"""
+        job.updated_at = datetime.now().isoformat()
+        if changed:
+            self._append_journal(dict(changed, id=job.id, updated_at=job.updated_at))
+        self._changed.notify_all()
+
+    # ------------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------------
+
+    def submit(self, image_data_uri, prompts, folder_path, analysis):
+        """Encola un trabajo y devuelve su estado inicial"""
+        job = GenerationJob(uuid.uuid4().hex[:12], folder_path, prompts, analysis)
+        job.image_file.write_text(image_data_uri, encoding='utf-8')
+
+        with self._lock:
+            self._jobs[job.id] = job
+            self._append_journal(job.to_record())
+
+        self._executor.submit(self._run, job)
+        print(f"==> Trabajo {job.id} encolado ({folder_path})")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def list(self):
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+            return [job.to_dict() for job in jobs]
+
+    def iter_finished(self, job_ids, timeout=None):
+        """
+        Genera el estado de cada trabajo a medida que termina (en orden de llegada)
+
+        Si vence el plazo o se apaga el gestor, genera de una vez el estado de
+        los que siguen pendientes y termina, sin dejar el hilo esperando.
+        """
+        remaining = set(job_ids)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while remaining:
+            with self._changed:
+                self._changed.wait_for(
+                    lambda: self._closed or any(self._jobs[job_id].status in FINAL_STATES for job_id in remaining),
+                    None if deadline is None else deadline - time.monotonic()
+                )
+                finished = [job_id for job_id in remaining if self._jobs[job_id].status in FINAL_STATES]
+                if not finished:
+                    finished = list(remaining)
+                snapshots = [self._jobs[job_id].to_dict() for job_id in finished]
+            remaining.difference_update(finished)
+            yield from snapshots
+
+    def shutdown(self):
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.transcoder.shutdown()
+
+    # ------------------------------------------------------------------
+    # Etapas
+    # ------------------------------------------------------------------
+
+    def _run(self, job):
+        try:
+            self._create_tasks(job)
+            self._poll_tasks(job)
+            self._download_videos(job)
+
+            result = {
+                'success': True,
+                'message': 'Ambos videos generados y guardados exitosamente',
+                'folderPath': str(Path('VIDEOS') / job.folder_path),
+                'imageUsed': 'uploaded_image',
+                'videos': {quality: info['result'] for quality, info in job.videos.items()}
+            }
+            self._update(job, status=DONE, message=result['message'], result=result)
+            print(f"==> Trabajo {job.id}: videos generados")
+
+        except RunwayError as e:
+            self._update(job, status=FAILED, message=e.message, details=e.details)
+            print(f"==> Trabajo {job.id} fallido: {e.message}")
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            self._update(job, status=FAILED, message=f'Server error: {str(e)}',
+                         details={'error_type': type(e).__name__})
+        finally:
+            if job.status in FINAL_STATES and job.image_file.exists():
+                job.image_file.unlink()
+
+    def _create_tasks(self, job):
+        """Crea las tareas de Runway que aún no existan (con prompts distintos)"""
+        pending = [q for q, info in job.videos.items() if not info['taskId']]
+        if not pending:
+            return
+
+        self._update(job, status=CREATING, message='Creando tareas en Runway')
+        image_data_uri = job.image_file.read_text(encoding='utf-8')
+
+        for quality in pending:
+            config = dict(QUALITY_CONFIGS[quality], prompt=job.prompts[f'{quality}_quality'])
+
+            print(f"\n==> Creating {quality} quality video task...")
+            print(f"    Model: {config['model']}")
+            print(f"    Duration: {config['duration']}s")
+            print(f"    Ratio: {config['ratio']}")
+            print(f"    Prompt: {config['prompt'][:80]}...")
+
+            try:
+                task_id = runway_client.create_task(image_data_uri, config)
+            except RunwayError as e:
+                raise RunwayError(f'{e.message} for {quality} quality', e.details)
+
+            print(f"==> Task created: {task_id}")
+            self._update_video(job, quality, taskId=task_id, status='PENDING')
+
+    def _poll_tasks(self, job):
+        """Espera (vía el sondeo compartido) a que ambas tareas tengan URL de salida"""
+        pending = {info['taskId']: q for q, info in job.videos.items() if not info['url']}
+        if not pending:
+            return
+
+        self._update(job, status=POLLING, message='Generando videos en Runway')
+
+        for task_id in pending:
+            runway_client.poller.track(task_id, EXPECTED_GENERATION_SECONDS)
+        versions = dict.fromkeys(pending, 0)
+        deadline = time.monotonic() + POLL_TIMEOUT
+
+        try:
+            while pending:
+                updates = runway_client.poller.wait_for_update(versions, deadline - time.monotonic())
+                if not updates:
+                    completed = len(job.videos) - len(pending)
+                    raise RunwayError(f'Timeout generating videos (completed: {completed}/{len(job.videos)})')
+
+                for task_id, version, status_data in updates:
+                    versions[task_id] = version
+                    quality = pending[task_id]
+                    info = job.videos[quality]
+
+                    status = status_data.get('status')
+                    fields = {'status': status, 'progress': status_data.get('progress') or info['progress']}
+
+                    if status == 'SUCCEEDED':
+                        video_url = runway_client.task_output_url(status_data)
+                        if video_url:
+                            fields.update(url=video_url, progress=1)
+                            del pending[task_id]
+                            del versions[task_id]
+                    self._update_video(job, quality, **fields)
+
+                    if status in ('FAILED', 'CANCELLED'):
+                        raise RunwayError(f'Video generation failed for {quality} quality', status_data)
+        finally:
+            runway_client.poller.untrack([info['taskId'] for info in job.videos.values()])
+
+    def _download_videos(self, job):
+        """Descarga a la vez (y comprime si hace falta) los videos terminados"""
+        base_path = Path('VIDEOS') / job.folder_path
+        base_path.mkdir(parents=True, exist_ok=True)
+
+        pending = [quality for quality, info in job.videos.items() if not info['result']]
+        if not pending:
+            return
+
+        self._update(job, status=DOWNLOADING, message='Descargando videos')
+
+        with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix='download') as pool:
+            futures = [pool.submit(self._download_video, job, quality, base_path) for quality in pending]
+            for future in futures:
+                future.result()
+
+    def _download_video(self, job, quality, base_path):
+        info = job.videos[quality]
+        config = QUALITY_CONFIGS[quality]
+        file_name = config['fileName']
+        file_path = base_path / file_name
+
+        self._update_video(job, quality, stage=DOWNLOADING)
+        sha256 = runway_client.download_video(info['url'], file_path)
+
+        file_size_mb = file_path.stat().st_size / (1024 * 1024)
+        print(f"==> Video {config['label']} descargado ({file_size_mb:.2f} MB)")
+
+        # Aplicar compresión adicional si es necesario
+        transcode = None
+        if config.get('compress', False) or file_size_mb > config['target_size_mb'] * 1.2:
+            self._update_video(job, quality, stage=COMPRESSING)
+            transcode = self.transcoder.transcode(file_path, quality)
+            file_size_mb = file_path.stat().st_size / (1024 * 1024)
+
+        self._update_video(job, quality, stage=DONE, result={
+            'fileName': file_name,
+            'videoPath': f'VIDEOS/{job.folder_path}/{file_name}',
+            'fileSize': f'{file_size_mb:.2f} MB',
+            'duration': config['duration'],
+            'taskId': info['taskId'],
+            'label': config['label'],
+            'sourceSha256': sha256,
+            'transcode': transcode
+        })